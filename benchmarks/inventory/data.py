@@ -0,0 +1,113 @@
+'''
+Generation of a synthetic inventory.
+
+With partitioned=True (PostgreSQL only), the volumes are stored in monthly child tables named <table>_yNNNNmNN
+which inherit from the volumes table, like the partitions that get_approximate_count_for_all_objects expects.
+'''
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+import random
+
+from django.db import connection
+
+from .models import Owner, Volume
+
+POOLS = ['pool-%d' % i for i in range(20)]
+START = datetime(2016, 1, 1, tzinfo=timezone.utc)
+DAYS = 3 * 365
+USERNAME = 'benchmark'
+_COLUMNS = ['name', 'pool', 'size', 'used', 'is_active', 'created_at', 'owner_id']
+
+
+def partition_name(table, when):
+    return '%s_y%04dm%02d' % (table, when.year, when.month)
+
+
+def _iter_months():
+    month = START
+    end = START + timedelta(days=DAYS)
+    while month < end:
+        next_month = month.replace(year=month.year + month.month // 12, month=month.month % 12 + 1)
+        yield month, next_month
+        month = next_month
+
+
+def create_partitions():
+    table = Volume._meta.db_table
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for month, next_month in _iter_months():
+            partition = partition_name(table, month)
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS {partition} (PRIMARY KEY (id), "
+                "CHECK (created_at >= '{start}' AND created_at < '{end}')) INHERITS ({table})".format(
+                    partition=quote(partition), table=quote(table),
+                    start=month.isoformat(), end=next_month.isoformat()))
+            cursor.execute('CREATE INDEX IF NOT EXISTS {} ON {} (created_at)'.format(
+                quote(partition + '_created_at'), quote(partition)))
+
+
+def _insert_partitioned(volumes):
+    # The children inherit the NOT NULL of the primary key but not its default (an identity column in Django >= 4.1,
+    # or a serial one), so the ids are taken from the parent's sequence explicitly
+    table = Volume._meta.db_table
+    by_partition = defaultdict(list)
+    for volume in volumes:
+        by_partition[partition_name(table, volume.created_at)].append([getattr(volume, c) for c in _COLUMNS])
+    row_placeholders = '(nextval(%s), ' + ', '.join(['%s'] * len(_COLUMNS)) + ')'
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [table, Volume._meta.pk.column])
+        sequence = cursor.fetchone()[0]
+        for partition, rows in by_partition.items():
+            sql = 'INSERT INTO {} ({}) VALUES {}'.format(
+                connection.ops.quote_name(partition), ', '.join([Volume._meta.pk.column] + _COLUMNS),
+                ', '.join([row_placeholders] * len(rows)))
+            cursor.execute(sql, [value for row in rows for value in [sequence] + row])
+
+
+def generate(number_of_volumes, number_of_owners=None, batch_size=5000, seed=0, partitioned=False, progress=None):
+    '''
+    Creates the given number of volumes (and a proportional number of owners), with reproducible values.
+    progress, when given, is called with the number of volumes created so far after each batch.
+    '''
+    if partitioned:
+        assert connection.vendor == 'postgresql', 'Partitions are supported only in PostgreSQL'
+        create_partitions()
+    rand = random.Random(seed)
+    number_of_owners = number_of_owners or max(1, number_of_volumes // 100)
+    Owner.objects.bulk_create(
+        [Owner(name='owner-%d' % i, email='owner-%d@example.com' % i) for i in range(number_of_owners)],
+        batch_size=batch_size)
+    owner_ids = list(Owner.objects.values_list('id', flat=True))
+    batch = []
+    for i in range(number_of_volumes):
+        size = rand.choice([1, 2, 4, 8, 16, 32]) * 1000 ** 3
+        batch.append(Volume(
+            name='volume-%d' % i,
+            pool=rand.choice(POOLS),
+            size=size,
+            used=rand.randint(0, size),
+            is_active=rand.random() < 0.9,
+            created_at=START + timedelta(days=rand.uniform(0, DAYS)),
+            owner_id=rand.choice(owner_ids)))
+        if len(batch) == batch_size or i == number_of_volumes - 1:
+            if partitioned:
+                _insert_partitioned(batch)
+            else:
+                Volume.objects.bulk_create(batch)
+            batch = []
+            if progress:
+                progress(i + 1)
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+
+def get_benchmark_token():
+    '''
+    Returns the API token of the user which the load driver authenticates as, creating them if needed.
+    '''
+    from django.contrib.auth import get_user_model
+    from infi.django_rest_utils.models import APIToken
+    user, created = get_user_model().objects.get_or_create(username=USERNAME)
+    return APIToken.objects.for_user(user).token
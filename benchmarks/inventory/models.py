@@ -0,0 +1,25 @@
+from django.db import models
+
+from infi.django_rest_utils.filters import FilterableField
+
+
+class Owner(models.Model):
+    name = models.CharField(max_length=100, db_index=True)
+    email = models.CharField(max_length=100)
+
+
+class Volume(models.Model):
+    name = models.CharField(max_length=100)
+    pool = models.CharField(max_length=50)
+    size = models.BigIntegerField()
+    used = models.BigIntegerField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(db_index=True)
+    owner = models.ForeignKey(Owner, related_name='volumes', on_delete=models.CASCADE)
+
+    @classmethod
+    def get_filterable_fields(cls):
+        return FilterableField.for_model(cls) + [
+            FilterableField('capacity', source='size', datatype=FilterableField.CAPACITY),
+            FilterableField('owner', source='owner__name'),
+        ]
@@ -0,0 +1,29 @@
+from rest_framework import serializers, viewsets
+from rest_framework.permissions import AllowAny
+
+from infi.django_rest_utils.serializers import DefaultModelSerializer
+from infi.django_rest_utils.pagination import InfinidatPartitionedPaginationSerializer
+from infi.django_rest_utils.views import PartitionAwareMixin, StreamingMixin
+
+from .models import Volume
+
+
+class VolumeSerializer(DefaultModelSerializer):
+    owner_name = serializers.CharField(source='owner.name')
+
+    class Meta:
+        model = Volume
+        fields = '__all__'
+
+
+class VolumeViewSet(PartitionAwareMixin, StreamingMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = VolumeSerializer
+    queryset = Volume.objects.select_related('owner')
+    # Takes effect when the data is generated with partitioned=True
+    pagination_class = InfinidatPartitionedPaginationSerializer
+    partition_field = 'created_at'
+
+
+class AnonymousVolumeViewSet(VolumeViewSet):
+    authentication_classes = []
+    permission_classes = [AllowAny]
@@ -0,0 +1,265 @@
+'''End-to-end load harness: a synthetic inventory, served by the Django test server, and a multi-process HTTP driver.
+
+Usage:
+    load.py generate [--volumes=<n>] [--owners=<n>] [--partitioned] [--seed=<n>]
+    load.py serve [--port=<port>]
+    load.py run [options]
+
+Options:
+    --volumes=<n>           number of synthetic volumes [default: 1000000]
+    --owners=<n>            number of owners (by default, one per 100 volumes)
+    --partitioned           store the volumes in monthly partitions (PostgreSQL only)
+    --seed=<n>              seed of the generated values [default: 0]
+    --port=<port>           port of the test server [default: 8000]
+    --url=<url>             base URL of the server [default: http://127.0.0.1:8000]
+    --serve                 start the test server (on the port of --url) for the duration of the run
+    --token=<token>         the API token to authenticate with (by default, read from the database)
+    --processes=<n>         number of concurrent client processes [default: 8]
+    --duration=<seconds>    duration of the run [default: 30]
+    --scenarios=<names>     comma-separated scenarios to run (by default, all of them)
+    --output=<filename>     save the results as JSON
+
+The database is configured by environment variables (see benchmarks/settings.py). Since the server and the
+generator are separate processes, either BENCHMARK_SQLITE_FILE or BENCHMARK_POSTGRES_DB must be set. For example:
+
+    export BENCHMARK_POSTGRES_DB=inventory
+    python -m benchmarks.load generate --volumes=5000000 --partitioned
+    python -m benchmarks.load run --serve --processes=16 --duration=60
+'''
+from __future__ import print_function
+from collections import OrderedDict
+from multiprocessing import Pool
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+try:
+    from http.client import HTTPConnection, HTTPException
+    from urllib.parse import urlencode, urlparse
+except ImportError:
+    from httplib import HTTPConnection, HTTPException
+    from urllib import urlencode
+    from urlparse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+API = '/api/volumes/'
+PAGE_SIZE = 50
+POOLS = 20
+
+
+def _query(params):
+    return API + '?' + urlencode(params)
+
+
+# Each scenario returns the path of a request, given a random generator and the dataset's number of volumes
+SCENARIOS = OrderedDict([
+    ('list', lambda rand, total: API),
+    ('filter', lambda rand, total: _query([
+        ('pool', 'in:[pool-%d,pool-%d]' % (rand.randrange(POOLS), rand.randrange(POOLS))),
+        ('capacity', 'ge:%dGB' % rand.choice([4, 8, 16])),
+        ('is_active', 1),
+    ])),
+    ('ordering', lambda rand, total: _query([('sort', rand.choice(['-size', 'name', '-created_at,id']))])),
+    # Ordered by the partition column, within a few months (see PartitionAwareMixin)
+    ('time_range', lambda rand, total: _query([
+        ('sort', '-created_at'),
+        ('created_at', 'ge:2016-%02d-01' % rand.randint(1, 12)),
+        ('created_at', 'lt:2017-%02d-01' % rand.randint(1, 3)),
+        ('page', rand.randint(1, 5)),
+    ])),
+    ('deep_page', lambda rand, total: _query([
+        ('page', rand.randint(max(1, total // PAGE_SIZE // 2), max(1, total // PAGE_SIZE))),
+    ])),
+    ('stream_csv', lambda rand, total: _query([
+        ('format', 'csv'),
+        ('owner', 'owner-%d' % rand.randrange(max(1, total // 100))),
+    ])),
+    # A minimal response, so that the cost of authenticating the token dominates
+    ('token_auth', lambda rand, total: _query([('page_size', 1), ('id', rand.randint(1, max(1, total)))])),
+])
+
+
+def _setup_django():
+    import django
+    django.setup()
+
+
+def generate(args):
+    _setup_django()
+    from django.conf import settings
+    from django.core.management import call_command
+    from .inventory.data import generate, get_benchmark_token
+    if settings.DATABASES['default']['NAME'] == ':memory:':
+        print('Set BENCHMARK_SQLITE_FILE or BENCHMARK_POSTGRES_DB, so that the server can read the data')
+        return 2
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    volumes = int(args['--volumes'])
+    start = time.time()
+
+    def progress(count):
+        sys.stdout.write('\r%d/%d volumes (%.0f/s)' % (count, volumes, count / (time.time() - start)))
+        sys.stdout.flush()
+    generate(volumes, int(args['--owners']) if args['--owners'] else None, seed=int(args['--seed']),
+             partitioned=args['--partitioned'], progress=progress)
+    print('\nAPI token: %s' % get_benchmark_token())
+    return 0
+
+
+def serve(args):
+    _setup_django()
+    from django.core.management import call_command
+    call_command('runserver', '127.0.0.1:%s' % args['--port'], use_reloader=False)
+    return 0
+
+
+def _worker(job):
+    url, token, scenarios, deadline, seed, total = job
+    rand = random.Random(seed)
+    parsed = urlparse(url)
+    prefix = parsed.path.rstrip('/')
+    connection = HTTPConnection(parsed.hostname, parsed.port or 80)
+    samples = []
+    while time.time() < deadline:
+        name = rand.choice(scenarios)
+        path = prefix + SCENARIOS[name](rand, total)
+        start = time.time()
+        try:
+            connection.request('GET', path, headers={'X-API-Token': token})
+            response = connection.getresponse()
+            size = len(response.read())
+            status = response.status
+        except (HTTPException, socket.error):
+            status, size = 0, 0
+            connection.close()
+            connection = HTTPConnection(parsed.hostname, parsed.port or 80)
+        samples.append((name, time.time() - start, status, size))
+    connection.close()
+    return samples
+
+
+def _percentile(sorted_values, percent):
+    return sorted_values[int(round(percent / 100.0 * (len(sorted_values) - 1)))]
+
+
+def summarize(samples, duration):
+    '''
+    Returns the throughput and latency percentiles (in milliseconds) per scenario, and in total.
+    '''
+    groups = OrderedDict((name, []) for name in sorted(set(sample[0] for sample in samples)))
+    for sample in samples:
+        groups[sample[0]].append(sample)
+    groups['total'] = samples
+    ret = OrderedDict()
+    for name, group in groups.items():
+        if not group:
+            continue
+        latencies = sorted(sample[1] * 1000 for sample in group)
+        ret[name] = OrderedDict([
+            ('requests', len(group)),
+            ('errors', sum(1 for sample in group if not 200 <= sample[2] < 400)),
+            ('requests_per_second', len(group) / duration),
+            ('megabytes_per_second', sum(sample[3] for sample in group) / duration / 1e6),
+            ('p50', _percentile(latencies, 50)),
+            ('p90', _percentile(latencies, 90)),
+            ('p99', _percentile(latencies, 99)),
+            ('max', latencies[-1]),
+        ])
+    return ret
+
+
+def _print_summary(summary):
+    print('{:<12} {:>9} {:>7} {:>9} {:>8} {:>9} {:>9} {:>9} {:>9}'.format(
+        'scenario', 'requests', 'errors', 'req/s', 'MB/s', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for name, row in summary.items():
+        print('{:<12} {requests:>9} {errors:>7} {requests_per_second:>9.1f} {megabytes_per_second:>8.2f} '
+              '{p50:>9.1f} {p90:>9.1f} {p99:>9.1f} {max:>9.1f}'.format(name, **row))
+
+
+def _wait_for_server(url, timeout=30):
+    parsed = urlparse(url)
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((parsed.hostname, parsed.port or 80), timeout=1).close()
+            return
+        except socket.error:
+            time.sleep(0.2)
+    raise RuntimeError('The server at %s did not start' % url)
+
+
+def _get_total(url, token):
+    parsed = urlparse(url)
+    connection = HTTPConnection(parsed.hostname, parsed.port or 80)
+    connection.request('GET', parsed.path.rstrip('/') + _query([('page_size', 1)]), headers={'X-API-Token': token})
+    response = connection.getresponse()
+    body = json.loads(response.read().decode('utf-8'))
+    if response.status != 200:
+        raise RuntimeError('Request failed (%s): %s' % (response.status, body))
+    return body['metadata']['number_of_objects']
+
+
+def run(args):
+    scenarios = args['--scenarios'].split(',') if args['--scenarios'] else list(SCENARIOS)
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        print('Unknown scenarios: %s (choices are %s)' % (', '.join(unknown), ', '.join(SCENARIOS)))
+        return 2
+    token = args['--token']
+    if not token:
+        _setup_django()
+        from .inventory.data import get_benchmark_token
+        token = get_benchmark_token()
+    url = args['--url']
+    server = None
+    if args['--serve']:
+        port = urlparse(url).port or 80
+        # The server's log of each request is discarded, so that it doesn't slow it down
+        with open(os.devnull, 'w') as devnull:
+            server = subprocess.Popen([sys.executable, '-m', 'benchmarks.load', 'serve', '--port=%d' % port],
+                                      cwd=ROOT, stdout=devnull, stderr=devnull)
+    try:
+        _wait_for_server(url)
+        total = _get_total(url, token)
+        processes = int(args['--processes'])
+        duration = float(args['--duration'])
+        print('Running %s with %d processes for %.0f seconds, over %d volumes' % (
+            ', '.join(scenarios), processes, duration, total))
+        start = time.time()
+        jobs = [(url, token, scenarios, start + duration, seed, total) for seed in range(processes)]
+        pool = Pool(processes)
+        try:
+            samples = [sample for samples in pool.map(_worker, jobs) for sample in samples]
+        finally:
+            pool.close()
+        summary = summarize(samples, time.time() - start)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    _print_summary(summary)
+    if args['--output']:
+        with open(args['--output'], 'w') as f:
+            json.dump(OrderedDict([('processes', processes), ('duration', duration), ('volumes', total),
+                                   ('scenarios', summary)]), f, indent=4)
+    return 0
+
+
+def main(argv=sys.argv[1:]):
+    from docopt import docopt
+    args = docopt(__doc__, argv=argv)
+    if args['generate']:
+        return generate(args)
+    if args['serve']:
+        return serve(args)
+    return run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
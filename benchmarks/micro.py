@@ -0,0 +1,336 @@
+'''Micro-benchmarks of the hot paths of infi.django_rest_utils, on a synthetic SQLite inventory.
+
+Usage:
+    micro.py [options]
+
+Options:
+    --output=<filename>     save the results as JSON
+    --baseline=<filename>   compare the results with those of a previous run (saved with --output)
+    --threshold=<percent>   slowdown which counts as a regression [default: 20]
+    --objects=<n>           number of synthetic volumes [default: 20000]
+    --repeat=<n>            number of timing repetitions [default: 5]
+    --only=<names>          run only the given benchmarks (comma-separated)
+
+Run from the repository root: python -m benchmarks.micro --output=results.json --baseline=baseline.json
+The exit status is 1 when any benchmark regressed by more than the threshold.
+'''
+from __future__ import print_function
+from collections import OrderedDict
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+
+MIN_DURATION = 0.2
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(func):
+    '''
+    Registers a benchmark. The function receives the dataset size and returns the callable to time, along with the
+    number of items it processes per call (for computing throughput). Callables which have a true "self_timed"
+    attribute are called once per repetition, and return their own duration.
+    '''
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+def _get_request(params=None):
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    return Request(APIRequestFactory().get('/volumes/', params or {}))
+
+
+def _get_view(request):
+    from .inventory.views import VolumeViewSet
+    view = VolumeViewSet(request=request, format_kwarg=None, kwargs={}, action='list')
+    return view
+
+
+def _get_records(count=1000):
+    from .inventory.models import Volume
+    from .inventory.views import VolumeSerializer
+    data = VolumeSerializer(Volume.objects.select_related('owner')[:count], many=True).data
+    # Plain dicts and strings, as seen by the renderers
+    return json.loads(json.dumps(data, default=str))
+
+
+@benchmark
+def filter_build_q(objects):
+    from infi.django_rest_utils.filters import InfinidatFilter
+    from .inventory.models import Volume
+    backend = InfinidatFilter()
+    fields = dict((field.name, field) for field in Volume.get_filterable_fields())
+    exprs = [
+        (fields['name'], 'volume-1'),
+        (fields['name'], 'like:volume-1'),
+        (fields['size'], 'between:[1000,2000]'),
+        (fields['pool'], 'in:[pool-1,pool-2,pool-3]'),
+        (fields['created_at'], 'gt:2017-01-01'),
+        (fields['capacity'], 'ge:1TB'),
+        (fields['owner'], 'ne:owner-1'),
+    ]
+
+    def run():
+        for field, expr in exprs:
+            backend._build_q(field, expr)
+    return run, len(exprs)
+
+
+@benchmark
+def filter_queryset(objects):
+    from infi.django_rest_utils.filters import InfinidatFilter, OrderingFilter
+    from .inventory.models import Volume
+    request = _get_request({'pool': 'in:[pool-1,pool-2]', 'size': 'gt:1000', 'name': 'like:vol', 'sort': '-size'})
+    view = _get_view(request)
+    backends = [InfinidatFilter(), OrderingFilter()]
+
+    def run():
+        queryset = Volume.objects.all()
+        for backend in backends:
+            queryset = backend.filter_queryset(request, queryset, view)
+        str(queryset.query)
+    return run, 1
+
+
+@benchmark
+def convert_capacity(objects):
+    from infi.django_rest_utils.filters import _convert_capacity
+
+    def run():
+        _convert_capacity('100 GiB')
+        _convert_capacity(['1GB', '2', '3', '4TB'])
+    return run, 5
+
+
+@benchmark
+def paginator_first_page(objects):
+    from infi.django_rest_utils.pagination import LargeQuerySetPaginator
+    from .inventory.models import Volume
+    queryset = Volume.objects.select_related('owner').order_by('id')
+
+    def run():
+        list(LargeQuerySetPaginator(queryset, 100).page(1))
+    return run, 100
+
+
+@benchmark
+def paginator_deep_page_filtered(objects):
+    from infi.django_rest_utils.pagination import LargeQuerySetPaginator
+    from .inventory.models import Volume
+    queryset = Volume.objects.select_related('owner').filter(is_active=True).order_by('id')
+    page = max(1, objects // 100 // 2)
+
+    def run():
+        list(LargeQuerySetPaginator(queryset, 100).page(page))
+    return run, 100
+
+
+@benchmark
+def pluck_result(objects):
+    from infi.django_rest_utils.pluck import pluck_result
+    records = _get_records()
+
+    def run():
+        pluck_result(records, ['name', 'owner_name', 'size'])
+    return run, len(records)
+
+
+@benchmark
+def traverse(objects):
+    from infi.django_rest_utils.pluck import traverse
+    records = _get_records()
+
+    def run():
+        list(traverse('*.owner_name', records))
+    return run, len(records)
+
+
+@benchmark
+def to_csv_row(objects):
+    from infi.django_rest_utils.utils import to_csv_row
+    records = _get_records()
+    field_list = list(records[0].keys())
+
+    def run():
+        for record in records:
+            to_csv_row(field_list, record)
+    return run, len(records)
+
+
+@benchmark
+def json_render(objects):
+    from rest_framework.response import Response
+    from infi.django_rest_utils.renderers import InfinidatJSONRenderer
+    records = _get_records()
+    request = _get_request({'fields': 'name,owner_name,size,pool'})
+    renderer = InfinidatJSONRenderer()
+    data = OrderedDict([('number_of_objects', objects), ('page_size', len(records)), ('pages_total', 1),
+                        ('page', 1), ('next', None), ('previous', None), ('results', records)])
+
+    def run():
+        context = dict(request=request, response=Response(), view=None)
+        renderer.render(data, 'application/json', context)
+    return run, len(records)
+
+
+def _streaming_benchmark(params):
+    from rest_framework.test import APIRequestFactory
+    from .inventory.views import AnonymousVolumeViewSet
+    view = AnonymousVolumeViewSet.as_view({'get': 'list'})
+    factory = APIRequestFactory()
+
+    def run():
+        response = view(factory.get('/volumes/', params))
+        for chunk in response.streaming_content:
+            pass
+    return run
+
+
+@benchmark
+def streaming_json(objects):
+    return _streaming_benchmark({'stream': 'true'}), objects
+
+
+@benchmark
+def streaming_csv(objects):
+    return _streaming_benchmark({'format': 'csv'}), objects
+
+
+_IMPORT_SCRIPT = '''
+import sys, time
+start = time.time()
+import django
+django.setup()
+from infi.django_rest_utils import (authentication, filters, metadata, pagination, renderers, routers, serializers,
+                                    views, viewsets)
+sys.stdout.write(repr(time.time() - start))
+'''
+
+
+@benchmark
+def import_time(objects):
+    # Measured in a new interpreter, excluding its own startup
+    import subprocess
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([os.path.join(ROOT, 'src'), ROOT]))
+
+    def run():
+        return float(subprocess.check_output([sys.executable, '-c', _IMPORT_SCRIPT], env=env, cwd=ROOT))
+    run.self_timed = True
+    return run, 1
+
+
+def measure(func, repeat):
+    '''
+    Returns the durations of a single call (in seconds) over several repetitions, where each repetition makes enough
+    calls to last at least MIN_DURATION.
+    '''
+    if getattr(func, 'self_timed', False):
+        return 1, sorted(func() for i in range(repeat))
+    number = 1
+    while True:
+        start = time.time()
+        for i in range(number):
+            func()
+        duration = time.time() - start
+        if duration >= MIN_DURATION:
+            break
+        number *= 10 if duration < MIN_DURATION / 10 else 2
+    durations = [duration / number]
+    for i in range(repeat - 1):
+        start = time.time()
+        for j in range(number):
+            func()
+        durations.append((time.time() - start) / number)
+    return number, sorted(durations)
+
+
+def setup(objects):
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from .inventory.data import generate
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    generate(objects)
+
+
+def run_benchmarks(names, objects, repeat):
+    results = OrderedDict()
+    for name in names:
+        func, items = BENCHMARKS[name](objects)
+        if not getattr(func, 'self_timed', False):
+            func()  # Warm up caches
+        number, durations = measure(func, repeat)
+        median = durations[len(durations) // 2]
+        results[name] = OrderedDict([
+            ('min', durations[0]),
+            ('median', median),
+            ('calls', number),
+            ('items_per_second', items / median if median else None),
+        ])
+        print('{:<30} {:>12.1f}us {:>12.1f}us {:>14.0f}/s'.format(
+            name, durations[0] * 1e6, median * 1e6, results[name]['items_per_second']))
+    return results
+
+
+def compare(results, baseline, threshold):
+    '''
+    Prints the change of each benchmark relative to the baseline, and returns the names of the benchmarks which
+    regressed by more than threshold percent. Minimal durations are compared, since they are the least noisy.
+    '''
+    regressions = []
+    print()
+    print('{:<30} {:>12} {:>12} {:>9}'.format('benchmark', 'baseline', 'current', 'change'))
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before, after = baseline[name]['min'], result['min']
+        change = (after - before) * 100.0 / before
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print('{:<30} {:>10.1f}us {:>10.1f}us {:>+8.1f}%{}'.format(
+            name, before * 1e6, after * 1e6, change, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main(argv=sys.argv[1:]):
+    from docopt import docopt
+    args = docopt(__doc__, argv=argv)
+    objects = int(args['--objects'])
+    names = args['--only'].split(',') if args['--only'] else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        print('Unknown benchmarks: %s (choices are %s)' % (', '.join(unknown), ', '.join(BENCHMARKS)))
+        return 2
+    setup(objects)
+    print('{:<30} {:>14} {:>14} {:>16}'.format('benchmark', 'min', 'median', 'throughput'))
+    results = run_benchmarks(names, objects, int(args['--repeat']))
+    if args['--output']:
+        import django
+        with open(args['--output'], 'w') as f:
+            json.dump(OrderedDict([
+                ('python', platform.python_version()),
+                ('django', django.get_version()),
+                ('objects', objects),
+                ('results', results),
+            ]), f, indent=4)
+    if args['--baseline']:
+        with open(args['--baseline']) as f:
+            baseline = json.load(f)
+        if baseline.get('objects') != objects:
+            print('Warning: the baseline was measured with %s objects' % baseline.get('objects'))
+        regressions = compare(results, baseline['results'], float(args['--threshold']))
+        if regressions:
+            print('\n%d benchmark(s) regressed by more than %s%%' % (len(regressions), args['--threshold']))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
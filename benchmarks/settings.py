@@ -0,0 +1,59 @@
+'''
+Django settings for the benchmarks. The database is an in-memory SQLite database, unless BENCHMARK_SQLITE_FILE
+is set in the environment, or BENCHMARK_POSTGRES_DB (along with the optional BENCHMARK_POSTGRES_HOST,
+BENCHMARK_POSTGRES_PORT, BENCHMARK_POSTGRES_USER and BENCHMARK_POSTGRES_PASSWORD) for a local PostgreSQL database.
+'''
+import os
+
+SECRET_KEY = 'benchmarks'
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+USE_TZ = True
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'rest_framework',
+    'infi.django_rest_utils',
+    'benchmarks.inventory',
+]
+if os.environ.get('BENCHMARK_POSTGRES_DB'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ['BENCHMARK_POSTGRES_DB'],
+            'HOST': os.environ.get('BENCHMARK_POSTGRES_HOST', 'localhost'),
+            'PORT': os.environ.get('BENCHMARK_POSTGRES_PORT', ''),
+            'USER': os.environ.get('BENCHMARK_POSTGRES_USER', ''),
+            'PASSWORD': os.environ.get('BENCHMARK_POSTGRES_PASSWORD', ''),
+            'CONN_MAX_AGE': 60,
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCHMARK_SQLITE_FILE', ':memory:'),
+        }
+    }
+ROOT_URLCONF = 'benchmarks.urls'
+TEMPLATES = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}]
+QUERY_OBJECT_COUNT_LIMIT = 1000
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'infi.django_rest_utils.renderers.InfinidatJSONRenderer',
+        'infi.django_rest_utils.renderers.DummyCSVRenderer',
+    ),
+    'DEFAULT_FILTER_BACKENDS': (
+        'infi.django_rest_utils.filters.SimpleFilter',
+        'infi.django_rest_utils.filters.InfinidatFilter',
+        'infi.django_rest_utils.filters.OrderingFilter',
+    ),
+    'DEFAULT_AUTHENTICATION_CLASSES': (
+        'infi.django_rest_utils.authentication.APITokenAuthentication',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
+    'DEFAULT_PAGINATION_CLASS': 'infi.django_rest_utils.pagination.InfinidatLargeSetPaginationSerializer',
+    'ORDERING_PARAM': 'sort',
+    'PAGE_SIZE': 50,
+    'MAX_PAGINATE_BY': 1000,
+}
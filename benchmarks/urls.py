@@ -0,0 +1,16 @@
+try:
+    from django.urls import include, re_path as url
+except ImportError:
+    from django.conf.urls import include, url
+
+from infi.django_rest_utils.routers import DefaultRouter
+
+from .inventory.views import VolumeViewSet
+
+router = DefaultRouter(name='Benchmark inventory')
+router.register('volumes', VolumeViewSet)
+
+urlpatterns = [
+    url(r'^api/', include(router.urls)),
+    url(r'^api/rest/', include('infi.django_rest_utils.urls')),
+]
@@ -1 +1,4 @@
 __import__("pkg_resources").declare_namespace(__name__)
+
+# For Django < 3.2, which doesn't detect the AppConfig in apps.py
+default_app_config = 'infi.django_rest_utils.apps.DjangoRestUtilsConfig'
@@ -0,0 +1,270 @@
+'''
+Admission control for streamed responses (see views.StreamingMixin). Each stream holds a database cursor (and
+connection) until the client finishes downloading it, so the number of concurrent streams is limited globally, by the
+REST_MAX_STREAMS setting, and for each user (or anonymous client address), by REST_MAX_STREAMS_PER_USER. Either
+limit is disabled when its setting is None, which is the default.
+
+When the REST_STREAM_SLOTS_DIR setting is defined, the slots are exclusive locks (flock) on files within that
+directory, so the limits are shared by all the processes on the host (e.g. gunicorn workers), and the slots of a
+process which dies are released by the operating system. Otherwise, the limits apply to each process separately.
+Either way, the active streams reported by the metrics are those of the process that serves the metrics request.
+'''
+from __future__ import absolute_import
+from builtins import object
+from threading import Lock
+import errno
+import glob
+import hashlib
+import os
+
+from django.conf import settings
+
+
+ACTIVE_STREAMS_METRIC = 'django_rest_utils_active_streams'
+ACTIVE_STREAM_USERS_METRIC = 'django_rest_utils_active_stream_users'
+MAX_STREAMS_METRIC = 'django_rest_utils_max_streams'
+
+
+def get_max_streams():
+    return getattr(settings, 'REST_MAX_STREAMS', None)
+
+
+def get_max_streams_per_user():
+    return getattr(settings, 'REST_MAX_STREAMS_PER_USER', None)
+
+
+def get_retry_after():
+    return getattr(settings, 'REST_STREAM_RETRY_AFTER', 5)
+
+
+def get_client_key(request):
+    '''
+    Identifies the user of a request, or the address of an anonymous client.
+    '''
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return 'user:%s' % user.pk
+    return 'address:%s' % request.META.get('REMOTE_ADDR', '')
+
+
+class Slot(object):
+    '''
+    A stream's admission, which must be released when the stream ends. Releasing is idempotent.
+    '''
+
+    def __init__(self, release):
+        self._release = release
+
+    def release(self):
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class LocalSlots(object):
+    '''
+    Slots counted within the current process.
+    '''
+
+    def __init__(self):
+        self._lock = Lock()
+        self._active = 0
+        self._active_by_client = {}
+
+    def acquire(self, client_key, max_streams, max_streams_per_user):
+        with self._lock:
+            client_active = self._active_by_client.get(client_key, 0)
+            if max_streams is not None and self._active >= max_streams:
+                return None
+            if max_streams_per_user is not None and client_active >= max_streams_per_user:
+                return None
+            self._active += 1
+            self._active_by_client[client_key] = client_active + 1
+        return Slot(lambda: self._release(client_key))
+
+    def _release(self, client_key):
+        with self._lock:
+            self._active -= 1
+            remaining = self._active_by_client.pop(client_key) - 1
+            if remaining:
+                self._active_by_client[client_key] = remaining
+
+    def get_active(self):
+        '''
+        Returns the number of active streams, and the number of clients that have active streams.
+        '''
+        with self._lock:
+            return self._active, len(self._active_by_client)
+
+
+class FileSlots(object):
+    '''
+    Slots which are exclusive locks on the files <prefix>_<index>.lock within a directory, shared by all the processes
+    which use that directory. Global slots have the prefix "stream", and the slots of each client (only used when
+    there is a limit per user) have a prefix made of "client" and a hash of the client key.
+    A file is removed by the holder of its lock when the slot is released, so the directory holds only the files of
+    active slots, and of processes which died - which are removed when the next process starts.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        # Counts the streams of this process, for the metrics
+        self._local = LocalSlots()
+        self.remove_stale()
+
+    def _get_path(self, prefix, index):
+        return os.path.join(self.directory, '%s_%d.lock' % (prefix, index))
+
+    def _try_lock(self, path):
+        '''
+        Returns the file descriptor of the given file, locked, or None when it is locked by someone else.
+        '''
+        import fcntl
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError) as e:
+                os.close(fd)
+                if e.errno not in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK):
+                    raise
+                return None
+            try:
+                current = os.stat(path)
+            except OSError:
+                current = None
+            stat = os.fstat(fd)
+            if current is not None and (current.st_dev, current.st_ino) == (stat.st_dev, stat.st_ino):
+                return fd
+            # The previous holder removed the file after it was opened - lock the new one instead
+            os.close(fd)
+
+    def _unlock(self, fd, path):
+        # Removing the file before closing it (which releases the lock) ensures that the file is removed only by its
+        # holder, while anyone who opened it before will retry with a new file (see _try_lock)
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        os.close(fd)
+
+    def _lock(self, prefix, limit):
+        '''
+        Locks the first free slot with the given prefix, out of the given number of slots, and returns a function that
+        releases it. Returns None when all the slots are taken.
+        '''
+        for index in range(limit):
+            path = self._get_path(prefix, index)
+            fd = self._try_lock(path)
+            if fd is not None:
+                return lambda: self._unlock(fd, path)
+        return None
+
+    def acquire(self, client_key, max_streams, max_streams_per_user):
+        releases = []
+        if max_streams_per_user is not None:
+            client_prefix = 'client_' + hashlib.sha1(client_key.encode('utf-8')).hexdigest()[:16]
+            releases.append(self._lock(client_prefix, max_streams_per_user))
+        if max_streams is not None and None not in releases:
+            releases.append(self._lock('stream', max_streams))
+        if None in releases:
+            for release in releases:
+                if release is not None:
+                    release()
+            return None
+        releases.append(self._local.acquire(client_key, None, None).release)
+
+        def release():
+            for release_slot in releases:
+                release_slot()
+        return Slot(release)
+
+    def remove_stale(self):
+        '''
+        Removes the files which are not locked, left behind by processes which died.
+        '''
+        for path in glob.glob(os.path.join(self.directory, '*_*.lock')):
+            fd = self._try_lock(path)
+            if fd is not None:
+                self._unlock(fd, path)
+
+    def get_active(self):
+        '''
+        Returns the number of active streams of this process, and the number of clients that have them.
+        '''
+        return self._local.get_active()
+
+
+_slots = None
+
+
+def get_slots():
+    global _slots
+    if _slots is None:
+        directory = getattr(settings, 'REST_STREAM_SLOTS_DIR', None)
+        _slots = FileSlots(directory) if directory else LocalSlots()
+    return _slots
+
+
+def acquire(request):
+    '''
+    Returns a Slot for a stream of the given request, or None when the request is over the limits.
+    '''
+    return get_slots().acquire(get_client_key(request), get_max_streams(), get_max_streams_per_user())
+
+
+class ReleasingIterator(object):
+    '''
+    Wraps the content of a streamed response, and releases its slot once the content is exhausted or closed (Django
+    closes the content when the response is closed, including when the client disconnects).
+    '''
+
+    def __init__(self, iterable, slot):
+        self._slot = slot
+        self._iterator = iter(iterable)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except StopIteration:
+            self.close()
+            raise
+
+    next = __next__  # Python 2
+
+    def close(self):
+        try:
+            close = getattr(self._iterator, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            self._slot.release()
+
+    def __del__(self):
+        self._slot.release()
+
+
+def to_prometheus_text():
+    '''
+    Formats the gauges of active streams in the Prometheus text exposition format.
+    '''
+    streams, clients = get_slots().get_active()
+    lines = [
+        '# HELP %s Number of streamed responses in progress.' % ACTIVE_STREAMS_METRIC,
+        '# TYPE %s gauge' % ACTIVE_STREAMS_METRIC,
+        '%s %d' % (ACTIVE_STREAMS_METRIC, streams),
+        '# HELP %s Number of users (or anonymous clients) with streamed responses in progress.'
+        % ACTIVE_STREAM_USERS_METRIC,
+        '# TYPE %s gauge' % ACTIVE_STREAM_USERS_METRIC,
+        '%s %d' % (ACTIVE_STREAM_USERS_METRIC, clients),
+    ]
+    if get_max_streams() is not None:
+        lines.extend([
+            '# HELP %s Maximal number of concurrent streamed responses.' % MAX_STREAMS_METRIC,
+            '# TYPE %s gauge' % MAX_STREAMS_METRIC,
+            '%s %d' % (MAX_STREAMS_METRIC, get_max_streams()),
+        ])
+    return '\n'.join(lines) + '\n'
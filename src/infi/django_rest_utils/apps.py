@@ -0,0 +1,72 @@
+from __future__ import absolute_import
+from time import time
+import logging
+
+from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up_view(viewset):
+    '''
+    Precomputes the per-view caches (filterable fields, ordering fields and serializer field names) of a viewset,
+    which would otherwise be computed on its first request.
+    '''
+    from .filters import _get_filterable_fields
+    from .renderers import get_field_names
+    view = viewset(request=None, format_kwarg=None, args=(), kwargs={}, action='list')
+    if not getattr(view, 'cache_view_introspection', True) or not hasattr(view, 'get_serializer'):
+        return
+    get_field_names(view)
+    _get_filterable_fields(view)
+    for backend_class in getattr(view, 'filter_backends', ()):
+        backend = backend_class()
+        if hasattr(backend, 'get_ordering_fields'):
+            backend.get_ordering_fields(view)
+
+
+def warm_up(load_urls=True):
+    '''
+    Warms up the views registered with DefaultRouter instances, along with lazily-imported modules, and returns the
+    number of views which were warmed up. With load_urls, the URL configuration (which usually creates the routers) is
+    loaded first. Call this from wsgi.py, after get_wsgi_application(), so that it happens before the server forks its
+    workers (e.g. with gunicorn --preload).
+    '''
+    from django.urls import get_resolver
+    from .filters import _get_capacity_module
+    from .routers import routers_registry
+    _get_capacity_module()
+    if load_urls:
+        get_resolver().url_patterns
+    count = 0
+    for router in routers_registry:
+        for prefix, viewset, basename in router.registry:
+            try:
+                warm_up_view(viewset)
+                count += 1
+            except Exception:
+                # Some views can only be introspected in the context of a request
+                logger.debug('Could not warm up %s', viewset.__name__, exc_info=True)
+    return count
+
+
+class DjangoRestUtilsConfig(AppConfig):
+    name = 'infi.django_rest_utils'
+    verbose_name = 'Django REST utils'
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        # Connects the signal handlers which invalidate the token and metadata caches
+        from . import authentication, metadata
+        if not getattr(settings, 'REST_UTILS_WARM_UP', True):
+            return
+        start = time()
+        try:
+            # The URL configuration can't be loaded yet, since other apps may not be ready (e.g. the admin site
+            # registers its models in ready), so only routers which were already created are warmed up
+            count = warm_up(load_urls=False)
+        except Exception:
+            logger.warning('Failed to warm up the API views', exc_info=True)
+        else:
+            logger.debug('Warmed up %d API views in %.1fms', count, (time() - start) * 1000)
@@ -1,7 +1,10 @@
 from __future__ import absolute_import
 from builtins import str
+from collections import namedtuple
+import copy
 
 from django.conf import settings
+from django.db.models.signals import post_save, post_delete
 from django.template.loader import render_to_string
 from rest_framework import authentication, exceptions
 
@@ -11,30 +14,66 @@ except ImportError:
     # Django < 2
     from django.core.urlresolvers import reverse
 
-from .models import APIToken
+from .cache import TTLCache
+from .models import APIToken, hash_token
+
+
+_CachedToken = namedtuple('_CachedToken', 'user_id is_active user')
 
 
 class APITokenAuthentication(authentication.BaseAuthentication):
     '''
     Authenticates API requests by looking for a valid API token in the X-API-Token header
     The REST API token is openly displayed in the browser.
+    Resolved tokens are cached in-process for API_TOKEN_CACHE_TTL seconds (default 60, 0 disables the cache),
+    and invalid tokens for API_TOKEN_CACHE_NEGATIVE_TTL seconds (default 5). Invalid tokens are kept in a separate,
+    smaller cache, so that a flood of invalid tokens (e.g. brute force) can't evict the valid ones.
     '''
 
+    token_cache = TTLCache(max_size=10000)
+    invalid_token_cache = TTLCache(max_size=1000)
+    user_token_cache = TTLCache(max_size=1000, ttl=60)  # For the browsable API description
+
     def authenticate(self, request):
         token = request.META.get('HTTP_X_API_TOKEN')
         if not token:
             return None
-        try:
-            api_token = APIToken.objects.get(token=token)
-        except APIToken.DoesNotExist:
-            raise exceptions.AuthenticationFailed("Invalid API token '%s'" % token)
-        if api_token.user.is_active:
-            # returns token only if the user is active
-            return (api_token.user, None)
+        token_hash = hash_token(token)
+        cached = self.token_cache.get(token_hash, _MISSING)
+        if cached is _MISSING:
+            if self.invalid_token_cache.get(token_hash, _MISSING) is not _MISSING:
+                raise exceptions.AuthenticationFailed("Invalid API token '%s'" % token)
+            try:
+                api_token = APIToken.objects.for_token(token)
+            except APIToken.DoesNotExist:
+                self.invalid_token_cache.set(token_hash, True, getattr(settings, 'API_TOKEN_CACHE_NEGATIVE_TTL', 5))
+                raise exceptions.AuthenticationFailed("Invalid API token '%s'" % token)
+            cached = _CachedToken(api_token.user_id, api_token.user.is_active, api_token.user)
+            self.token_cache.set(token_hash, cached, getattr(settings, 'API_TOKEN_CACHE_TTL', 60))
+        if cached.is_active:
+            # returns token only if the user is active.
+            # the cached user is copied, so that requests don't share (and modify) the same instance
+            return (copy.copy(cached.user), None)
         return None
 
+    @classmethod
+    def get_cache_stats(cls):
+        '''
+        Returns the token cache counters: size, hits (including negative hits), negative_hits, misses and hit_rate.
+        '''
+        stats = cls.token_cache.stats()
+        negative_hits = cls.invalid_token_cache.hits
+        # Negative hits are looked up after missing the cache of valid tokens
+        stats['hits'] += negative_hits
+        stats['misses'] -= negative_hits
+        stats['negative_hits'] = negative_hits
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = float(stats['hits']) / lookups if lookups else 0.0
+        return stats
+
     def get_authenticator_description(self, view, html):
-        token = APIToken.objects.for_user(view.request.user)
+        user = view.request.user
+        token = self.user_token_cache.get_or_set(user.pk, lambda: APIToken.objects.for_user(user).token)
         return render_to_string('django_rest_utils/api_token_authentication_openly_displayed.html', dict(token=str(token)))
 
 
@@ -48,3 +87,27 @@ class APITokenAuthentication_TokenSentByEmail(APITokenAuthentication):
         token_req_url = reverse('get_rest_api_token_for_user')  # settings.REST_API_TOKEN_EMAIL_REQUEST_URL
         user_name = view.request.user.username
         return render_to_string('django_rest_utils/api_token_authentication_sent_by_email.html', dict(token_req_url=token_req_url, user_name=str(user_name)))
+
+
+_MISSING = object()
+
+
+def _invalidate_cached_tokens_of_user(user_id):
+    APITokenAuthentication.token_cache.discard_if(lambda key, cached: cached.user_id == user_id)
+
+
+def _on_api_token_change(sender, instance, **kwargs):
+    # Drops a negatively cached entry of a new token, as well as the previous token of the user
+    APITokenAuthentication.invalid_token_cache.discard(instance.token_hash)
+    APITokenAuthentication.user_token_cache.discard(instance.user_id)
+    _invalidate_cached_tokens_of_user(instance.user_id)
+
+
+def _on_user_change(sender, instance, **kwargs):
+    _invalidate_cached_tokens_of_user(instance.pk)
+
+
+post_save.connect(_on_api_token_change, sender=APIToken, dispatch_uid='django_rest_utils_api_token_saved')
+post_delete.connect(_on_api_token_change, sender=APIToken, dispatch_uid='django_rest_utils_api_token_deleted')
+post_save.connect(_on_user_change, sender=settings.AUTH_USER_MODEL, dispatch_uid='django_rest_utils_user_saved')
+post_delete.connect(_on_user_change, sender=settings.AUTH_USER_MODEL, dispatch_uid='django_rest_utils_user_deleted')
@@ -0,0 +1,221 @@
+'''
+Executes a batch of GET requests within a single request (see views.batch_view).
+
+Each sub-request is dispatched directly to the view its URL resolves to, as the user that authenticated the batch
+request, so it goes through the view's permissions, filtering, pagination and rendering but not through the
+middleware. Sub-requests run in parallel on a pool of REST_BATCH_MAX_WORKERS threads per process, unless the batch
+request is inside a transaction (e.g. with ATOMIC_REQUESTS), since other threads would use other database connections
+and not see its changes. The pool's threads are kept between batches, and their database connections are reused
+(or closed) according to CONN_MAX_AGE, like the connections of the threads which handle requests.
+'''
+from __future__ import absolute_import
+from builtins import object
+from builtins import str
+from io import BytesIO
+from queue import Queue
+from threading import Lock, Thread
+import json
+import logging
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.exceptions import PermissionDenied
+from django.db import close_old_connections, connections
+from django.http import Http404
+from django.urls import Resolver404, get_script_prefix, resolve
+from django.utils import translation
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(ValueError):
+    pass
+
+
+def get_max_requests():
+    return getattr(settings, 'REST_BATCH_MAX_REQUESTS', 50)
+
+
+def get_max_workers():
+    return getattr(settings, 'REST_BATCH_MAX_WORKERS', 4)
+
+
+class SubResponse(object):
+    '''
+    The outcome of a sub-request. Its body is either JSON (as bytes, to be embedded as is) or text.
+    '''
+
+    def __init__(self, url, status, body, is_json):
+        self.url = url
+        self.status = status
+        self.body = body
+        self.is_json = is_json
+
+    def to_json(self):
+        '''
+        Returns the JSON representation of the sub-response, embedding its JSON body without decoding it.
+        '''
+        body = self.body if self.is_json else json.dumps(self.body).encode('utf-8')
+        return b''.join([b'{"url":', json.dumps(self.url).encode('utf-8'), b',"status":',
+                         str(self.status).encode('ascii'), b',"body":', body or b'null', b'}'])
+
+
+def _error(url, status, message):
+    body = dict(metadata=dict(ready=True), result=None, error=dict(message=message))
+    return SubResponse(url, status, json.dumps(body).encode('utf-8'), True)
+
+
+def parse_urls(data):
+    '''
+    Returns the URLs of a batch request body, which is either a list of URLs or an object with a "requests" list.
+    '''
+    urls = data.get('requests') if isinstance(data, dict) else data
+    if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+        raise BatchError('Expected a list of URLs')
+    if len(urls) > get_max_requests():
+        raise BatchError('Too many requests (the maximum is %d)' % get_max_requests())
+    for url in urls:
+        parts = urlsplit(url)
+        if parts.scheme or parts.netloc or not parts.path.startswith('/'):
+            raise BatchError('Only relative URLs are supported (got "%s")' % url)
+    return urls
+
+
+def build_subrequest(request, url):
+    '''
+    Returns a GET request for the given URL, with the headers of the batch request and its authenticated user.
+    '''
+    parts = urlsplit(url)
+    path = parts.path
+    prefix = get_script_prefix()
+    path_info = path[len(prefix) - 1:] if path.startswith(prefix) else path
+    environ = dict(request.META)
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': prefix.rstrip('/'),
+        'PATH_INFO': path_info,
+        'QUERY_STRING': parts.query,
+        'HTTP_ACCEPT': 'application/json',
+        'CONTENT_LENGTH': '0',
+        'wsgi.input': BytesIO(),
+    })
+    environ.pop('CONTENT_TYPE', None)
+    subrequest = WSGIRequest(environ)
+    subrequest.user = request.user
+    # Django REST framework uses the forced user and token instead of authenticating again
+    subrequest._force_auth_user = request.user
+    subrequest._force_auth_token = request.auth
+    return subrequest, path_info
+
+
+def execute(request, url, excluded_views=()):
+    '''
+    Dispatches a GET of the given URL to its view, and returns a SubResponse.
+    '''
+    subrequest, path_info = build_subrequest(request, url)
+    try:
+        match = resolve(path_info)
+    except Resolver404:
+        return _error(url, 404, 'Not found')
+    if match.func in excluded_views:
+        return _error(url, 400, 'Batch requests cannot be nested')
+    subrequest.resolver_match = match
+    try:
+        response = match.func(subrequest, *match.args, **match.kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            response.render()
+    except Http404:
+        return _error(url, 404, 'Not found')
+    except PermissionDenied:
+        return _error(url, 403, 'Permission denied')
+    except Exception:
+        logger.exception('Batched request to %s failed', url)
+        return _error(url, 500, 'Internal server error')
+    if getattr(response, 'streaming', False):
+        if hasattr(response, 'close'):
+            response.close()
+        return _error(url, 400, 'Streamed responses are not supported in batch requests')
+    content_type = response.get('Content-Type', '')
+    if content_type.startswith('application/json'):
+        return SubResponse(url, response.status_code, response.content, True)
+    return SubResponse(url, response.status_code, response.content.decode(response.charset, 'replace'), False)
+
+
+def _in_transaction():
+    return any(connection.in_atomic_block for connection in connections.all())
+
+
+class WorkerPool(object):
+    '''
+    A fixed number of worker threads which execute tasks (callables) from a queue.
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self._tasks = Queue()
+        for index in range(size):
+            thread = Thread(target=self._work, name='batch-worker-%d' % index)
+            thread.daemon = True
+            thread.start()
+
+    def submit(self, task):
+        self._tasks.put(task)
+
+    def _work(self):
+        while True:
+            task = self._tasks.get()
+            # Like a request thread, the worker closes connections that are broken or older than CONN_MAX_AGE
+            close_old_connections()
+            try:
+                task()
+            except Exception:
+                logger.exception('Batch worker task failed')
+            finally:
+                close_old_connections()
+
+
+_pool = None
+_pool_lock = Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = WorkerPool(get_max_workers())
+        return _pool
+
+
+def execute_all(request, urls, excluded_views=()):
+    '''
+    Executes the sub-requests of a batch, and returns their SubResponses in the order of the URLs.
+    '''
+    if get_max_workers() <= 1 or len(urls) <= 1 or _in_transaction():
+        return [execute(request, url, excluded_views) for url in urls]
+    results = [None] * len(urls)
+    done = Queue()
+    language = translation.get_language()
+
+    def make_task(index, url):
+        def task():
+            try:
+                with translation.override(language):
+                    results[index] = execute(request, url, excluded_views)
+            except Exception:
+                logger.exception('Batched request to %s failed', url)
+                results[index] = _error(url, 500, 'Internal server error')
+            finally:
+                done.put(index)
+        return task
+
+    pool = get_pool()
+    for index, url in enumerate(urls):
+        pool.submit(make_task(index, url))
+    for url in urls:
+        done.get()
+    return results
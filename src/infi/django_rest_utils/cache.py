@@ -0,0 +1,104 @@
+'''
+A small in-process cache, for values that are too expensive to compute on every request.
+'''
+from builtins import object
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+
+class TTLCache(object):
+    '''
+    A thread-safe LRU cache whose entries also expire after a time-to-live (in seconds).
+    The number of hits and misses is counted, see stats().
+    Note that the cache is per-process, so invalidation does not reach other worker processes;
+    the time-to-live bounds how stale their entries can get.
+    '''
+
+    def __init__(self, max_size=1000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if not ttl or ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, func, ttl=None):
+        '''
+        Returns the cached value for the key, or computes it by calling func() and caches it.
+        func is called without holding the lock, so concurrent misses may compute the value more than once.
+        '''
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = func()
+            self.set(key, value, ttl)
+        return value
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def discard_if(self, predicate):
+        '''
+        Discards all entries for which predicate(key, value) is true.
+        '''
+        with self._lock:
+            for key in [key for key, (value, _) in self._entries.items() if predicate(key, value)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return dict(
+            size=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=float(self.hits) / lookups if lookups else 0.0,
+        )
+
+
+_MISSING = object()
+
+
+_view_cache = TTLCache(max_size=2000, ttl=3600)
+
+
+def cached_for_view(view, key, func):
+    '''
+    Returns func(), cached per view class and serializer class (and the given key). This is meant for values that
+    are derived from the view's code - such as filterable fields or static documentation - rather than from the
+    request. Views whose serializer fields depend on the request can set cache_view_introspection = False.
+    '''
+    if not getattr(view, 'cache_view_introspection', True):
+        return func()
+    serializer_class = view.get_serializer_class() if hasattr(view, 'get_serializer_class') else None
+    return _view_cache.get_or_set((type(view), serializer_class, key), func)
@@ -0,0 +1,109 @@
+'''
+A background dispatcher for slow side effects of requests (such as sending email), so that they don't tie up
+the request workers.
+'''
+from builtins import object
+from threading import Lock, Thread
+from time import sleep, time
+import logging
+import os
+
+from django.conf import settings
+from django.db import connections
+
+try:
+    from queue import Queue, Full
+except ImportError:
+    # Python 2
+    from Queue import Queue, Full
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundDispatcher(object):
+    '''
+    Runs jobs one at a time in a background thread, which is started on the first submit (and again after a fork).
+    The queue is bounded - submit returns False when it is full. Failed jobs are retried up to max_retries times
+    with an exponential backoff starting at retry_delay seconds, and no more than rate_limit jobs are started
+    per second.
+    '''
+
+    def __init__(self, name, max_queue_size=100, max_retries=3, retry_delay=5.0, rate_limit=1.0):
+        self.name = name
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.rate_limit = rate_limit
+        self._queue = Queue(max_queue_size)
+        self._lock = Lock()
+        self._pid = None
+        self._last_start = 0
+
+    def submit(self, func, args=(), kwargs=None, on_failure=None):
+        '''
+        Queues func(*args, **kwargs). on_failure(exception) is called (in the background thread) if all
+        the attempts fail. Returns False if the queue is full.
+        '''
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((func, args, kwargs or {}, on_failure))
+        except Full:
+            logger.warning('{} queue is full, dropping job {}'.format(self.name, func.__name__))
+            return False
+        return True
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                worker = Thread(target=self._run, name=self.name)
+                worker.daemon = True
+                worker.start()
+
+    def _throttle(self):
+        if self.rate_limit:
+            delay = self._last_start + 1.0 / self.rate_limit - time()
+            if delay > 0:
+                sleep(delay)
+        self._last_start = time()
+
+    def _run(self):
+        while True:
+            func, args, kwargs, on_failure = self._queue.get()
+            for attempt in range(self.max_retries + 1):
+                self._throttle()
+                try:
+                    func(*args, **kwargs)
+                    break
+                except Exception as e:
+                    if attempt < self.max_retries:
+                        logger.warning('{} job {} failed ({}), retrying'.format(self.name, func.__name__, e))
+                        sleep(self.retry_delay * 2 ** attempt)
+                        continue
+                    logger.exception('{} job {} failed after {} attempts'.format(self.name, func.__name__, attempt + 1))
+                    if on_failure:
+                        try:
+                            on_failure(e)
+                        except Exception:
+                            logger.exception('{} failure callback of {} failed'.format(self.name, func.__name__))
+            # Database connections opened by the job (e.g. in on_failure) belong to this thread, don't leave them open
+            connections.close_all()
+            self._queue.task_done()
+
+
+_email_dispatcher = None
+
+
+def get_email_dispatcher():
+    '''
+    Returns the dispatcher used for sending email, configured by the REST_API_TOKEN_EMAIL_QUEUE_SIZE,
+    REST_API_TOKEN_EMAIL_RETRIES and REST_API_TOKEN_EMAIL_RATE_LIMIT (emails per second) settings.
+    '''
+    global _email_dispatcher
+    if _email_dispatcher is None:
+        _email_dispatcher = BackgroundDispatcher(
+            'django_rest_utils_email',
+            max_queue_size=getattr(settings, 'REST_API_TOKEN_EMAIL_QUEUE_SIZE', 100),
+            max_retries=getattr(settings, 'REST_API_TOKEN_EMAIL_RETRIES', 3),
+            rate_limit=getattr(settings, 'REST_API_TOKEN_EMAIL_RATE_LIMIT', 1.0),
+        )
+    return _email_dispatcher
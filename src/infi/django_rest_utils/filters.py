@@ -12,16 +12,33 @@ from rest_framework import filters
 from rest_framework.exceptions import ValidationError
 from collections import OrderedDict
 
+from .cache import cached_for_view
+from .timing import stage
 
-DEFAULT_IGNORE = [
-    settings.REST_FRAMEWORK['ORDERING_PARAM'],
-    'fields',
-    'page',
-    'page_size',
-    'format',
-    'q',
-    'stream',
-]
+
+def get_default_ignore():
+    '''
+    Returns the query parameters which are not filters, unless the view defines non_filtering_fields.
+    '''
+    return [
+        settings.REST_FRAMEWORK['ORDERING_PARAM'],
+        'fields',
+        'page',
+        'page_size',
+        'format',
+        'q',
+        'stream',
+        'changed_since',
+        'changed_until',
+        'changed_after',
+    ]
+
+
+def __getattr__(name):
+    # DEFAULT_IGNORE is computed on access, so that importing this module doesn't require the settings
+    if name == 'DEFAULT_IGNORE':
+        return get_default_ignore()
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
 
 class FilterableField(object):
     '''
@@ -102,6 +119,18 @@ class FilterableField(object):
         return filterable_fields
 
 
+_capacity_module = None
+
+
+def _get_capacity_module():
+    # Imported on first use, since the capacity package is only needed for capacity fields
+    global _capacity_module
+    if _capacity_module is None:
+        from capacity import capacity
+        _capacity_module = capacity
+    return _capacity_module
+
+
 def _convert_capacity(values):
     '''
     Converts values such as "100 GB" or "1TiB" to bytes. Unitless values are
@@ -109,7 +138,7 @@ def _convert_capacity(values):
     the units are applied to any unitless values. For example "1GB,2,3,4TB" is
     interpreted as "1GB,2TB,3TB,4TB". Units are case-sensitive.
     '''
-    from capacity import capacity
+    capacity = _get_capacity_module()
     # Check if we got a single value or multiple values
     single_value = (not isinstance(values, list))
     if single_value:
@@ -172,8 +201,12 @@ class Operator(object):
 def _get_filterable_fields(view):
     '''
     Get the list of filterable fields for the given view, or deduce them
-    from the serializer fields.
+    from the serializer fields. The result is cached per view class.
     '''
+    return cached_for_view(view, 'filterable_fields', lambda: _build_filterable_fields(view))
+
+
+def _build_filterable_fields(view):
     serializer = view.get_serializer()
     if hasattr(serializer, 'get_filterable_fields'):
         return serializer.get_filterable_fields()
@@ -228,6 +261,23 @@ def _normalize_query(query_string,
     return [normspace(' ', (t[0] or t[1]).strip()) for t in findterms(query_string)]
 
 
+OPERATORS = (
+    Operator('eq', 'exact', 'field = value'),
+    Operator('ne', 'exact', 'field <> value', negate=True),
+    Operator('lt', 'lt', 'field < value'),
+    Operator('le', 'lte', 'field <= value'),
+    Operator('gt', 'gt', 'field > value'),
+    Operator('ge', 'gte', 'field >= value'),
+    Operator('like', 'icontains', 'field contains a string (case insensitive)'),
+    Operator('unlike', 'icontains', 'field does not contain a string (case insensitive)', negate=True),
+    Operator('in', 'in', 'field is equal to one of the given values', max_vals=1000),
+    Operator('out', 'in', 'field is not equal to any of the given values', negate=True, max_vals=1000),
+    Operator('between', 'range', 'field is in a range of two values (inclusive)', min_vals=2, max_vals=2),
+    Operator('isnull', 'isnull', 'field is null', boolean=True, max_vals=0, title='is null'),
+    Operator('isnotnull', 'isnull', 'field is not null', boolean=True, max_vals=0, negate=True, title='is not null')
+)
+
+
 class InfinidatFilter(filters.BaseFilterBackend):
     '''
     Implements a filter backend that uses Infinidat's API syntax.
@@ -252,42 +302,30 @@ class InfinidatFilter(filters.BaseFilterBackend):
         return render_to_string('django_rest_utils/infinidat_filter.html', context)
 
     def filter_queryset(self, request, queryset, view):
-        filterable_fields = _get_filterable_fields(view)
-        ignored_fields = self._get_ignored_fields(view)
-        for field_name in request.GET.keys():
-            if field_name in ignored_fields:
-                continue
-            field = None
-            for f in filterable_fields:
-                if field_name == f.name:
-                    field = f
-                    break
-            if not field:
-                names = [f.name for f in filterable_fields]
-                raise ValidationError("Unknown filter field: '%s' (choices are %s)" % (field_name, ', '.join(names)))
-            for expr in request.GET.getlist(field_name):
-                queryset = self._apply_filter(queryset, field, expr)
-        return queryset
+        with stage(request, 'filter'):
+            filterable_fields = _get_filterable_fields(view)
+            ignored_fields = self._get_ignored_fields(view)
+            for field_name in request.GET.keys():
+                if field_name in ignored_fields:
+                    continue
+                field = None
+                for f in filterable_fields:
+                    if field_name == f.name:
+                        field = f
+                        break
+                if not field:
+                    names = [f.name for f in filterable_fields]
+                    raise ValidationError("Unknown filter field: '%s' (choices are %s)" % (field_name, ', '.join(names)))
+                for expr in request.GET.getlist(field_name):
+                    queryset = self._apply_filter(queryset, field, expr)
+            return queryset
 
     def _get_ignored_fields(self, view):
-        return getattr(view, 'non_filtering_fields', DEFAULT_IGNORE)
+        ignored_fields = getattr(view, 'non_filtering_fields', None)
+        return get_default_ignore() if ignored_fields is None else ignored_fields
 
     def _get_operators(self):
-        return [
-            Operator('eq', 'exact', 'field = value'),
-            Operator('ne', 'exact', 'field <> value', negate=True),
-            Operator('lt', 'lt', 'field < value'),
-            Operator('le', 'lte', 'field <= value'),
-            Operator('gt', 'gt', 'field > value'),
-            Operator('ge', 'gte', 'field >= value'),
-            Operator('like', 'icontains', 'field contains a string (case insensitive)'),
-            Operator('unlike', 'icontains', 'field does not contain a string (case insensitive)', negate=True),
-            Operator('in', 'in', 'field is equal to one of the given values', max_vals=1000),
-            Operator('out', 'in', 'field is not equal to any of the given values', negate=True, max_vals=1000),
-            Operator('between', 'range', 'field is in a range of two values (inclusive)', min_vals=2, max_vals=2),
-            Operator('isnull', 'isnull', 'field is null', boolean=True, max_vals=0, title='is null'),
-            Operator('isnotnull', 'isnull', 'field is not null', boolean=True, max_vals=0, negate=True, title='is not null')
-        ]
+        return list(OPERATORS)
 
     def _apply_filter(self, queryset, field, expr):
         q, negate = self._build_q(field, expr)
@@ -348,6 +386,10 @@ class SimpleFilter(object):
         return render_to_string('django_rest_utils/simple_filter.html', context)
 
     def filter_queryset(self, request, queryset, view):
+        with stage(request, 'search'):
+            return self._search(request, queryset, view)
+
+    def _search(self, request, queryset, view):
         terms = _normalize_query(request.GET.get('q', ''))
         if terms:
             filterable_fields = _get_filterable_fields(view)
@@ -438,8 +480,11 @@ class OrderingFilter(filters.OrderingFilter):
 
     def get_ordering_fields(self, view):
         '''
-        Returns a list of OrderingField instances.
+        Returns a list of OrderingField instances. The result is cached per view class.
         '''
+        return cached_for_view(view, ('ordering_fields', type(self)), lambda: self._build_ordering_fields(view))
+
+    def _build_ordering_fields(self, view):
         # Try to get fields from the view or this filter
         sortable_fields = getattr(view, 'ordering_fields', self.ordering_fields)
         if sortable_fields is None:
@@ -472,8 +517,9 @@ class OrderingFilter(filters.OrderingFilter):
         # Overridden to always sort also by the primary key field.
         # This ensures that the order is unique, allowing to get consistent pagination.
         # See http://www.postgresql.org/docs/9.3/static/queries-limit.html
-        ordering = self.get_ordering(request, queryset, view) or []
-        pk_field = queryset.model._meta.pk.name
-        if not any(field in ordering for field in (pk_field, '-' + pk_field, 'pk', '-pk')):
-            ordering.append(pk_field)
-        return queryset.extra(order_by=ordering)
+        with stage(request, 'ordering'):
+            ordering = self.get_ordering(request, queryset, view) or []
+            pk_field = queryset.model._meta.pk.name
+            if not any(field in ordering for field in (pk_field, '-' + pk_field, 'pk', '-pk')):
+                ordering.append(pk_field)
+            return queryset.extra(order_by=ordering)
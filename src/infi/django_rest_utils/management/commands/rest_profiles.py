@@ -0,0 +1,51 @@
+from io import StringIO
+
+from django.core.management.base import BaseCommand, CommandError
+
+from infi.django_rest_utils.profiling import get_profile_ring
+
+
+class Command(BaseCommand):
+    help = 'Lists and summarizes the profiles of slow API requests (see ProfilingMixin)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='the profiles to summarize (all of them when --summary is given)')
+        parser.add_argument('--summary', action='store_true', help='summarize all the stored profiles together')
+        parser.add_argument('--sort', default='cumulative', help='the pstats sort key (default: cumulative)')
+        parser.add_argument('--limit', type=int, default=30, help='the number of functions to print (default: 30)')
+
+    def handle(self, *args, **options):
+        ring = get_profile_ring()
+        if ring is None:
+            raise CommandError('The PROFILING_DIR setting is not defined')
+        profiles = ring.list()
+        names = options['names']
+        if options['summary']:
+            names = names or [profile['name'] for profile in profiles]
+        if not names:
+            self._list(profiles)
+            return
+        known = set(profile['name'] for profile in profiles)
+        unknown = [name for name in names if name not in known]
+        if unknown:
+            raise CommandError('Unknown profiles: %s' % ', '.join(unknown))
+        for profile in profiles:
+            if profile['name'] in names:
+                self._describe(profile)
+        output = StringIO()
+        stats = ring.get_stats(names, stream=output)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(options['limit'])
+        self.stdout.write(output.getvalue())
+
+    def _describe(self, profile):
+        params = '&'.join('%s=%s' % (key, value) for key, values in sorted(profile['params'].items())
+                          for value in values)
+        self.stdout.write('{name}  {time}  {duration:>9.1f}ms  {status}  {method} {path}{query}'.format(
+            query='?' + params if params else '',
+            **dict(profile, status=profile['status'] or 'stream')))
+
+    def _list(self, profiles):
+        if not profiles:
+            self.stdout.write('No profiles')
+        for profile in profiles:
+            self._describe(profile)
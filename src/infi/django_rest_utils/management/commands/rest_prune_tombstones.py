@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from infi.django_rest_utils.sync import get_tombstone_retention, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = 'Deletes the tombstones of deleted objects which are older than REST_TOMBSTONE_RETENTION'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='the database to prune')
+
+    def handle(self, *args, **options):
+        if get_tombstone_retention() is None:
+            raise CommandError('The REST_TOMBSTONE_RETENTION setting is not defined')
+        count = prune_tombstones(options['database'])
+        self.stdout.write('Deleted %d tombstones' % count)
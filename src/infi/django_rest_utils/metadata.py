@@ -1,8 +1,17 @@
 from rest_framework import metadata
+from .cache import TTLCache
 from .utils import get_approximate_count_for_all_objects
+from . import replicas
 from rest_framework import exceptions, serializers
 from django.db import connections
+try:
+    from django.urls import NoReverseMatch
+except ImportError:
+    # Django < 2
+    from django.core.urlresolvers import NoReverseMatch
+from django.db.models.signals import post_save, post_delete
 from django.conf import settings
+from threading import Lock
 
 try:
     # For django >= 2
@@ -12,29 +21,131 @@ except ImportError:
     from django.utils.encoding import force_text
 
 
+# Actions are cached per (view class, action, view kwargs, user permissions), along with the models whose rows
+# appear in them (as related field choices) so that saving or deleting such rows invalidates the entry
+_actions_cache = TTLCache(max_size=1000)
+_count_cache = TTLCache(max_size=1000)
+# The models whose saves and deletions invalidate cached entries (see _watch_model)
+_watched_models = set()
+_watched_models_lock = Lock()
+
+
+def get_cached_object_count(queryset):
+    '''
+    Returns the approximate number of objects in the queryset's table (or the exact count, when no approximation
+    is available), cached for API_METADATA_CACHE_TTL seconds.
+    '''
+    def count():
+        approx_number_of_objects = get_approximate_count_for_all_objects(
+            connections[queryset.db].cursor(),
+            queryset.model._meta.db_table)
+        return approx_number_of_objects or queryset.count()
+    _watch_model(queryset.model)
+    key = (queryset.db, queryset.model._meta.db_table)
+    return _count_cache.get_or_set(key, count, getattr(settings, 'API_METADATA_CACHE_TTL', 300))
+
+
+def _get_permissions_key(user):
+    if not user or not user.is_authenticated:
+        return None
+    return (user.is_superuser, user.is_staff, frozenset(user.get_all_permissions()))
+
+
+def _invalidate_model(sender, **kwargs):
+    if len(_actions_cache):
+        _actions_cache.discard_if(lambda key, value: sender in value[1])
+    if len(_count_cache):
+        _count_cache.discard_if(lambda key, value: key[1] == sender._meta.db_table)
+
+
+def _watch_model(model):
+    '''
+    Connects the invalidation of cached entries to the saves and deletions of the given model, whose rows appear in
+    cached metadata. Saving other models doesn't need to scan the caches.
+    '''
+    if model in _watched_models:
+        return
+    with _watched_models_lock:
+        if model in _watched_models:
+            return
+        label = model._meta.label
+        post_save.connect(_invalidate_model, sender=model, dispatch_uid='django_rest_utils_metadata_saved_' + label)
+        post_delete.connect(_invalidate_model, sender=model,
+                            dispatch_uid='django_rest_utils_metadata_deleted_' + label)
+        _watched_models.add(model)
+
+
 class SimpleMetadata(metadata.SimpleMetadata):
+    '''
+    The actions are cached per view class and user permissions for API_METADATA_CACHE_TTL seconds (default 300).
+    Views whose permissions depend on more than the user's Django permissions can set
+    metadata_cache_ttl = 0 to disable the cache.
+    '''
 
     def determine_actions(self, request, view):
+        ttl = getattr(view, 'metadata_cache_ttl', getattr(settings, 'API_METADATA_CACHE_TTL', 300))
+        if not ttl:
+            return self._determine_actions(request, view)
+        key = (type(view), getattr(view, 'action', None), tuple(sorted(view.kwargs.items())),
+               _get_permissions_key(request.user))
+        actions, models = _actions_cache.get_or_set(key, lambda: self._determine_actions_and_models(request, view), ttl)
+        return actions
+
+    def _determine_actions_and_models(self, request, view):
+        self._models = set()
+        actions = self._determine_actions(request, view)
+        for model in self._models:
+            _watch_model(model)
+        return actions, frozenset(self._models)
+
+    def _determine_actions(self, request, view):
         '''
         Adds the GET HTTP method to the methods for which an OPTIONS HTTP method request returns metadata for
         Based on the implementation of determine_actions in super class in django rest framework version 3.3.3
         '''
+        self._view = view
+        self._request = request
         actions = super(SimpleMetadata, self).determine_actions(request, view)
         actions['GET'] = self.get_serializer_info(view.get_serializer())
         return actions
 
+    def get_choices_url(self, field, field_info):
+        '''
+        Returns the (relative) URL of the choices endpoint for top-level related fields of views that
+        provide one (see viewsets.RelatedChoicesMixin), or None.
+        '''
+        from .viewsets import RelatedChoicesMixin
+        view = getattr(self, '_view', None)
+        if not isinstance(view, RelatedChoicesMixin) or field_info.get('read_only'):
+            return None
+        if not isinstance(field, (serializers.RelatedField, serializers.ManyRelatedField)):
+            return None
+        if field.parent is None or field.parent.parent is not None:
+            return None
+        try:
+            return view.reverse_action('related-choices', kwargs=dict(field_name=field.field_name), request=None)
+        except NoReverseMatch:
+            return None
+
+    def route_choices(self, field):
+        '''
+        Sends the queries for the choices of a related field to the read replica chosen for the request, if any
+        (see views.ReplicaRoutingMixin).
+        '''
+        related_field = field.child_relation if isinstance(field, serializers.ManyRelatedField) else field
+        request = getattr(self, '_request', None)
+        if isinstance(related_field, serializers.RelatedField) and related_field.queryset is not None and request is not None:
+            related_field.queryset = replicas.route(related_field.queryset, request)
+
     def should_detail_choices(self, field, field_info):
         if field_info.get('read_only'):
             return False
+        related_field = field.child_relation if isinstance(field, serializers.ManyRelatedField) else field
+        if isinstance(related_field, serializers.RelatedField) and hasattr(self, '_models'):
+            self._models.add(related_field.queryset.model)
         if isinstance(field, serializers.RelatedField):
-            approx_number_of_objects = get_approximate_count_for_all_objects(
-                connections[field.queryset.db].cursor(),
-                field.queryset.model._meta.db_table)
             if hasattr(settings, 'MAX_CHOICES_TO_DETAIL_IN_API_META'):
-                if approx_number_of_objects:
-                    return approx_number_of_objects < settings.MAX_CHOICES_TO_DETAIL_IN_API_META
-                else:
-                    return field.queryset.count() < settings.MAX_CHOICES_TO_DETAIL_IN_API_META
+                return get_cached_object_count(field.queryset) < settings.MAX_CHOICES_TO_DETAIL_IN_API_META
         return hasattr(field, 'choices')
 
     def get_field_info(self, field):
@@ -45,8 +156,17 @@ class SimpleMetadata(metadata.SimpleMetadata):
         This patch reverts that change by copying a section of the code from the last commit before that change:
 
         """
+        self.route_choices(field)
         field_info = super(SimpleMetadata, self).get_field_info(field)
-        if self.should_detail_choices(field, field_info):
+        choices_url = self.get_choices_url(field, field_info)
+        if choices_url:
+            # The view lists the choices in a separate endpoint, so only an approximate count is given here
+            related_field = field.child_relation if isinstance(field, serializers.ManyRelatedField) else field
+            field_info['choices_url'] = choices_url
+            field_info['choices_count'] = get_cached_object_count(related_field.queryset)
+            if hasattr(self, '_models'):
+                self._models.add(related_field.queryset.model)
+        elif self.should_detail_choices(field, field_info):
             field_info['choices'] = [
                 {
                     'value': choice_value,
@@ -0,0 +1,276 @@
+'''
+Latency histograms of API requests, exposed in the Prometheus text format (see views.metrics_view).
+
+When the REST_METRICS_DIR setting is defined, each process records its observations in a memory-mapped file of its
+own within that directory, and the histograms of all the processes (e.g. gunicorn workers) are summed when they are
+collected. The directory should be emptied whenever the server is started. Otherwise, the histograms are kept in
+memory and cover the current process only.
+'''
+from __future__ import absolute_import
+from builtins import object
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock
+import glob
+import json
+import mmap
+import os
+import struct
+
+from django.conf import settings
+
+
+METRIC_NAME = 'django_rest_utils_request_duration_seconds'
+LABEL_NAMES = ('endpoint', 'filters', 'format', 'status', 'stage')
+# Upper bounds of the histogram buckets, in seconds (there's an implicit +Inf bucket)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# A histogram row holds the count of each bucket (including +Inf), followed by the sum and the count
+_ROW_LENGTH = len(BUCKETS) + 3
+_ROW = struct.Struct('%dd' % _ROW_LENGTH)
+_DOUBLE = struct.Struct('d')
+_USED = struct.Struct('Q')
+_KEY_LENGTH = struct.Struct('I')
+_INITIAL_FILE_SIZE = 64 * 1024
+
+
+def _align(pos):
+    return (pos + 7) & ~7
+
+
+def _iter_entries(data):
+    '''
+    Yields the <key, row position> pairs of a metrics file. The file starts with the number of bytes in use,
+    followed by entries made of the key length, the key (padded to 8 bytes) and the row.
+    '''
+    used = _USED.unpack_from(data, 0)[0]
+    pos = _USED.size
+    while pos < used:
+        length = _KEY_LENGTH.unpack_from(data, pos)[0]
+        key_pos = pos + _KEY_LENGTH.size
+        row_pos = _align(key_pos + length)
+        yield bytes(data[key_pos:key_pos + length]).decode('utf-8'), row_pos
+        pos = row_pos + _ROW.size
+
+
+class _MemoryRows(object):
+
+    def __init__(self):
+        self._rows = {}
+
+    def add(self, key, index, value):
+        row = self._rows.get(key)
+        if row is None:
+            row = self._rows[key] = [0.0] * _ROW_LENGTH
+        row[index] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def items(self):
+        return [(key, list(row)) for key, row in self._rows.items()]
+
+
+class _MmapRows(object):
+
+    def __init__(self, path):
+        self._file = open(path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size == 0:
+            self._file.truncate(_INITIAL_FILE_SIZE)
+            size = _INITIAL_FILE_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = _USED.unpack_from(self._map, 0)[0]
+        if not self._used:
+            self._used = _USED.size
+            _USED.pack_into(self._map, 0, self._used)
+        self._positions = dict(_iter_entries(self._map))
+
+    def _allocate(self, key):
+        encoded = key.encode('utf-8')
+        row_pos = _align(self._used + _KEY_LENGTH.size + len(encoded))
+        end = row_pos + _ROW.size
+        if end > len(self._map):
+            self._map.close()
+            self._file.truncate(max(end, 2 * os.fstat(self._file.fileno()).st_size))
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        _ROW.pack_into(self._map, row_pos, *([0.0] * _ROW_LENGTH))
+        # Publish the entry to readers only once it is complete
+        self._used = end
+        _USED.pack_into(self._map, 0, end)
+        self._positions[key] = row_pos
+        return row_pos
+
+    def _increment(self, pos, value):
+        _DOUBLE.pack_into(self._map, pos, _DOUBLE.unpack_from(self._map, pos)[0] + value)
+
+    def add(self, key, index, value):
+        pos = self._positions.get(key)
+        if pos is None:
+            pos = self._allocate(key)
+        self._increment(pos + index * _DOUBLE.size, 1)
+        self._increment(pos + (_ROW_LENGTH - 2) * _DOUBLE.size, value)
+        self._increment(pos + (_ROW_LENGTH - 1) * _DOUBLE.size, 1)
+
+
+class HistogramRegistry(object):
+    '''
+    Holds latency histograms, keyed by label values (see LABEL_NAMES).
+    '''
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = Lock()
+        self._rows = None
+        self._pid = None
+
+    def _get_rows(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            # A forked process must not write to its parent's file
+            if self.directory:
+                self._rows = _MmapRows(os.path.join(self.directory, 'metrics_%d.db' % pid))
+            else:
+                self._rows = _MemoryRows()
+            self._pid = pid
+        return self._rows
+
+    def observe(self, labels, duration):
+        '''
+        Records a duration (in seconds) with the given label values.
+        '''
+        key = json.dumps(labels)
+        index = bisect_left(BUCKETS, duration)
+        with self._lock:
+            self._get_rows().add(key, index, duration)
+
+    def collect(self):
+        '''
+        Returns an ordered dict of label values to the histogram rows, summed over all the processes.
+        '''
+        if not self.directory:
+            with self._lock:
+                items = self._get_rows().items()
+        else:
+            items = []
+            for path in glob.glob(os.path.join(self.directory, 'metrics_*.db')):
+                with open(path, 'rb') as f:
+                    data = f.read()
+                if len(data) < _USED.size:
+                    continue
+                items.extend((key, list(_ROW.unpack_from(data, pos))) for key, pos in _iter_entries(data))
+        ret = {}
+        for key, row in items:
+            labels = tuple(json.loads(key))
+            if labels in ret:
+                ret[labels] = [a + b for a, b in zip(ret[labels], row)]
+            else:
+                ret[labels] = row
+        return OrderedDict(sorted(ret.items()))
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = HistogramRegistry(getattr(settings, 'REST_METRICS_DIR', None))
+    return _registry
+
+
+def is_enabled():
+    return getattr(settings, 'REST_METRICS_ENABLED', False)
+
+
+def _get_filter_names(view):
+    from .filters import _get_filterable_fields
+    if not hasattr(view, 'get_serializer'):
+        return frozenset()
+    try:
+        return frozenset(field.name for field in _get_filterable_fields(view))
+    except Exception:
+        # Some views can only be introspected in the context of a request
+        return frozenset()
+
+
+def get_filter_shape(request, view):
+    '''
+    Describes the filters of the request without their values, e.g. "name:like,salary:gt". Only the view's filterable
+    fields (and "q") are named, since each distinct description is kept as a separate histogram; other parameters
+    are described as "other".
+    '''
+    from .filters import OPERATORS, get_default_ignore
+    ignored = getattr(view, 'non_filtering_fields', None)
+    if ignored is None:
+        ignored = get_default_ignore()
+    operators = set(operator.name for operator in OPERATORS)
+    filter_names = _get_filter_names(view)
+    shape = set()
+    for field_name, exprs in request.GET.lists():
+        if field_name in ignored:
+            continue
+        if field_name == 'q':
+            shape.add('q')
+            continue
+        if field_name not in filter_names:
+            shape.add('other')
+            continue
+        for expr in exprs:
+            opname = expr.split(':', 1)[0] if ':' in expr else 'eq'
+            shape.add('%s:%s' % (field_name, opname if opname in operators else 'eq'))
+    return ','.join(sorted(shape)) or '-'
+
+
+def get_format(request, response):
+    renderer = getattr(request, 'accepted_renderer', None)
+    fmt = request.GET.get('format', '').lower() or (renderer.format if renderer else '-')
+    if getattr(response, 'streaming', False) and fmt != 'csv':
+        return 'stream' if fmt in ('json', '-') else fmt + '-stream'
+    return fmt
+
+
+def observe_request(request, view, response, durations):
+    '''
+    Records the stage durations of a request (in milliseconds, see timing.get_stage_durations).
+    '''
+    resolver_match = getattr(request, 'resolver_match', None)
+    endpoint = getattr(resolver_match, 'view_name', None) or type(view).__name__
+    if response.status_code < 400:
+        # Invalid requests might contain arbitrary field names, and would blow up the number of label values
+        filters = get_filter_shape(request, view)
+    else:
+        filters = '-'
+    labels = [endpoint, filters, get_format(request, response), '%dxx' % (response.status_code // 100)]
+    registry = get_registry()
+    for stage, duration in durations.items():
+        registry.observe(labels + [stage], duration / 1000.0)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(zip(LABEL_NAMES, labels)) + list(extra)
+    return '{' + ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs) + '}'
+
+
+def to_prometheus_text(histograms):
+    '''
+    Formats the collected histograms in the Prometheus text exposition format.
+    '''
+    lines = [
+        '# HELP %s Duration of the stages of handling API requests.' % METRIC_NAME,
+        '# TYPE %s histogram' % METRIC_NAME,
+    ]
+    for labels, row in histograms.items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), row):
+            cumulative += count
+            le = bound if isinstance(bound, str) else repr(float(bound))
+            lines.append('%s_bucket%s %d' % (METRIC_NAME, _format_labels(labels, [('le', le)]), cumulative))
+        lines.append('%s_sum%s %r' % (METRIC_NAME, _format_labels(labels), row[-2]))
+        lines.append('%s_count%s %d' % (METRIC_NAME, _format_labels(labels), row[-1]))
+    return '\n'.join(lines) + '\n'
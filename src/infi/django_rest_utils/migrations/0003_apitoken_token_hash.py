@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import hashlib
+
+
+def hash_existing_tokens(apps, schema_editor):
+    # Existing plaintext tokens keep working, since their hashes are filled in here
+    APIToken = apps.get_model('django_rest_utils', 'APIToken')
+    for api_token in APIToken.objects.using(schema_editor.connection.alias).only('id', 'token').iterator():
+        token_hash = hashlib.sha256(api_token.token.encode('utf-8')).hexdigest()
+        APIToken.objects.using(schema_editor.connection.alias).filter(pk=api_token.pk).update(token_hash=token_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_rest_utils', '0002_useractivity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='apitoken',
+            name='token_hash',
+            field=models.CharField(default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hash_existing_tokens, migrations.RunPython.noop),
+        # The index is created after the data migration, so it is built once instead of being updated per row
+        migrations.AlterField(
+            model_name='apitoken',
+            name='token_hash',
+            field=models.CharField(db_index=True, editable=False, max_length=64),
+        ),
+    ]
@@ -1,13 +1,51 @@
-from builtins import object
+from builtins import object, str
 
 from django.conf import settings
 from django.contrib.auth import get_user_model; User = get_user_model()
 from django.db import models
 from django.utils import timezone
-from django.utils.crypto import get_random_string
+from datetime import timedelta
+from django.utils.crypto import constant_time_compare, get_random_string
+import hashlib
 
 
-class APITokenManager(models.Manager):
+def hash_token(token):
+    '''
+    Returns the digest by which API tokens are indexed and looked up.
+    '''
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class APITokenQuerySet(models.QuerySet):
+    '''
+    Keeps the token hashes in sync with the tokens in bulk operations, which bypass APIToken.save().
+    Tokens which are written by raw SQL must have their token_hash set as well (see hash_token).
+    '''
+
+    def update(self, **kwargs):
+        # bulk_update updates both fields, by expressions
+        if 'token' in kwargs and 'token_hash' not in kwargs:
+            if not isinstance(kwargs['token'], str):
+                raise ValueError('Tokens can only be updated to strings, so that their hashes can be computed')
+            kwargs['token_hash'] = hash_token(kwargs['token'])
+        return super(APITokenQuerySet, self).update(**kwargs)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.token_hash = hash_token(obj.token)
+        return super(APITokenQuerySet, self).bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        if 'token' in fields:
+            objs = list(objs)
+            for obj in objs:
+                obj.token_hash = hash_token(obj.token)
+            fields = list(fields) + ['token_hash']
+        return super(APITokenQuerySet, self).bulk_update(objs, fields, *args, **kwargs)
+
+
+class APITokenManager(models.Manager.from_queryset(APITokenQuerySet)):
 
     def for_user(self, user):
         try:
@@ -15,17 +53,32 @@ class APITokenManager(models.Manager):
         except APIToken.DoesNotExist:
             return self.create(user=user, token=get_random_string(12))
 
+    def for_token(self, token):
+        '''
+        Returns the APIToken (with its user) matching the given token, using the indexed token hash.
+        Raises APIToken.DoesNotExist if there is no such token.
+        '''
+        api_token = self.select_related('user').get(token_hash=hash_token(token))
+        if not constant_time_compare(api_token.token, token):
+            raise APIToken.DoesNotExist()
+        return api_token
+
 
 class APIToken(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     token = models.CharField(max_length=64)
+    token_hash = models.CharField(max_length=64, db_index=True, editable=False)
 
     objects = APITokenManager()
 
     class Meta:
         verbose_name = 'API token'
 
+    def save(self, *args, **kwargs):
+        self.token_hash = hash_token(self.token)
+        super(APIToken, self).save(*args, **kwargs)
+
     def __unicode__(self):
         return self.token
 
@@ -37,7 +90,7 @@ class UserActivity(models.Model):
 
     seconds_interval_between_successive_rest_api_token_emails = 24 * 60 * 60  # The user may request that the token will be sent to him/her no more than once a day.
 
-    user                                = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, db_index=False)
+    user                                = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
     last_rest_api_token_email_sent_at   = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
@@ -49,3 +102,42 @@ class UserActivity(models.Model):
             time_passed_since_last_rest_api_token_email_sent = current_time - self.last_rest_api_token_email_sent_at
             return time_passed_since_last_rest_api_token_email_sent.total_seconds() >= UserActivity.seconds_interval_between_successive_rest_api_token_emails
         return True  # No REST API token email yet sent to this user, so such an email may be sent now.
+
+    def reserve_rest_api_token_email(self):
+        '''
+        Atomically marks a token email as sent now, unless another one was sent within the allowed interval.
+        Returns True if the email may be sent.
+        '''
+        current_time = timezone.now()
+        earliest = current_time - timedelta(seconds=UserActivity.seconds_interval_between_successive_rest_api_token_emails)
+        reserved = UserActivity.objects.filter(pk=self.pk).filter(
+            models.Q(last_rest_api_token_email_sent_at__isnull=True) |
+            models.Q(last_rest_api_token_email_sent_at__lte=earliest)
+        ).update(last_rest_api_token_email_sent_at=current_time)
+        if reserved:
+            self.last_rest_api_token_email_sent_at = current_time
+        return bool(reserved)
+
+    def release_rest_api_token_email(self, previous_sent_at):
+        '''
+        Undoes reserve_rest_api_token_email, for emails that could not be sent.
+        '''
+        UserActivity.objects.filter(pk=self.pk, last_rest_api_token_email_sent_at=self.last_rest_api_token_email_sent_at) \
+                            .update(last_rest_api_token_email_sent_at=previous_sent_at)
+
+
+class Tombstone(models.Model):
+    '''
+    Records the deletion of an object of a model whose deletions are tracked (see sync.track_deletions), so that
+    incremental syncs can report it.
+    '''
+
+    model = models.CharField(max_length=100)
+    object_id = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'deleted_at'])]
+
+    def __str__(self):
+        return '%s %s deleted at %s' % (self.model, self.object_id, self.deleted_at)
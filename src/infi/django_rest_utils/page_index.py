@@ -0,0 +1,170 @@
+'''
+An index of page boundaries, which turns deep page-number pagination (see pagination.LargeQuerySetPaginator) into a
+keyset seek: instead of skipping (with OFFSET) all the rows before the page, the page's query starts after the
+nearest boundary - a row whose ordering key was sampled every REST_PAGE_INDEX_INTERVAL pages (10 by default) - and
+skips only the rows between that boundary and the page.
+
+The boundaries of a query are sampled with a single ROW_NUMBER() query, up to the deepest page requested so far, and
+are cached per process for REST_PAGE_INDEX_TTL seconds (60 by default), keyed by the query's SQL (so by its filters
+and ordering). Rows that are added or removed before a boundary while it is cached shift the following pages by as
+many rows, much like they shift the pages of consecutive requests with OFFSET.
+
+Only querysets whose ordering is total - non-nullable fields of the model, ending with a unique one such as the
+primary key (which filters.OrderingFilter adds) - are indexed. Other querysets, databases without window functions and
+pages before the first boundary use OFFSET as usual.
+'''
+from __future__ import absolute_import
+from builtins import object
+from threading import Lock
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+try:
+    from django.core.exceptions import EmptyResultSet
+except ImportError:
+    # Django < 3.1
+    from django.db.models.sql.datastructures import EmptyResultSet
+from django.db import connections
+from django.db.models import F, Q
+
+from .cache import TTLCache
+
+_ROW_NUMBER = 'page_index_row'
+
+_indexes = TTLCache(max_size=100)
+
+
+def get_interval():
+    return getattr(settings, 'REST_PAGE_INDEX_INTERVAL', 10)
+
+
+def get_ordering_keys(queryset):
+    '''
+    Returns the ordering of the queryset as a list of <attname, descending> pairs, when it is made of non-nullable
+    fields of the model and ends with a unique one. Otherwise, returns None.
+    '''
+    query = queryset.query
+    if getattr(query, 'combinator', None) or query.low_mark or query.high_mark is not None:
+        return None
+    meta = queryset.model._meta
+    # filters.OrderingFilter orders with extra(), which takes precedence
+    ordering = query.extra_order_by or query.order_by or (meta.ordering if query.default_ordering else ())
+    keys = []
+    for term in ordering:
+        if not isinstance(term, str):
+            return None
+        descending = term.startswith('-')
+        name = term[1:] if descending else term
+        try:
+            field = meta.pk if name == 'pk' else meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.is_relation or field.null:
+            return None
+        keys.append((field.attname, descending != (not query.standard_ordering)))
+        if field.primary_key or field.unique:
+            return keys
+    return None
+
+
+def get_seek_filter(keys, values):
+    '''
+    Returns a Q object that matches the rows which come after the given values of the ordering keys.
+    '''
+    ret = None
+    equal = Q()
+    for (name, descending), value in zip(keys, values):
+        after = equal & Q(**{name + ('__lt' if descending else '__gt'): value})
+        ret = after if ret is None else ret | after
+        equal &= Q(**{name: value})
+    return ret
+
+
+class PageIndex(object):
+    '''
+    The ordering key values of the rows at positions interval, 2 * interval, ... of an ordered queryset (1-based).
+    complete - whether the boundaries were sampled up to the end of the queryset.
+    '''
+
+    def __init__(self, keys, interval):
+        self.keys = keys
+        self.interval = interval
+        self.boundaries = []
+        self.complete = False
+        self._lock = Lock()
+
+    def _after(self, queryset, number):
+        '''
+        Returns the rows of the queryset after the given number of boundaries.
+        '''
+        if not number:
+            return queryset
+        return queryset.filter(get_seek_filter(self.keys, self.boundaries[number - 1]))
+
+    def _sample(self, queryset, count):
+        '''
+        Returns the ordering key values of up to the given number of boundaries, after the known ones.
+        '''
+        from django.db.models import Window
+        from django.db.models.functions import RowNumber
+        order_by = [F(name).desc() if descending else F(name).asc() for name, descending in self.keys]
+        names = [name for name, descending in self.keys]
+        # The key values are selected along with the row numbers, so the boundaries are a consistent snapshot
+        sampled = self._after(queryset, len(self.boundaries)).annotate(**{
+            _ROW_NUMBER: Window(expression=RowNumber(), order_by=order_by)
+        }).values_list(*(names + [_ROW_NUMBER]))[:count * self.interval]
+        compiler = sampled.query.get_compiler(using=queryset.db)
+        sql, params = compiler.as_sql()
+        connection = connections[queryset.db]
+        row_number = connection.ops.quote_name(_ROW_NUMBER)
+        if connection.vendor == 'sqlite':
+            condition = '%s %%%% %d = 0' % (row_number, self.interval)
+        else:
+            condition = 'MOD(%s, %d) = 0' % (row_number, self.interval)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT * FROM (%s) page_index WHERE %s' % (sql, condition), params)
+            rows = cursor.fetchall()
+        # Convert the values from the database like the query itself would (e.g. timestamps in SQLite)
+        converters = compiler.get_converters([column for column, sql, alias in compiler.select[:len(names)]])
+        if converters:
+            rows = compiler.apply_converters(rows, converters)
+        return [tuple(row[:len(names)]) for row in rows]
+
+    def seek(self, queryset, offset):
+        '''
+        Returns a queryset and an offset within it, which start at the given offset of the (indexed) queryset.
+        '''
+        number = offset // self.interval
+        with self._lock:
+            if len(self.boundaries) < number and not self.complete:
+                missing = number - len(self.boundaries)
+                sampled = self._sample(queryset, missing)
+                self.boundaries.extend(sampled)
+                self.complete = len(sampled) < missing
+            number = min(number, len(self.boundaries))
+        return self._after(queryset, number), offset - number * self.interval
+
+
+def seek(queryset, offset, per_page):
+    '''
+    Returns a queryset and an offset within it, which start at the given offset of the given queryset, using the
+    queryset's page index when possible.
+    '''
+    interval = (get_interval() or 0) * per_page
+    if not interval or offset < interval:
+        return queryset, offset
+    connection = connections[queryset.db]
+    if not getattr(connection.features, 'supports_over_clause', False):
+        return queryset, offset
+    keys = get_ordering_keys(queryset)
+    if keys is None:
+        return queryset, offset
+    try:
+        cache_key = (queryset.db, str(queryset.query), interval)
+    except EmptyResultSet:
+        return queryset, offset
+    index = _indexes.get(cache_key)
+    if index is None:
+        index = PageIndex(keys, interval)
+        _indexes.set(cache_key, index, getattr(settings, 'REST_PAGE_INDEX_TTL', 60))
+    return index.seek(queryset, offset)
@@ -5,9 +5,10 @@ from rest_framework import pagination
 from collections import OrderedDict
 from rest_framework.response import Response
 from rest_framework.exceptions import NotFound
-from django.conf import settings
 from django.db import connections
 from .utils import get_approximate_count_for_all_objects
+from . import page_index
+from .timing import stage
 
 
 class LargeQuerySetPage(Page):
@@ -23,6 +24,7 @@ class LargeQuerySetPaginator(Paginator):
     When there are no conditions on the queryset, it uses an approximate
     count (getting the number of tuples from pg_class). Otherwise,
     the count is limited to the value of the QUERY_OBJECT_COUNT_LIMIT settings.
+    Deep pages are fetched by seeking from the nearest boundary in the queryset's page index (see page_index.py).
     '''
 
     def __init__(self, *args, **kwargs):
@@ -30,6 +32,7 @@ class LargeQuerySetPaginator(Paginator):
         self.approximated_number_of_objects = False
         self.limited_number_of_objects = False
         self._count = None
+        self._has_next = {}
 
 
     def _get_limited_count(self):
@@ -70,35 +73,128 @@ class LargeQuerySetPaginator(Paginator):
             if number == 1:
                 pass
             elif self.limited_number_of_objects:
-                bottom = (number - 1) * self.per_page
-                top = bottom + self.per_page
-                if not self.object_list[bottom:top].count():
-                    raise EmptyPage('That page contains no results')
+                # Pages beyond the limited count are checked when they are fetched (see page)
+                pass
             else:
                 raise EmptyPage('That page contains no results')
         return number
 
     def next_page_exists(self, number):
+        if number in self._has_next:
+            return self._has_next[number]
+        if self.limited_number_of_objects and number >= self.num_pages:
+            bottom = number * self.per_page
+            return self._slice(bottom, bottom + 1).exists()
         try:
             self.page(number+1)
         except EmptyPage:
             return False
         return True
 
+    def _slice(self, bottom, top):
+        queryset, offset = page_index.seek(self.object_list, bottom, self.per_page)
+        return queryset[offset:offset + top - bottom]
+
     def page(self, number):
         "Returns a Page object for the given 1-based page number."
         number = self.validate_number(number)
         bottom = (number - 1) * self.per_page
         top = bottom + self.per_page
+        if self.limited_number_of_objects and number > self.num_pages:
+            # One more object than the page holds tells whether the page is the last
+            objects = list(self._slice(bottom, top + 1))
+            if not objects:
+                raise EmptyPage('That page contains no results')
+            self._has_next[number] = len(objects) > self.per_page
+            return LargeQuerySetPage(objects[:self.per_page], number, self)
         if top + self.orphans >= self.count and not self.limited_number_of_objects:
             top = self.count
-        return LargeQuerySetPage(self.object_list[bottom:top], number, self)
+        return LargeQuerySetPage(self._slice(bottom, top), number, self)
 
     count = property(_get_count)
 
 
+class PartitionedPage(LargeQuerySetPage):
+    def has_next(self):
+        return self.paginator.next_page_exists(self.number)
+
+
+class PartitionedPaginator(LargeQuerySetPaginator):
+    '''
+    A paginator that walks the partitions of a partitions.PartitionPlan in order, and stops as soon as the page is
+    full, so that partitions after the page are not queried. Partitions before the page are skipped using counts
+    that are limited to the page's offset. When the queryset is filtered only by the partition column, the count is
+    the sum of the approximate counts of its partitions; otherwise, the count is limited like in
+    LargeQuerySetPaginator.
+    '''
+
+    def __init__(self, plan, per_page, **kwargs):
+        super(PartitionedPaginator, self).__init__(plan.queryset, per_page, **kwargs)
+        self.plan = plan
+        self._has_next = {}
+
+    def _get_count(self):
+        if self._count is None:
+            if self.plan.approximate:
+                self.approximated_number_of_objects = True
+                self._count = sum(count for name, count in self.plan.get_approximate_counts())
+            else:
+                limit = getattr(settings, 'QUERY_OBJECT_COUNT_LIMIT', 100)
+                self._count = 0
+                for partition in self.plan.partitions:
+                    self._count += self.plan.get_queryset(partition).order_by()[:limit - self._count].count()
+                    if self._count >= limit:
+                        self.limited_number_of_objects = True
+                        break
+        return self._count
+
+    count = property(_get_count)
+
+    def validate_number(self, number):
+        "Validates the given 1-based page number. Pages beyond the last are detected when they are fetched."
+        try:
+            number = int(number)
+        except (ValueError, TypeError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def next_page_exists(self, number):
+        if number not in self._has_next:
+            self.page(number)
+        return self._has_next[number]
+
+    def page(self, number):
+        "Returns a Page object for the given 1-based page number."
+        number = self.validate_number(number)
+        skip = (number - 1) * self.per_page
+        # One more object than the page holds tells whether there's a next page
+        needed = self.per_page + 1
+        objects = []
+        for partition in self.plan.partitions:
+            queryset = self.plan.get_queryset(partition)
+            if skip:
+                count = queryset.order_by()[:skip + 1].count()
+                if count <= skip:
+                    skip -= count
+                    continue
+            objects.extend(queryset[skip:skip + needed - len(objects)])
+            skip = 0
+            if len(objects) >= needed:
+                break
+        if not objects and number > 1:
+            raise EmptyPage('That page contains no results')
+        self._has_next[number] = len(objects) > self.per_page
+        return PartitionedPage(objects[:self.per_page], number, self)
+
+
 class InfinidatPaginationSerializer(pagination.PageNumberPagination):
 
+    def paginate_queryset(self, queryset, request, view=None):
+        with stage(request, 'paginate'):
+            return super(InfinidatPaginationSerializer, self).paginate_queryset(queryset, request, view)
+
     def get_paginated_response(self, data):
         paginator = self.page.paginator
         return Response(OrderedDict([
@@ -114,7 +210,11 @@ class InfinidatPaginationSerializer(pagination.PageNumberPagination):
     # Has to be set since django rest utils since commit 3806af3d15dcbf9c5e1e390d1ae3808f12191342 on django rest
     # framework: https://github.com/tomchristie/django-rest-framework/commit/3806af3d15dcbf9c5e1e390d1ae3808f12191342
     page_size_query_param = 'page_size'
-    max_page_size = settings.REST_FRAMEWORK.get('MAX_PAGINATE_BY')
+
+    @property
+    def max_page_size(self):
+        # Read on access rather than on import, so that importing this module doesn't require the settings
+        return settings.REST_FRAMEWORK.get('MAX_PAGINATE_BY')
 
     def get_paginator_description(self, view, html):
         if not html:
@@ -138,26 +238,28 @@ class InfinidatLargeSetPaginationSerializer(InfinidatPaginationSerializer):
         if not page_size:
             return None
 
-        paginator = LargeQuerySetPaginator(queryset, page_size)
+        paginator = self.get_django_paginator(queryset, page_size, view)
         page_number = request.query_params.get(self.page_query_param, 1)
-        if page_number in self.last_page_strings:
-            page_number = paginator.num_pages
+        with stage(request, 'count'):
+            if page_number in self.last_page_strings:
+                page_number = paginator.num_pages
 
-        try:
-            self.page = paginator.page(page_number)
-        except InvalidPage as exc:
-            message = exc.message if hasattr(exc, 'message') else str(exc)
-            msg = self.invalid_page_message.format(
-                page_number=page_number, message=message
-            )
-            raise NotFound(msg)
+            try:
+                self.page = paginator.page(page_number)
+            except InvalidPage as exc:
+                message = exc.message if hasattr(exc, 'message') else str(exc)
+                msg = self.invalid_page_message.format(
+                    page_number=page_number, message=message
+                )
+                raise NotFound(msg)
 
         if paginator.num_pages > 1 and self.template is not None:
             # The browsable API should display pagination controls.
             self.display_page_controls = True
 
         self.request = request
-        return list(self.page)
+        with stage(request, 'page'):
+            return list(self.page)
 
     def get_paginated_response(self, data):
         paginator = self.page.paginator
@@ -173,6 +275,9 @@ class InfinidatLargeSetPaginationSerializer(InfinidatPaginationSerializer):
             ('results', data)
         ]))
 
+    def get_django_paginator(self, queryset, page_size, view):
+        return LargeQuerySetPaginator(queryset, page_size)
+
     def get_paginator_description(self, view, html):
         if not html:
             return None
@@ -181,3 +286,24 @@ class InfinidatLargeSetPaginationSerializer(InfinidatPaginationSerializer):
             url=view.request.build_absolute_uri(view.request.path)
         )
         return render_to_string('django_rest_utils/infinidat_large_queryset_pagination.html', context)
+
+
+class InfinidatPartitionedPaginationSerializer(InfinidatLargeSetPaginationSerializer):
+    '''
+    Paginates querysets of time-partitioned tables partition by partition (see PartitionedPaginator), for views that
+    extend views.PartitionAwareMixin. The approximate number of objects in each relevant partition is reported in
+    the "partitions" metadata. Other querysets are paginated like in InfinidatLargeSetPaginationSerializer.
+    '''
+
+    def get_django_paginator(self, queryset, page_size, view):
+        plan = view.get_partition_plan(queryset) if hasattr(view, 'get_partition_plan') else None
+        if plan is None:
+            return super(InfinidatPartitionedPaginationSerializer, self).get_django_paginator(queryset, page_size, view)
+        return PartitionedPaginator(plan, page_size)
+
+    def get_paginated_response(self, data):
+        response = super(InfinidatPartitionedPaginationSerializer, self).get_paginated_response(data)
+        paginator = self.page.paginator
+        if isinstance(paginator, PartitionedPaginator):
+            response.data['partitions'] = OrderedDict(paginator.plan.get_approximate_counts())
+        return response
@@ -0,0 +1,231 @@
+'''
+Support for tables which are partitioned by month into child tables named <table>_yYYYYmMM (as expected by
+utils.get_approximate_count_for_all_objects), where each child holds the rows whose partition column (a datetime) is
+within its month, in UTC.
+
+A PartitionPlan splits a queryset that is ordered by the partition column into one range query per relevant month,
+in the order of the queryset. Each range query is limited to a single partition by PostgreSQL's constraint exclusion,
+so paginating or streaming the plan touches only the partitions it needs (see pagination.PartitionedPaginator and
+views.PartitionAwareMixin).
+'''
+from __future__ import absolute_import
+from builtins import object
+from datetime import datetime, time, timezone as dt_timezone
+from itertools import chain
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class Partition(object):
+    '''
+    A range of values of the partition column: [start, end), where None means unbounded. Ranges which are not
+    covered by a child table (e.g. before the first partition) have no name.
+    '''
+
+    def __init__(self, name, start, end, approximate_count=0):
+        self.name = name
+        self.start = start
+        self.end = end
+        self.approximate_count = approximate_count
+
+    def __repr__(self):
+        return '<Partition %s [%s, %s) ~%d>' % (self.name, self.start, self.end, self.approximate_count)
+
+    def overlaps(self, lower, upper):
+        return ((upper is None or self.start is None or self.start <= upper) and
+                (lower is None or self.end is None or self.end > lower))
+
+    def restrict(self, lower, upper):
+        '''
+        Returns the partition with its approximate count prorated to the part of its range within [lower, upper].
+        '''
+        if self.start is None or self.end is None:
+            return self
+        start = max(self.start, lower) if lower is not None else self.start
+        end = min(self.end, upper) if upper is not None else self.end
+        if start == self.start and end == self.end:
+            return self
+        fraction = max(0.0, (end - start).total_seconds() / (self.end - self.start).total_seconds())
+        return Partition(self.name, self.start, self.end, int(round(self.approximate_count * fraction)))
+
+
+def _next_month(value):
+    return value.replace(year=value.year + value.month // 12, month=value.month % 12 + 1)
+
+
+def get_partitions(queryset):
+    '''
+    Returns the monthly child partitions of the queryset's table, ordered by their start, along with their
+    approximate number of rows. Returns an empty list when the table has no partitions or the database is not
+    PostgreSQL.
+    '''
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return []
+    table = queryset.model._meta.db_table
+    pattern = re.compile(r'^%s_y(\d{4})m(\d{2})$' % re.escape(table))
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relname, n_live_tup FROM pg_stat_user_tables WHERE relname LIKE %s',
+                       [table.replace('_', '\\_') + '\\_y%'])
+        rows = cursor.fetchall()
+    ret = []
+    for name, count in rows:
+        match = pattern.match(name)
+        if match:
+            start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+            ret.append(Partition(name, start, _next_month(start), int(count or 0)))
+    return sorted(ret, key=lambda partition: partition.start)
+
+
+def cover(partitions):
+    '''
+    Adds unnamed ranges to the given sorted partitions, so that together they cover all values - rows which don't
+    belong to any partition (e.g. rows in the parent table) are not skipped.
+    '''
+    if not partitions:
+        return [Partition(None, None, None)]
+    ret = [Partition(None, None, partitions[0].start)]
+    for partition in partitions:
+        if ret[-1].end < partition.start:
+            ret.append(Partition(None, ret[-1].end, partition.start))
+        ret.append(partition)
+    ret.append(Partition(None, partitions[-1].end, None))
+    return ret
+
+
+def _parse_value(value):
+    value = value.strip()
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            parsed = parse_date(value)
+            parsed = datetime.combine(parsed, time()) if parsed else None
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone() if settings.USE_TZ else dt_timezone.utc)
+    return parsed
+
+
+def get_filter_range(exprs):
+    '''
+    Returns the (lower, upper) bounds of a datetime field, given its filter expressions (in the syntax of
+    filters.InfinidatFilter). Either bound is None when it is not limited. The bounds are inclusive, and may be
+    wider than the filters - for example, operators such as "ne" are ignored.
+    '''
+    lower = upper = None
+    for expr in exprs:
+        opname, value = expr.split(':', 1) if ':' in expr else ('eq', expr)
+        if opname in ('between', 'in'):
+            from .filters import _parse_array
+            values = [_parse_value(v) for v in _parse_array(value)]
+            if not values or None in values:
+                continue
+            low, high = min(values), max(values)
+        elif opname in ('eq', 'gt', 'ge', 'lt', 'le'):
+            parsed = _parse_value(value)
+            if parsed is None:
+                continue
+            low = parsed if opname in ('eq', 'gt', 'ge') else None
+            high = parsed if opname in ('eq', 'lt', 'le') else None
+        else:
+            continue
+        if low is not None and (lower is None or low > lower):
+            lower = low
+        if high is not None and (upper is None or high < upper):
+            upper = high
+    return lower, upper
+
+
+def get_ordering_direction(queryset, column):
+    '''
+    Returns "asc" or "desc" when the queryset is ordered first by the given column, and None otherwise.
+    '''
+    # filters.OrderingFilter orders with extra(), which takes precedence
+    query = queryset.query
+    ordering = query.extra_order_by or query.order_by or queryset.model._meta.ordering
+    if not ordering or not isinstance(ordering[0], str):
+        return None
+    if ordering[0] == column:
+        return 'asc'
+    if ordering[0] == '-' + column:
+        return 'desc'
+    return None
+
+
+# Lookups on the partition column which only narrow down its range
+_RANGE_LOOKUPS = ('exact', 'gt', 'gte', 'lt', 'lte', 'range', 'in')
+
+
+def is_filtered_only_by(queryset, column):
+    '''
+    Returns whether every condition of the queryset (including conditions added by the view's get_queryset) is a
+    range or equality condition on the given column, so that the rows of the queryset are exactly the rows of the
+    partitions within that range.
+    '''
+    from django.db.models.expressions import Col
+    from django.db.models.lookups import Lookup
+    from django.db.models.sql.where import AND, WhereNode
+
+    def check(node):
+        if isinstance(node, WhereNode):
+            return not node.negated and (node.connector == AND or len(node.children) <= 1) and \
+                all(check(child) for child in node.children)
+        return (isinstance(node, Lookup) and node.lookup_name in _RANGE_LOOKUPS and isinstance(node.lhs, Col) and
+                node.lhs.target.model == queryset.model and node.lhs.target.name == column)
+    return check(queryset.query.where)
+
+
+class PartitionPlan(object):
+    '''
+    The ranges of a queryset's partitions to walk, in the queryset's order.
+    approximate - whether the queryset is filtered only by the partition column (see is_filtered_only_by), so that
+                  the approximate number of rows in its partitions (prorated for partitions which are partially within
+                  the filtered range) is an approximation of its count.
+    '''
+
+    def __init__(self, queryset, column, partitions, approximate=False):
+        self.queryset = queryset
+        self.column = column
+        self.partitions = partitions
+        self.approximate = approximate
+
+    def get_queryset(self, partition):
+        filters = {}
+        if partition.start is not None:
+            filters[self.column + '__gte'] = partition.start
+        if partition.end is not None:
+            filters[self.column + '__lt'] = partition.end
+        return self.queryset.filter(**filters)
+
+    def get_approximate_counts(self):
+        return [(partition.name, partition.approximate_count) for partition in self.partitions if partition.name]
+
+    def iterator(self):
+        '''
+        Iterates over the objects of all the partitions, querying each partition only when the previous one is done.
+        '''
+        return chain.from_iterable(self.get_queryset(partition).iterator() for partition in self.partitions)
+
+
+def get_partition_plan(queryset, column, exprs=()):
+    '''
+    Returns a PartitionPlan for a (filtered) queryset that is ordered by the given partition column, or None when the
+    table has no partitions or the queryset is ordered otherwise. exprs are the request's filter expressions on the
+    column (see get_filter_range).
+    '''
+    direction = get_ordering_direction(queryset, column)
+    if direction is None:
+        return None
+    partitions = get_partitions(queryset)
+    if not partitions:
+        return None
+    lower, upper = get_filter_range(exprs)
+    relevant = [partition.restrict(lower, upper) for partition in cover(partitions) if partition.overlaps(lower, upper)]
+    if direction == 'desc':
+        relevant.reverse()
+    return PartitionPlan(queryset, column, relevant, approximate=is_filtered_only_by(queryset, column))
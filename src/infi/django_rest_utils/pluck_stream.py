@@ -0,0 +1,233 @@
+'''
+Incremental (streaming) version of the plucking done in pluck.py.
+
+The input is tokenized chunk by chunk, and all the requested paths are evaluated in a single pass over the token
+stream. Only subtrees that are selected by a path are materialized in memory, so memory consumption is bounded by
+the nesting depth of the document (plus the size of the plucked values) rather than by the size of the input.
+'''
+from __future__ import absolute_import
+from json.decoder import scanstring
+import re
+
+from .pluck import DELIMITER, fragments, traverse
+
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_NUMBER = re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][-+]?[0-9]+)?$')
+_BARE = re.compile(r'[-+.0-9a-zA-Z]+')
+_LITERALS = {'true': True, 'false': False, 'null': None}
+_PUNCTUATION = '{}[]:,'
+
+
+def iter_tokens(fp, chunk_size=CHUNK_SIZE):
+    '''
+    Yields the JSON tokens read from the file object fp. Punctuation is yielded as a single-character string,
+    and scalar values are yielded as 1-tuples holding the decoded value.
+    '''
+    buf = ''
+    pos = 0
+    eof = False
+    while True:
+        pos = _WHITESPACE.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                return
+            buf = fp.read(chunk_size)
+            pos = 0
+            eof = not buf
+            continue
+        c = buf[pos]
+        if c in _PUNCTUATION:
+            pos += 1
+            yield c
+            continue
+        # Numbers and literals are matched loosely here and validated once the whole token is available
+        m = (_STRING if c == '"' else _BARE).match(buf, pos)
+        if not eof and (m is None or m.end() == len(buf)):
+            # The token may continue in the next chunk
+            more = fp.read(chunk_size)
+            buf = buf[pos:] + more
+            pos = 0
+            eof = not more
+            continue
+        if m is None:
+            raise ValueError('Invalid JSON at "%s"' % buf[pos:pos + 20])
+        text = m.group()
+        pos = m.end()
+        if c == '"':
+            yield (scanstring(text, 1)[0] if '\\' in text else text[1:-1],)
+        elif text in _LITERALS:
+            yield (_LITERALS[text],)
+        elif _NUMBER.match(text):
+            yield (float(text) if ('.' in text or 'e' in text or 'E' in text) else int(text),)
+        else:
+            raise ValueError('Invalid JSON value "%s"' % text)
+
+
+def _child_states(states, key, index=None, matched=None):
+    '''
+    Returns the remaining path fragments of the states that continue into the given dict key / list index.
+    Non-wildcard states that continue are added to the matched set.
+    '''
+    ret = []
+    for s in states:
+        head = s[0]
+        if head == '*':
+            ret.append(s[1:])
+        elif head == key or (index is not None and head.isdigit() and int(head) == index):
+            ret.append(s[1:])
+            matched.add(s)
+    return ret
+
+
+def _missing(states, prefix, matched):
+    # Mirrors traverse(), which reports (path, None) for non-wildcard paths that were not found
+    return [(DELIMITER.join(prefix + list(s)), None) for s in states if s[0] != '*' and s not in matched]
+
+
+class _Walker(object):
+
+    def __init__(self, tokens):
+        self._tokens = iter(tokens)
+
+    def _next(self):
+        try:
+            return next(self._tokens)
+        except StopIteration:
+            raise ValueError('Invalid JSON: unexpected end of input')
+
+    def _expect(self, expected):
+        tok = self._next()
+        if tok != expected:
+            raise ValueError('Invalid JSON: expected "%s" but got %r' % (expected, tok))
+
+    def _key(self, tok):
+        if not isinstance(tok, tuple) or not isinstance(tok[0], str):
+            raise ValueError('Invalid JSON: expected an object key but got %r' % (tok,))
+        self._expect(':')
+        return tok[0]
+
+    def value(self, tok):
+        '''
+        Materializes the value which starts with the given token.
+        '''
+        if tok == '{':
+            d = {}
+            tok = self._next()
+            while tok != '}':
+                key = self._key(tok)
+                d[key] = self.value(self._next())
+                tok = self._next()
+                if tok == ',':
+                    tok = self._next()
+            return d
+        if tok == '[':
+            l = []
+            tok = self._next()
+            while tok != ']':
+                l.append(self.value(tok))
+                tok = self._next()
+                if tok == ',':
+                    tok = self._next()
+            return l
+        if isinstance(tok, tuple):
+            return tok[0]
+        raise ValueError('Invalid JSON: unexpected %r' % (tok,))
+
+    def skip(self, tok):
+        '''
+        Consumes the value which starts with the given token, without building it.
+        '''
+        depth = 0
+        while True:
+            if tok == '{' or tok == '[':
+                depth += 1
+            elif tok == '}' or tok == ']':
+                depth -= 1
+            if depth == 0:
+                return
+            tok = self._next()
+
+    def walk(self, tok, states, prefix):
+        '''
+        Yields <path, value> pairs for all the states (lists of remaining path fragments) within the value which
+        starts with the given token.
+        '''
+        if any(not s for s in states) or not (tok == '{' or tok == '['):
+            # A path ends here (or this is a scalar), so the value has to be materialized anyway
+            value = self.value(tok)
+            for s in states:
+                for item in traverse(list(s), value, prefix):
+                    yield item
+            return
+        matched = set()
+        if tok == '{':
+            tok = self._next()
+            while tok != '}':
+                key = self._key(tok)
+                children = _child_states(states, key, matched=matched)
+                if children:
+                    for item in self.walk(self._next(), children, prefix + [key]):
+                        yield item
+                else:
+                    self.skip(self._next())
+                tok = self._next()
+                if tok == ',':
+                    tok = self._next()
+        else:
+            index = 0
+            tok = self._next()
+            while tok != ']':
+                key = str(index)
+                children = _child_states(states, key, index, matched)
+                if children:
+                    for item in self.walk(tok, children, prefix + [key]):
+                        yield item
+                else:
+                    self.skip(tok)
+                index += 1
+                tok = self._next()
+                if tok == ',':
+                    tok = self._next()
+        for item in _missing(states, prefix, matched):
+            yield item
+
+    def walk_documents(self, states):
+        '''
+        Walks a sequence of top-level documents (e.g. NDJSON), addressing them like the elements of an array.
+        '''
+        matched = set()
+        index = 0
+        for tok in self._tokens:
+            key = str(index)
+            children = _child_states(states, key, index, matched)
+            if children:
+                for item in self.walk(tok, children, [key]):
+                    yield item
+            else:
+                self.skip(tok)
+            index += 1
+        for item in _missing(states, [], matched):
+            yield item
+
+
+def iter_pluck(fp, paths, ndjson=False, chunk_size=CHUNK_SIZE):
+    '''
+    Yields <path, value> pairs for all the given paths within the JSON read from the file object fp, in the order
+    in which they appear in the input. The results are the same as those of running traverse() on the parsed
+    input for each path.
+    When ndjson is true, the input may contain any number of JSON documents (typically one per line), and they are
+    addressed like the elements of a top-level array, for example "*.name" or "0.name".
+    '''
+    states = [tuple(fragments(path)) for path in paths]
+    walker = _Walker(iter_tokens(fp, chunk_size))
+    if ndjson:
+        for item in walker.walk_documents([s for s in states if s]):
+            yield item
+        return
+    for item in walker.walk(walker._next(), states, []):
+        yield item
+
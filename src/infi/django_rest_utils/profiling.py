@@ -0,0 +1,102 @@
+'''
+An on-disk ring of profiles of slow API requests (see views.ProfilingMixin and the rest_profiles management command).
+
+Each profile is kept as a cProfile dump (<name>.prof) alongside a JSON file describing the request (<name>.json).
+Once the number of profiles exceeds the limit, the oldest ones are removed.
+'''
+from __future__ import absolute_import
+from builtins import object
+from itertools import count
+import glob
+import json
+import os
+import pstats
+import random
+import time
+
+from django.conf import settings
+
+
+_counter = count()
+
+
+class ProfileRing(object):
+
+    def __init__(self, directory, max_profiles=100):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def _path(self, name, extension):
+        return os.path.join(self.directory, name + extension)
+
+    def save(self, profiler, info):
+        '''
+        Stores the profile along with the given request information, and returns its name.
+        '''
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        name = '%s-%d-%d' % (time.strftime('%Y%m%d%H%M%S'), os.getpid(), next(_counter))
+        profiler.dump_stats(self._path(name, '.prof'))
+        # The description is written last, so that profiles are listed only once complete
+        info = dict(info, name=name)
+        with open(self._path(name, '.json.tmp'), 'w') as f:
+            json.dump(info, f)
+        os.rename(self._path(name, '.json.tmp'), self._path(name, '.json'))
+        self._trim()
+        return name
+
+    def _names(self):
+        paths = glob.glob(os.path.join(self.directory, '*.json'))
+        names = [os.path.basename(path)[:-len('.json')] for path in paths]
+        # Names are made of a timestamp, a process ID and a sequence number
+        return sorted(names, key=lambda name: [int(part) for part in name.split('-')])
+
+    def _trim(self):
+        names = self._names()
+        for name in names[:max(0, len(names) - self.max_profiles)]:
+            for extension in ('.json', '.prof'):
+                try:
+                    os.remove(self._path(name, extension))
+                except OSError:
+                    pass  # Removed by another process
+
+    def list(self):
+        '''
+        Returns the descriptions of the stored profiles, newest first.
+        '''
+        ret = []
+        for name in reversed(self._names()):
+            try:
+                with open(self._path(name, '.json')) as f:
+                    ret.append(json.load(f))
+            except (IOError, OSError, ValueError):
+                pass
+        return ret
+
+    def get_stats(self, names, stream=None):
+        '''
+        Returns a pstats.Stats object combining the given profiles.
+        '''
+        paths = [self._path(name, '.prof') for name in names]
+        return pstats.Stats(*paths, stream=stream)
+
+
+def get_profile_ring():
+    directory = getattr(settings, 'PROFILING_DIR', None)
+    if not directory:
+        return None
+    return ProfileRing(directory, getattr(settings, 'PROFILING_MAX_PROFILES', 100))
+
+
+def should_profile():
+    '''
+    Returns whether to profile the current request, according to the PROFILING_SAMPLE_RATE setting.
+    '''
+    if not getattr(settings, 'PROFILING_DIR', None):
+        return False
+    return random.random() < getattr(settings, 'PROFILING_SAMPLE_RATE', 0.01)
+
+
+def get_threshold():
+    # In milliseconds
+    return getattr(settings, 'PROFILING_THRESHOLD', 5000)
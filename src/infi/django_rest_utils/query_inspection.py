@@ -0,0 +1,127 @@
+'''
+Detection of N+1 query patterns (see views.QueryInspectionMixin).
+
+The SQL statements executed while handling a request are grouped by template (the statement with its literals and
+parameter lists collapsed), and templates that are executed many times are reported along with the serializer fields
+that read the tables they query.
+'''
+from __future__ import absolute_import
+from builtins import object
+from collections import Counter, OrderedDict, namedtuple
+from contextlib import contextmanager
+from time import time
+import re
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)*\s*%s\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_TABLE = re.compile(r'\bFROM\s+[`"]?(\w+)[`"]?', re.IGNORECASE)
+
+Suspect = namedtuple('Suspect', 'template count duration table fields')
+
+
+class QueryBudgetExceeded(AssertionError):
+    '''
+    Raised in strict mode when a view executes more queries than its query_budget.
+    '''
+    pass
+
+
+def sql_template(sql):
+    return _LITERAL.sub('?', _IN_LIST.sub('(...)', sql))
+
+
+class QueryRecorder(object):
+    '''
+    A database execute wrapper which counts the statements executed per template.
+    '''
+
+    def __init__(self):
+        self.count = 0
+        self.counts = Counter()
+        self.durations = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            template = sql_template(sql)
+            self.count += 1
+            self.counts[template] += 1
+            self.durations[template] += time() - start
+
+    @contextmanager
+    def recording(self):
+        wrappers = [connections[alias].execute_wrapper(self) for alias in connections]
+        for wrapper in wrappers:
+            wrapper.__enter__()
+        try:
+            yield self
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+
+    def get_suspects(self, threshold, field_tables=None):
+        '''
+        Returns the SELECT templates that were executed at least threshold times, most frequent first.
+        field_tables maps table names to the serializer fields which read them (see get_field_tables).
+        '''
+        ret = []
+        for template, count in self.counts.most_common():
+            if count < threshold:
+                break
+            if not template.lstrip().upper().startswith('SELECT'):
+                continue
+            m = _TABLE.search(template)
+            table = m.group(1) if m else None
+            fields = (field_tables or {}).get(table, [])
+            ret.append(Suspect(template, count, self.durations[template], table, fields))
+        return ret
+
+
+def _iter_field_models(serializer, model, prefix=''):
+    # Yields <field path, model> for the related models which are read by the serializer's fields
+    from rest_framework.relations import ManyRelatedField, RelatedField
+    from rest_framework.serializers import BaseSerializer, ListSerializer
+    for name, field in serializer.fields.items():
+        path = prefix + name
+        source = field.source
+        if isinstance(field, ListSerializer):
+            field = field.child
+        elif isinstance(field, ManyRelatedField):
+            field = field.child_relation
+        current = model
+        if current is not None and source and source != '*':
+            for part in source.split('.'):
+                try:
+                    current = current._meta.get_field(part).related_model
+                except FieldDoesNotExist:
+                    current = None
+                if current is None:
+                    break
+                yield path, current
+        if isinstance(field, BaseSerializer):
+            nested_model = getattr(getattr(field, 'Meta', None), 'model', None)
+            if nested_model is not None:
+                yield path, nested_model
+                for item in _iter_field_models(field, nested_model, path + '.'):
+                    yield item
+        elif isinstance(field, RelatedField) and getattr(field, 'queryset', None) is not None:
+            yield path, field.queryset.model
+
+
+def get_field_tables(serializer):
+    '''
+    Returns a dict of table names to the serializer fields which read them.
+    '''
+    ret = OrderedDict()
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    for path, model in _iter_field_models(serializer, model):
+        fields = ret.setdefault(model._meta.db_table, [])
+        if path not in fields:
+            fields.append(path)
+    return ret
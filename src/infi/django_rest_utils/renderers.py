@@ -2,8 +2,19 @@ from django.template.loader import render_to_string
 
 from rest_framework.renderers import JSONRenderer, BaseRenderer
 from rest_framework.exceptions import ValidationError
+from rest_framework.utils import encoders
 from infi.django_rest_utils.pluck import pluck_result
+from .cache import cached_for_view
+from .timing import stage
 from itertools import chain
+import struct
+
+
+def get_field_names(view):
+    '''
+    Returns the names of the view's serializer fields, cached per view class.
+    '''
+    return cached_for_view(view, 'field_names', lambda: list(view.get_serializer().fields.keys()))
 
 
 def _build_response(metadata, result=None, error=None):
@@ -20,8 +31,9 @@ def _pluck_response(response, renderer_context):
         if 'fields' in request.query_params and not request.query_params.get('fields'):
             return _build_response(metadata=response['metadata'],
                                    result=response['result'])
-        return _build_response(metadata=response['metadata'],
-                               result=pluck_result(response['result'], request.query_params.getlist('fields')))
+        with stage(request, 'pluck'):
+            result = pluck_result(response['result'], request.query_params.getlist('fields'))
+        return _build_response(metadata=response['metadata'], result=result)
     except Exception as e:
         renderer_context['response'].status_code = 400
         message = e.message if hasattr(e, 'message') else str(e)
@@ -37,14 +49,16 @@ def _render_to_json_obj(self, data, accepted_media_type, renderer_context):
     metadata = dict(ready=True)
     status = renderer_context['response'].status_code
     if status > 399 and 'detail' in data:
-        # Error with details
-        data = _build_response(metadata=metadata, error=dict(message=data['detail']))
+        # Error with details (and possibly more information about the error, such as a time limit)
+        error = dict(message=data['detail'])
+        error.update((key, value) for key, value in data.items() if key != 'detail')
+        data = _build_response(metadata=metadata, error=error)
     elif status == 400:
         # Bad request
         error = dict(message='Bad request', details=data)
         data = _build_response(metadata=metadata, error=error)
-    elif data and 'page' in data:
-        # Paginated results
+    elif data and ('page' in data or ('next' in data and 'results' in data)):
+        # Paginated results (by page number or by keyset)
         metadata.update(data)
         data = _pluck_response(_build_response(metadata=metadata, result=metadata.pop('results')), renderer_context)
     else:
@@ -57,7 +71,8 @@ class InfinidatJSONRenderer(JSONRenderer):
 
     def render(self, data, accepted_media_type=None, renderer_context=None):
         data = _render_to_json_obj(self, data, accepted_media_type, renderer_context)
-        return super(InfinidatJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        with stage((renderer_context or {}).get('request'), 'render'):
+            return super(InfinidatJSONRenderer, self).render(data, accepted_media_type, renderer_context)
 
     def get_renderer_description(self, view, html):
         if not html:
@@ -65,7 +80,7 @@ class InfinidatJSONRenderer(JSONRenderer):
         current_plucking = view.request.GET.get("fields", "")
         context = dict(
             renderer=self,
-            fields=list(view.get_serializer().fields.keys()),
+            fields=get_field_names(view),
             current_plucking=current_plucking.split(",") if current_plucking else [],
             url=view.request.build_absolute_uri(view.request.path)
         )
@@ -84,6 +99,64 @@ class FlatJSONRenderer(JSONRenderer):
         return super(FlatJSONRenderer, self).render(data, accepted_media_type, renderer_context)
 
 
+def _to_primitive(obj):
+    # Converts types which the binary encoders don't support (dates, decimals, UUIDs...) like the JSON output does
+    return encoders.JSONEncoder().default(obj)
+
+
+def _msgpack_dumps(obj):
+    import msgpack
+    return msgpack.packb(obj, default=_to_primitive, use_bin_type=True)
+
+
+def _cbor_dumps(obj):
+    import cbor2
+    return cbor2.dumps(obj, default=lambda encoder, value: encoder.encode(_to_primitive(value)))
+
+
+def frame_record(payload):
+    '''
+    Prefixes an encoded record with its length (4 bytes, big endian), for length-delimited streams
+    '''
+    return struct.pack('>I', len(payload)) + payload
+
+
+class _BinaryRenderer(BaseRenderer):
+    charset = None
+    render_style = 'binary'
+    dumps = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        data = _render_to_json_obj(self, data, accepted_media_type, renderer_context)
+        with stage((renderer_context or {}).get('request'), 'render'):
+            return self.dumps(data)
+
+
+class InfinidatMessagePackRenderer(_BinaryRenderer):
+    '''
+    Renders the response as MessagePack, using the same envelope and plucking as InfinidatJSONRenderer.
+    Requires the msgpack package.
+    '''
+    format = 'msgpack'
+    media_type = 'application/msgpack'
+    dumps = staticmethod(_msgpack_dumps)
+
+
+class InfinidatCBORRenderer(_BinaryRenderer):
+    '''
+    Renders the response as CBOR, using the same envelope and plucking as InfinidatJSONRenderer.
+    Requires the cbor2 package.
+    '''
+    format = 'cbor'
+    media_type = 'application/cbor'
+    dumps = staticmethod(_cbor_dumps)
+
+
+BINARY_RENDERERS = {renderer.format: renderer for renderer in (InfinidatMessagePackRenderer, InfinidatCBORRenderer)}
+
+
 class DummyCSVRenderer(BaseRenderer):
     # A class only for gracefull degradation of the case where one sends format=csv without stream=1 (too late to stream
     # if arrived here and pagination makes no sense)
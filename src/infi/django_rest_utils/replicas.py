@@ -0,0 +1,121 @@
+'''
+Routing of read-only API queries (lists, counts, streaming and related field choices) to read replicas
+(see views.ReplicaRoutingMixin).
+
+The replicas are the database aliases in the REST_READ_REPLICAS setting. A replica is used only when its replication
+lag is at most REST_REPLICA_MAX_LAG seconds (5 by default). The lag is probed at most once every
+REST_REPLICA_LAG_CACHE_TTL seconds (5 by default) per process and replica, with a PostgreSQL query on the replica,
+or with the function named by REST_REPLICA_LAG_PROBE, which receives the alias and returns the lag in seconds (or
+None when the replica is unavailable).
+
+After a user writes, the user's reads are pinned to the primary for REST_REPLICA_PIN_SECONDS (10 by default), so
+that they see their own changes. Pins are kept in the Django cache named by REST_REPLICA_PIN_CACHE ("default"),
+which should be shared by all the server processes.
+'''
+from __future__ import absolute_import
+from threading import Lock
+from time import time
+import logging
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_POSTGRES_LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+# Alias => (expiration time, lag in seconds or None)
+_lags = {}
+_lags_lock = Lock()
+
+
+def get_replicas():
+    return list(getattr(settings, 'REST_READ_REPLICAS', ()))
+
+
+def probe_lag(alias):
+    '''
+    Returns the replication lag of the given replica in seconds, or None when it is unavailable.
+    '''
+    probe = getattr(settings, 'REST_REPLICA_LAG_PROBE', None)
+    try:
+        if probe:
+            return import_string(probe)(alias)
+        connection = connections[alias]
+        if connection.vendor != 'postgresql':
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(_POSTGRES_LAG_SQL)
+            return float(cursor.fetchone()[0])
+    except Exception:
+        logger.warning('Failed to probe the replication lag of %s', alias, exc_info=True)
+        return None
+
+
+def get_lag(alias):
+    '''
+    Returns the replication lag of the given replica (see probe_lag), probing it when the cached value has expired.
+    '''
+    now = time()
+    with _lags_lock:
+        cached = _lags.get(alias)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+    lag = probe_lag(alias)
+    with _lags_lock:
+        _lags[alias] = (now + getattr(settings, 'REST_REPLICA_LAG_CACHE_TTL', 5), lag)
+    return lag
+
+
+def _get_pin_key(user):
+    return 'django_rest_utils:replica_pin:%s' % user.pk
+
+
+def _get_pin_cache():
+    return caches[getattr(settings, 'REST_REPLICA_PIN_CACHE', 'default')]
+
+
+def pin_user(user):
+    '''
+    Routes the reads of the given user to the primary database for REST_REPLICA_PIN_SECONDS. Called after the user
+    writes through a view with ReplicaRoutingMixin - call it after other writes too.
+    '''
+    if get_replicas() and user is not None and user.is_authenticated:
+        _get_pin_cache().set(_get_pin_key(user), True, getattr(settings, 'REST_REPLICA_PIN_SECONDS', 10))
+
+
+def is_pinned(user):
+    return user is not None and user.is_authenticated and bool(_get_pin_cache().get(_get_pin_key(user)))
+
+
+def choose_replica(user=None):
+    '''
+    Returns the alias of a replica that the given user's reads can be sent to, or None when they should go to the
+    primary database.
+    '''
+    replicas = get_replicas()
+    if not replicas or is_pinned(user):
+        return None
+    max_lag = getattr(settings, 'REST_REPLICA_MAX_LAG', 5)
+    candidates = []
+    for alias in replicas:
+        lag = get_lag(alias)
+        if lag is not None and lag <= max_lag:
+            candidates.append(alias)
+    return random.choice(candidates) if candidates else None
+
+
+def route(queryset, request):
+    '''
+    Returns the queryset on the replica chosen for the request (see views.ReplicaRoutingMixin), if any.
+    '''
+    alias = getattr(request, 'read_replica', None)
+    return queryset.using(alias) if alias else queryset
@@ -1,11 +1,24 @@
-"""Command line utility for plucking fields from a JSON file.
+"""Command line utility for plucking fields from JSON files.
 
 Usage:
-    rest_utils pluck <json-filename> <path>...
+    rest_utils pluck [--stream] [--ndjson] [--format=<format>] <json-filename> <path>...
+    rest_utils pluck-files [--stream] [--ndjson] [--format=<format>] [--jobs=<n>] [--interleave] [--timing] <paths> <json-filename>...
 
 Options:
     -h --help                show this screen.
     -v --version             show version.
+    --stream                 parse the input incrementally, evaluating all paths in a single pass.
+                             memory usage is bounded by the nesting depth instead of the file size.
+    --ndjson                 the input contains one JSON document per line. the documents are addressed
+                             like the elements of a top-level array, for example "*.name".
+    --format=<format>        output format, tsv or ndjson [default: tsv].
+    --jobs=<n>               number of worker processes (defaults to the number of CPUs).
+    --interleave             print the results of each file as soon as it is processed, instead of
+                             in the order in which the files were given.
+    --timing                 print the processing time of each file to the standard error.
+
+Use "-" as the filename to read from the standard input.
+pluck-files takes a comma-separated list of paths, followed by any number of filenames or glob patterns.
 """
 
 from __future__ import absolute_import
@@ -14,23 +27,187 @@ from logging import getLogger
 from sys import argv
 logger = getLogger(__name__)
 
+FORMATS = ('tsv', 'ndjson')
+
 
 def rest_utils(argv=argv[1:]):
-    from docopt import docopt
+    from docopt import docopt, DocoptExit
     from logging import basicConfig, DEBUG
     from .__version__ import __version__
     args = docopt(__doc__, version=__version__, argv=argv)
     basicConfig(level=DEBUG)
+    if args['--format'] not in FORMATS:
+        raise DocoptExit('Unsupported format "%s", choose one of: %s' % (args['--format'], ', '.join(FORMATS)))
+    options = dict(stream=args['--stream'], ndjson=args['--ndjson'], output_format=args['--format'])
     if args['pluck'] and args['<json-filename>'] and args['<path>']:
-        return pluck(args['<json-filename>'], args['<path>'])
+        return pluck(args['<json-filename>'][0], args['<path>'], **options)
+    if args['pluck-files']:
+        jobs = int(args['--jobs']) if args['--jobs'] else None
+        paths = [path for path in args['<paths>'].split(',') if path]
+        return pluck_files(args['<json-filename>'], paths,
+                           jobs=jobs, interleave=args['--interleave'], timing=args['--timing'], **options)
+
 
+def _open(json_filename):
+    from sys import stdin
+    from io import open
+    if json_filename == '-':
+        return stdin
+    return open(json_filename, encoding='utf-8')
 
-def pluck(json_filename, paths):
+
+def _iter_results(f, paths, stream=False, ndjson=False):
     from .pluck import traverse
     from json import loads
-    with open(json_filename) as f:
+    if stream:
+        from .pluck_stream import iter_pluck
+        return iter_pluck(f, paths, ndjson=ndjson)
+    if ndjson:
+        raw = [loads(line) for line in f if line.strip()]
+    else:
         raw = loads(f.read())
-        for path in paths:
-            results = traverse(path, raw)
-            for result in results:
-                print('{}\t{}'.format(*result))
+    return (result for path in paths for result in traverse(path, raw))
+
+
+def _format_result(result, output_format, json_filename=None):
+    from json import dumps
+    path, value = result
+    if output_format == 'ndjson':
+        item = dict(path=path, value=value) if json_filename is None else dict(file=json_filename, path=path, value=value)
+        return dumps(item, default=str, sort_keys=True)
+    if json_filename is None:
+        return '{}\t{}'.format(path, value)
+    return '{}\t{}\t{}'.format(json_filename, path, value)
+
+
+def pluck(json_filename, paths, stream=False, ndjson=False, output_format='tsv'):
+    f = _open(json_filename)
+    try:
+        for result in _iter_results(f, paths, stream, ndjson):
+            print(_format_result(result, output_format))
+    finally:
+        if json_filename != '-':
+            f.close()
+
+
+def _expand_filenames(patterns):
+    '''
+    Expands glob patterns (for shells that don't), keeping the given order and dropping duplicates.
+    '''
+    from glob import glob, has_magic
+    ret = []
+    for pattern in patterns:
+        filenames = sorted(glob(pattern)) if has_magic(pattern) else [pattern]
+        if not filenames:
+            logger.warning('No files match {}'.format(pattern))
+        ret.extend(filename for filename in filenames if filename not in ret)
+    return ret
+
+
+def _pluck_into(output, json_filename, paths, stream=False, ndjson=False, output_format='tsv'):
+    '''
+    Writes the formatted results of a single file to the given output, one at a time. Returns the number of results.
+    '''
+    count = 0
+    f = _open(json_filename)
+    try:
+        for result in _iter_results(f, paths, stream, ndjson):
+            output.write(_format_result(result, output_format, json_filename) + '\n')
+            count += 1
+    finally:
+        if json_filename != '-':
+            f.close()
+    return count
+
+
+def _pluck_file(args):
+    '''
+    Worker function for pluck_files. The results are written to a temporary file as they are plucked, instead of
+    being collected and sent back to the parent process. Returns a tuple of (filename, temporary filename,
+    number of results, elapsed seconds, error message).
+    '''
+    from tempfile import NamedTemporaryFile
+    from time import time
+    json_filename, paths, stream, ndjson, output_format = args
+    start = time()
+    with NamedTemporaryFile('w', encoding='utf-8', suffix='.pluck', delete=False) as output:
+        try:
+            count = _pluck_into(output, json_filename, paths, stream, ndjson, output_format)
+        except Exception as e:
+            return json_filename, output.name, None, time() - start, str(e)
+    return json_filename, output.name, count, time() - start, None
+
+
+def _pluck_stdin(args, output):
+    '''
+    Plucks the standard input in the parent process, since worker processes can't read it.
+    Returns a tuple like _pluck_file, without a temporary filename.
+    '''
+    from time import time
+    json_filename, paths, stream, ndjson, output_format = args
+    start = time()
+    try:
+        count = _pluck_into(output, json_filename, paths, stream, ndjson, output_format)
+    except Exception as e:
+        return json_filename, None, None, time() - start, str(e)
+    return json_filename, None, count, time() - start, None
+
+
+def _iter_outcomes(pool, tasks, output, interleave):
+    '''
+    Yields the outcomes of the tasks, in their order unless interleaving. The standard input is plucked in
+    the parent process while the workers process the other files.
+    '''
+    worker_tasks = [task for task in tasks if task[0] != '-']
+    if pool is None:
+        outcomes = map(_pluck_file, worker_tasks)
+    elif interleave:
+        outcomes = pool.imap_unordered(_pluck_file, worker_tasks)
+    else:
+        outcomes = pool.imap(_pluck_file, worker_tasks)
+    for task in tasks:
+        if task[0] == '-':
+            yield _pluck_stdin(task, output)
+        elif not interleave:
+            yield next(outcomes)
+    for outcome in outcomes:
+        yield outcome
+
+
+def pluck_files(patterns, paths, stream=False, ndjson=False, output_format='tsv', jobs=None, interleave=False,
+                timing=False):
+    '''
+    Plucks the given paths from many files using a pool of worker processes. Each output line is prefixed by
+    the name of the file it was taken from. Returns the number of files that could not be processed.
+    The results of files which fail midway are printed up to the failure.
+    '''
+    from multiprocessing import Pool
+    from os import remove
+    from shutil import copyfileobj
+    from sys import stderr, stdout
+    from io import open
+    from time import time
+    start = time()
+    tasks = [(json_filename, paths, stream, ndjson, output_format) for json_filename in _expand_filenames(patterns)]
+    errors = 0
+    pool = Pool(jobs) if jobs != 1 and len(tasks) > 1 else None
+    try:
+        for json_filename, output_filename, count, elapsed, error in _iter_outcomes(pool, tasks, stdout, interleave):
+            if output_filename is not None:
+                try:
+                    with open(output_filename, encoding='utf-8') as output:
+                        copyfileobj(output, stdout)
+                finally:
+                    remove(output_filename)
+            if error:
+                errors += 1
+                print('{}: {}'.format(json_filename, error), file=stderr)
+            elif timing:
+                print('{}\t{} results\t{:.3f}s'.format(json_filename, count, elapsed), file=stderr)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if timing:
+        print('total\t{} files\t{:.3f}s'.format(len(tasks), time() - start), file=stderr)
+    return errors
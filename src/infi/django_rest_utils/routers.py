@@ -13,12 +13,17 @@ from django.utils.safestring import mark_safe
 from django.utils.html import strip_tags
 
 
+# All the DefaultRouter instances, for warming up the caches of their views (see apps.py)
+routers_registry = []
+
+
 class DefaultRouter(routers.DefaultRouter):
 
     def __init__(self, name=None, description=None):
         super(DefaultRouter, self).__init__()
         self.name = name
         self.description = description
+        routers_registry.append(self)
 
     def get_api_root_view(self, api_urls=None):
         """
@@ -31,6 +36,43 @@ class DefaultRouter(routers.DefaultRouter):
         registry = self.registry
         name = self.name
         description = self.description
+        # The objects section and the reversed URLs don't change once the URLs are loaded, so they are computed once
+        # (per html flag / namespace and format) instead of on every request
+        objects_html_cache = {}
+        reversed_urls_cache = {}
+
+        def get_objects_html(html):
+            if html not in objects_html_cache:
+                objects_html = "<h3>Objects</h3>"
+                for prefix, viewset, basename in registry:
+                    if '(' in prefix: # The url contains placeholders, so we can't show it
+                        continue
+                    func = viewset.settings.VIEW_DESCRIPTION_FUNCTION
+                    # Fixed compatibility with django rest framwork V3.9.1:
+                    # adding description to the current viewset in order to use it in the function rest_framework.views.get_view_description
+                    viewset.description = viewset.__doc__ or ''
+                    desc = func(viewset, html)
+                    objects_html += "<h4><a href=\"{}\">{}</a></h4>{}".format(prefix, viewset().get_view_name(), desc)
+                objects_html_cache[html] = objects_html
+            return objects_html_cache[html]
+
+        def reverse_urls(namespace, args, kwargs, request=None):
+            ret = OrderedDict()
+            for key, url_name in api_root_dict.items():
+                if namespace:
+                    url_name = namespace + ':' + url_name
+                try:
+                    ret[key] = reverse(
+                        url_name,
+                        args=args,
+                        kwargs=kwargs,
+                        request=request,
+                        format=kwargs.get('format', None)
+                    )
+                except NoReverseMatch:
+                    # Don't bail out if eg. no list routes exist, only detail routes.
+                    continue
+            return ret
 
         class APIRoot(views.APIView):
             _ignore_model_permissions = True
@@ -46,39 +88,21 @@ class DefaultRouter(routers.DefaultRouter):
                     if hasattr(authenticator, 'get_authenticator_description'):
                         desc = authenticator.get_authenticator_description(self, html)
                         parts.append(desc)
-                objects_html = "<h3>Objects</h3>"
-                for prefix, viewset, basename in registry:
-                    if '(' in prefix: # The url contains placeholders, so we can't show it
-                        continue
-                    func = viewset.settings.VIEW_DESCRIPTION_FUNCTION
-                    # Fixed compatibility with django rest framwork V3.9.1:
-                    # adding description to the current viewset in order to use it in the function rest_framework.views.get_view_description
-                    viewset.description = viewset.__doc__ or ''
-                    desc = func(viewset, html)
-                    objects_html += "<h4><a href=\"{}\">{}</a></h4>{}".format(prefix, viewset().get_view_name(), desc)
-                parts.append(objects_html)
+                parts.append(get_objects_html(html))
                 parts.append("</section>")
 
                 return mark_safe('\n'.join([part for part in parts if part]))
 
             def get(self, request, *args, **kwargs):
-                ret = OrderedDict()
                 namespace = request.resolver_match.namespace
-                for key, url_name in api_root_dict.items():
-                    if namespace:
-                        url_name = namespace + ':' + url_name
-                    try:
-                        ret[key] = reverse(
-                            url_name,
-                            args=args,
-                            kwargs=kwargs,
-                            request=request,
-                            format=kwargs.get('format', None)
-                        )
-                    except NoReverseMatch:
-                        # Don't bail out if eg. no list routes exist, only detail routes.
-                        continue
-
+                if getattr(request, 'versioning_scheme', None) is not None:
+                    # The versioning scheme may modify the URLs per request
+                    return Response(reverse_urls(namespace, args, kwargs, request))
+                cache_key = (namespace, args, tuple(sorted(kwargs.items())))
+                if cache_key not in reversed_urls_cache:
+                    reversed_urls_cache[cache_key] = reverse_urls(namespace, args, kwargs)
+                ret = OrderedDict((key, request.build_absolute_uri(url))
+                                  for key, url in reversed_urls_cache[cache_key].items())
                 return Response(ret)
 
         return APIRoot.as_view()
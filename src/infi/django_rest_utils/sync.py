@@ -0,0 +1,196 @@
+'''
+Incremental sync: listing the objects which changed after a watermark, and the objects which were deleted since
+(see views.IncrementalSyncMixin).
+
+A watermark is the value of a column that increases whenever an object changes - either a timestamp (such as a
+DateTimeField with auto_now=True) or a version number. Deletions are recorded as tombstones by track_deletions, and
+can only be reported for timestamp columns.
+
+A timestamp is taken before its transaction commits, so a change may become visible after a sync whose window already
+covers its timestamp. Therefore the windows of timestamp columns end at least REST_SYNC_SAFETY_LAG seconds (5 by
+default) before the current time: changes (and deletions) whose transactions commit within that lag of their
+timestamps are never missed. Version numbers have no such guarantee.
+
+Pages of a window are ordered by (column, primary key) and follow each other by keyset - a cursor made of the last
+row's watermark and primary key - rather than by offset, so that rows which leave the window while the client pages
+through it (because they changed again or were deleted) don't shift the following rows into earlier pages.
+'''
+from __future__ import absolute_import
+from builtins import object
+from builtins import str
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.db.models.signals import post_delete
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+class WatermarkError(ValueError):
+    pass
+
+
+class WatermarkExpired(WatermarkError):
+    pass
+
+
+def get_model_label(model):
+    return '%s.%s' % (model._meta.app_label, model._meta.model_name)
+
+
+def _record_deletion(sender, instance, **kwargs):
+    from .models import Tombstone
+    Tombstone.objects.using(kwargs.get('using') or 'default').create(
+        model=get_model_label(sender), object_id=str(instance.pk))
+
+
+def track_deletions(model):
+    '''
+    Records a tombstone whenever an object of the given model is deleted. Can be used as a class decorator.
+    '''
+    post_delete.connect(_record_deletion, sender=model,
+                        dispatch_uid='django_rest_utils_tombstone_%s' % get_model_label(model))
+    return model
+
+
+def get_tombstone_retention():
+    '''
+    Returns the number of seconds for which tombstones are kept, or None to keep them forever.
+    '''
+    return getattr(settings, 'REST_TOMBSTONE_RETENTION', None)
+
+
+def prune_tombstones(using='default'):
+    '''
+    Deletes the tombstones which are older than REST_TOMBSTONE_RETENTION, and returns their number.
+    '''
+    from .models import Tombstone
+    retention = get_tombstone_retention()
+    if retention is None:
+        return 0
+    oldest = timezone.now() - timedelta(seconds=retention)
+    return Tombstone.objects.using(using).filter(deleted_at__lt=oldest).delete()[0]
+
+
+def get_safety_lag():
+    return getattr(settings, 'REST_SYNC_SAFETY_LAG', 5)
+
+
+def is_timestamp(field):
+    return isinstance(field, models.DateTimeField)
+
+
+def parse_watermark(field, value):
+    '''
+    Converts a watermark from a query parameter to a value of the given field.
+    '''
+    if is_timestamp(field):
+        # A "+" in an unquoted query string is decoded as a space
+        parsed = parse_datetime(value.strip().replace(' ', '+'))
+        if parsed is None:
+            raise WatermarkError('Invalid watermark "%s" (expected an ISO 8601 timestamp)' % value)
+        if settings.USE_TZ and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed, dt_timezone.utc)
+        return parsed
+    try:
+        return field.to_python(value)
+    except Exception:
+        raise WatermarkError('Invalid watermark "%s"' % value)
+
+
+def format_watermark(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+class SyncWindow(object):
+    '''
+    The changes of a model within (since, until]. "until" is the next watermark: the latest change (or deletion) that
+    existed when the window was computed, so that changes made while the client pages through the window are
+    reported by the next sync rather than partially. For timestamps, it is at most REST_SYNC_SAFETY_LAG seconds
+    before the time the window was computed.
+    '''
+
+    def __init__(self, field, since, until, deleted_ids):
+        self.field = field
+        self.since = since
+        self.until = until
+        self.deleted_ids = deleted_ids
+
+    @property
+    def watermark(self):
+        return format_watermark(self.until)
+
+    def filter(self, queryset):
+        return queryset.filter(**{self.field.name + '__gt': self.since, self.field.name + '__lte': self.until})
+
+    def get_ordering(self):
+        return [self.field.name, 'pk']
+
+    def format_cursor(self, obj):
+        '''
+        Returns the cursor of the page which follows the given object.
+        '''
+        return '%s,%s' % (format_watermark(getattr(obj, self.field.attname)), obj.pk)
+
+    def seek(self, queryset, cursor):
+        '''
+        Returns the objects of the queryset after the given cursor (see format_cursor), in the window's order.
+        Raises WatermarkError when the cursor is invalid.
+        '''
+        queryset = queryset.order_by(*self.get_ordering())
+        if not cursor:
+            return queryset
+        value, sep, pk = cursor.rpartition(',')
+        if not sep:
+            raise WatermarkError('Invalid cursor "%s"' % cursor)
+        value = parse_watermark(self.field, value)
+        try:
+            pk = queryset.model._meta.pk.to_python(pk)
+        except Exception:
+            raise WatermarkError('Invalid cursor "%s"' % cursor)
+        name = self.field.name
+        return queryset.filter(Q(**{name + '__gt': value}) | Q(**{name: value, 'pk__gt': pk}))
+
+
+def get_sync_window(queryset, field_name, since, until=None, deletions=True):
+    '''
+    Returns the SyncWindow of the given (filtered) queryset after the "since" watermark. When "until" is not given,
+    it is the latest change of the queryset or deletion of its model. Timestamp windows end no later than
+    REST_SYNC_SAFETY_LAG seconds ago (see above). The deleted ids are looked up only when deletions is true.
+    Raises WatermarkExpired when tombstones as old as "since" may have been pruned.
+    '''
+    from .models import Tombstone
+    model = queryset.model
+    field = model._meta.get_field(field_name)
+    since = parse_watermark(field, since)
+    until = parse_watermark(field, until) if until else None
+    changes = queryset.filter(**{field_name + '__gt': since})
+    tombstones = None
+    if is_timestamp(field):
+        now = timezone.now()
+        retention = get_tombstone_retention()
+        if retention is not None and since < now - timedelta(seconds=retention):
+            raise WatermarkExpired('The watermark is older than the retention of deleted objects, '
+                                   'a full sync is required')
+        latest = now - timedelta(seconds=get_safety_lag())
+        if until is not None:
+            until = min(until, latest)
+        changes = changes.filter(**{field_name + '__lte': latest})
+        tombstones = Tombstone.objects.using(queryset.db).filter(model=get_model_label(model), deleted_at__gt=since,
+                                                                 deleted_at__lte=latest)
+    if until is None:
+        until = changes.aggregate(latest=models.Max(field_name))['latest']
+        if tombstones is not None:
+            deleted_at = tombstones.aggregate(latest=models.Max('deleted_at'))['latest']
+            if deleted_at is not None and (until is None or deleted_at > until):
+                until = deleted_at
+        until = since if until is None else until
+    deleted_ids = []
+    if tombstones is not None and deletions:
+        object_ids = tombstones.filter(deleted_at__lte=until).values_list('object_id', flat=True).distinct()
+        deleted_ids = [model._meta.pk.to_python(object_id) for object_id in object_ids]
+        # Keep the ids serializable by every renderer (e.g. UUIDs)
+        deleted_ids = [pk if isinstance(pk, int) else str(pk) for pk in deleted_ids]
+    return SyncWindow(field, since, until, deleted_ids)
@@ -0,0 +1,22 @@
+'''
+Sets up Django with the settings of the test application (see testapp/settings.py), and creates the test databases
+for the whole session. Tests of pure functions don't depend on this.
+'''
+import os
+
+
+def pytest_configure(config):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'infi.django_rest_utils.tests.testapp.settings')
+    import django
+    from django.test.runner import DiscoverRunner
+    django.setup()
+    config.django_runner = DiscoverRunner(verbosity=0, interactive=False)
+    config.django_runner.setup_test_environment()
+    config.django_databases = config.django_runner.setup_databases()
+
+
+def pytest_unconfigure(config):
+    runner = getattr(config, 'django_runner', None)
+    if runner is not None:
+        runner.teardown_databases(config.django_databases)
+        runner.teardown_test_environment()
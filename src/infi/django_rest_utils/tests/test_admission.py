@@ -0,0 +1,105 @@
+import fcntl
+import os
+import shutil
+import tempfile
+import unittest
+from infi.django_rest_utils.admission import FileSlots, LocalSlots, ReleasingIterator
+
+
+class SlotsTestMixin(object):
+    def test_limits(self):
+        first = self.slots.acquire('user:1', 2, 1)
+        self.assertIsNotNone(first)
+        self.assertIsNone(self.slots.acquire('user:1', 2, 1))
+        second = self.slots.acquire('user:2', 2, 1)
+        self.assertIsNotNone(second)
+        self.assertIsNone(self.slots.acquire('user:3', 2, 1))
+        self.assertEqual(self.slots.get_active(), (2, 2))
+        first.release()
+        first.release()
+        self.assertEqual(self.slots.get_active(), (1, 1))
+        self.assertIsNotNone(self.slots.acquire('user:1', 2, 1))
+
+    def test_unlimited(self):
+        slots = [self.slots.acquire('user:1', None, None) for i in range(5)]
+        self.assertNotIn(None, slots)
+        self.assertEqual(self.slots.get_active(), (5, 1))
+        for slot in slots:
+            slot.release()
+        self.assertEqual(self.slots.get_active(), (0, 0))
+
+
+class LocalSlotsTest(SlotsTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.slots = LocalSlots()
+
+
+class FileSlotsTest(SlotsTestMixin, unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.slots = FileSlots(self.directory)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def get_files(self):
+        return sorted(name.split('_')[0] for name in os.listdir(self.directory))
+
+    def test_files(self):
+        # Files are created only for the limits which are set, and removed when the slots are released
+        slot = self.slots.acquire('user:1', None, None)
+        self.assertEqual(self.get_files(), [])
+        slot.release()
+        slot = self.slots.acquire('user:1', 2, None)
+        self.assertEqual(self.get_files(), ['stream'])
+        slot.release()
+        slot = self.slots.acquire('user:1', None, 2)
+        self.assertEqual(self.get_files(), ['client'])
+        slot.release()
+        self.assertEqual(self.get_files(), [])
+        # Refused slots don't leave files behind
+        slot = self.slots.acquire('user:1', 1, 2)
+        self.assertIsNone(self.slots.acquire('user:2', 1, 2))
+        self.assertEqual(self.get_files(), ['client', 'stream'])
+        slot.release()
+        self.assertEqual(self.get_files(), [])
+
+    def test_remove_stale(self):
+        slot = self.slots.acquire('user:1', 2, 2)
+        # The files of a process which died are no longer locked
+        for name in ('stream_1.lock', 'client_0123456789abcdef_0.lock'):
+            open(os.path.join(self.directory, name), 'w').close()
+        FileSlots(self.directory)
+        self.assertEqual(self.get_files(), ['client', 'stream'])
+        # The files of active slots are kept, and still lock their slots
+        self.assertIsNone(self.slots.acquire('user:1', 1, 2))
+        slot.release()
+        self.assertEqual(self.get_files(), [])
+
+    def test_removed_while_opened(self):
+        # A file which was opened before its holder removed it is not locked - the new file is
+        path = os.path.join(self.directory, 'stream_0.lock')
+        slot = self.slots.acquire('user:1', 1, None)
+        fd = os.open(path, os.O_RDWR)
+        slot.release()
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            slot = self.slots.acquire('user:1', 1, None)
+            self.assertIsNotNone(slot)
+            self.assertIsNone(self.slots.acquire('user:2', 1, None))
+            slot.release()
+        finally:
+            os.close(fd)
+
+
+class ReleasingIteratorTest(unittest.TestCase):
+    def test_release(self):
+        slots = LocalSlots()
+        iterator = ReleasingIterator(['a', 'b'], slots.acquire('user:1', 1, 1))
+        self.assertEqual(next(iterator), 'a')
+        self.assertEqual(slots.get_active(), (1, 1))
+        self.assertEqual(list(iterator), ['b'])
+        self.assertEqual(slots.get_active(), (0, 0))
+        iterator = ReleasingIterator(['a', 'b'], slots.acquire('user:1', 1, 1))
+        iterator.close()
+        self.assertEqual(slots.get_active(), (0, 0))
@@ -0,0 +1,138 @@
+from importlib import import_module
+from unittest import mock
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase
+from rest_framework import exceptions
+from rest_framework.test import APIRequestFactory
+from infi.django_rest_utils.authentication import APITokenAuthentication
+from infi.django_rest_utils.cache import TTLCache
+from infi.django_rest_utils.models import APIToken, hash_token
+
+
+class APITokenAuthenticationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.token = APIToken.objects.create(user=cls.user, token='secret')
+
+    def setUp(self):
+        # Fresh caches (and counters) for each test
+        for name in ('token_cache', 'invalid_token_cache'):
+            cache = getattr(APITokenAuthentication, name)
+            patched = TTLCache(max_size=cache.max_size)
+            setattr(APITokenAuthentication, name, patched)
+            self.addCleanup(setattr, APITokenAuthentication, name, cache)
+
+    def authenticate(self, token='secret'):
+        request = APIRequestFactory().get('/', HTTP_X_API_TOKEN=token)
+        return APITokenAuthentication().authenticate(request)
+
+    def assert_invalid(self, token):
+        with self.assertRaises(exceptions.AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_hit(self):
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+        self.assertEqual(user, self.user)
+        with self.assertNumQueries(0):
+            cached_user, _ = self.authenticate()
+        self.assertEqual(cached_user, self.user)
+        # Requests don't share the cached instance
+        self.assertIsNot(cached_user, user)
+        stats = APITokenAuthentication.get_cache_stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses'], stats['negative_hits']), (1, 1, 1, 0))
+
+    def test_negative_hit(self):
+        with self.assertNumQueries(1):
+            self.assert_invalid('wrong')
+        with self.assertNumQueries(0):
+            self.assert_invalid('wrong')
+        stats = APITokenAuthentication.get_cache_stats()
+        self.assertEqual((stats['size'], stats['hits'], stats['misses'], stats['negative_hits']), (0, 1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+        # A token which is created after it was rejected is accepted right away
+        APIToken.objects.create(user=User.objects.create_user('other'), token='wrong')
+        self.assertEqual(self.authenticate('wrong')[0].username, 'other')
+
+    def test_brute_force(self):
+        self.authenticate()
+        max_size = APITokenAuthentication.invalid_token_cache.max_size
+        for i in range(max_size + 10):
+            self.assert_invalid('wrong%d' % i)
+        # Invalid tokens don't evict the valid ones
+        self.assertEqual(len(APITokenAuthentication.invalid_token_cache), max_size)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.authenticate()[0], self.user)
+
+    def test_token_change(self):
+        self.authenticate()
+        self.token.token = 'changed'
+        self.token.save()
+        self.assert_invalid('secret')
+        self.assertEqual(self.authenticate('changed')[0], self.user)
+        self.token.delete()
+        self.assert_invalid('changed')
+
+    def test_user_change(self):
+        self.assertEqual(self.authenticate()[0].username, 'user')
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(self.authenticate()[0].username, 'renamed')
+        self.user.is_active = False
+        self.user.save()
+        # The token of an inactive user is valid, but doesn't authenticate
+        self.assertIsNone(self.authenticate())
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.authenticate())
+        self.user.delete()
+        self.assert_invalid('secret')
+
+    def test_no_token(self):
+        request = APIRequestFactory().get('/')
+        self.assertIsNone(APITokenAuthentication().authenticate(request))
+
+
+class APITokenTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.token = APIToken.objects.create(user=cls.user, token='secret')
+
+    def assert_token(self, token, api_token):
+        self.assertEqual(APIToken.objects.for_token(token), api_token)
+
+    def test_for_token(self):
+        self.assertEqual(self.token.token_hash, hash_token('secret'))
+        with self.assertNumQueries(1):
+            api_token = APIToken.objects.for_token('secret')
+            self.assertEqual(api_token.user, self.user)
+        for token in ('Secret', 'secret ', ''):
+            with self.assertRaises(APIToken.DoesNotExist):
+                APIToken.objects.for_token(token)
+        # The token itself is compared too, not only its hash
+        APIToken.objects.filter(pk=self.token.pk).update(token_hash=hash_token('other'))
+        with self.assertRaises(APIToken.DoesNotExist):
+            APIToken.objects.for_token('other')
+
+    def test_bulk_operations(self):
+        APIToken.objects.filter(pk=self.token.pk).update(token='updated')
+        self.assert_token('updated', self.token)
+        with self.assertRaises(ValueError):
+            APIToken.objects.update(token=F('token'))
+        other = User.objects.create_user('other')
+        [created] = APIToken.objects.bulk_create([APIToken(user=other, token='created')])
+        self.assert_token('created', created)
+        created.token = 'bulk-updated'
+        APIToken.objects.bulk_update([created], ['token'])
+        self.assert_token('bulk-updated', created)
+
+    def test_migration(self):
+        # Tokens which were created before their hashes were stored are hashed by the data migration
+        APIToken.objects.update(token_hash='')
+        migration = import_module('infi.django_rest_utils.migrations.0003_apitoken_token_hash')
+        migration.hash_existing_tokens(apps, mock.Mock(connection=connection))
+        self.assert_token('secret', self.token)
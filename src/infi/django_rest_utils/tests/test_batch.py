@@ -0,0 +1,49 @@
+import json
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.test import APIClient
+from infi.django_rest_utils import batch
+from infi.django_rest_utils.tests.testapp.models import Employee
+
+URLS = ['/api/employees/', '/missing/', '/denied/', '/text/', '/unknown/', '/batch/']
+STATUSES = [200, 404, 403, 200, 404, 400]
+
+
+class BatchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        Employee.objects.create(name='a', salary=100)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch(self):
+        response = self.client.post('/batch/', URLS, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.content)['result']
+        self.assertEqual([result['url'] for result in results], URLS)
+        self.assertEqual([result['status'] for result in results], STATUSES)
+        self.assertEqual([item['name'] for item in results[0]['body']['result']], ['a'])
+        self.assertEqual(results[3]['body'], 'text')
+
+    def test_too_many_requests(self):
+        with override_settings(REST_BATCH_MAX_REQUESTS=2):
+            self.assertEqual(self.client.post('/batch/', URLS, format='json').status_code, 400)
+
+    def test_pool(self):
+        # Sub-requests run on the pool only outside of transactions, so the URLs don't query the database
+        request = RequestFactory().post('/batch/')
+        request.user = self.user
+        request.auth = None
+        urls = ['/missing/', '/denied/', '/text/'] * 3
+        with mock.patch.object(batch, '_in_transaction', return_value=False):
+            for i in range(2):
+                results = batch.execute_all(request, urls)
+                self.assertEqual([result.status for result in results], [404, 403, 200] * 3)
+                self.assertEqual([result.url for result in results], urls)
+        pool = batch.get_pool()
+        self.assertIs(pool, batch.get_pool())
+        self.assertEqual(pool.size, batch.get_max_workers())
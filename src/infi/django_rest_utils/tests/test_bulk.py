@@ -0,0 +1,102 @@
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from infi.django_rest_utils.tests.testapp.models import Department, Employee
+from infi.django_rest_utils.tests.testapp.views import BulkEmployeeViewSet
+
+URL = '/api/bulk-employees/bulk/'
+
+
+class BulkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.department = Department.objects.create(name='R&D')
+        cls.employees = [Employee.objects.create(name=name, salary=100) for name in ('a', 'b', 'c', 'd')]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_errors(self, response):
+        self.assertEqual(response.status_code, 400)
+        return dict((item['index'], item['errors']) for item in response.data['items'])
+
+    def test_opt_in(self):
+        # Without BulkMixin, "bulk" is just the id of an object
+        self.assertEqual(self.client.post('/api/employees/bulk/', [], format='json').status_code, 405)
+        self.assertEqual(self.client.delete('/api/employees/bulk/', [], format='json').status_code, 404)
+
+    def test_create(self):
+        items = [dict(name='e%d' % i, salary=i, department=self.department.pk) for i in range(5)]
+        response = self.client.post(URL, items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['name'] for item in response.data], ['e0', 'e1', 'e2', 'e3', 'e4'])
+        self.assertEqual(Employee.objects.filter(department=self.department).count(), 5)
+
+    def test_create_invalid(self):
+        items = [dict(name='e0', salary=1), dict(name='e1', salary='x'), dict(name='e2', salary=2), dict(salary=3)]
+        errors = self.get_errors(self.client.post(URL, items, format='json'))
+        self.assertEqual(sorted(errors), [1, 3])
+        self.assertIn('salary', errors[1])
+        self.assertIn('name', errors[3])
+        self.assertEqual(Employee.objects.count(), 4)
+
+    def test_update(self):
+        items = [dict(id=employee.pk, salary=200 + i) for i, employee in enumerate(self.employees[:3])]
+        items[1]['id'] = str(items[1]['id'])
+        response = self.client.patch(URL, items, format='json')
+        self.assertEqual(response.status_code, 200)
+        salaries = dict(Employee.objects.values_list('name', 'salary'))
+        self.assertEqual(salaries, dict(a=200, b=201, c=202, d=100))
+
+    def test_update_auto_now(self):
+        old = timezone.now() - timedelta(days=1)
+        Employee.objects.update(updated=old)
+        response = self.client.patch(URL, [dict(id=self.employees[0].pk, salary=5)], format='json')
+        self.assertEqual(response.status_code, 200)
+        updated = dict(Employee.objects.values_list('name', 'updated'))
+        self.assertGreater(updated['a'], old)
+        self.assertEqual(updated['b'], old)
+
+    def test_update_invalid(self):
+        employee = self.employees[0]
+        # The same object, by ids of different types
+        response = self.client.patch(URL, [dict(id=employee.pk, salary=1), dict(id=str(employee.pk), salary=2)],
+                                     format='json')
+        self.assertEqual(response.status_code, 400)
+        items = [dict(id=employee.pk, salary=1), dict(id='x', salary=2), dict(salary=3), dict(id=0, salary=4),
+                 dict(id=self.employees[1].pk, salary='x')]
+        errors = self.get_errors(self.client.patch(URL, items, format='json'))
+        self.assertEqual(sorted(errors), [1, 2, 3, 4])
+        self.assertEqual(Employee.objects.get(pk=employee.pk).salary, 100)
+
+    def test_delete(self):
+        pks = [employee.pk for employee in self.employees]
+        response = self.client.delete(URL, [pks[0], dict(id=pks[1]), str(pks[2])], format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(list(Employee.objects.values_list('pk', flat=True)), pks[3:])
+
+    def test_delete_invalid(self):
+        errors = self.get_errors(self.client.delete(URL, [self.employees[0].pk, 0, 'x'], format='json'))
+        self.assertEqual(sorted(errors), [1, 2])
+        self.assertEqual(Employee.objects.count(), 4)
+
+    def test_rollback(self):
+        # The objects are deleted in chunks of 2 - a failure in the second chunk rolls back the first one
+        original = BulkEmployeeViewSet.perform_bulk_destroy
+        calls = []
+
+        def perform_bulk_destroy(viewset, queryset):
+            calls.append(queryset)
+            if len(calls) > 1:
+                raise RuntimeError('Failed')
+            original(viewset, queryset)
+        with mock.patch.object(BulkEmployeeViewSet, 'perform_bulk_destroy', perform_bulk_destroy):
+            with self.assertRaises(RuntimeError):
+                self.client.delete(URL, [employee.pk for employee in self.employees], format='json')
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Employee.objects.count(), 4)
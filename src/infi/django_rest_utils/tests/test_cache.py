@@ -0,0 +1,51 @@
+import unittest
+from infi.django_rest_utils import cache
+from infi.django_rest_utils.cache import TTLCache
+
+
+class TTLCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self._time = cache.time
+        cache.time = lambda: self.now
+
+    def tearDown(self):
+        cache.time = self._time
+
+    def test_expiry(self):
+        c = TTLCache(ttl=10)
+        c.set('a', 1)
+        c.set('b', 2, ttl=20)
+        self.assertEqual(c.get('a'), 1)
+        self.now += 15
+        self.assertEqual(c.get('a'), None)
+        self.assertEqual(c.get('b'), 2)
+        self.assertEqual(c.stats()['hits'], 2)
+        self.assertEqual(c.stats()['misses'], 1)
+
+    def test_lru_eviction(self):
+        c = TTLCache(max_size=2)
+        c.set('a', 1)
+        c.set('b', 2)
+        c.get('a')
+        c.set('c', 3)
+        self.assertEqual(c.get('a'), 1)
+        self.assertEqual(c.get('b'), None)
+        self.assertEqual(c.get('c'), 3)
+
+    def test_disabled(self):
+        c = TTLCache(ttl=0)
+        c.set('a', 1)
+        self.assertEqual(len(c), 0)
+
+    def test_get_or_set_and_discard(self):
+        c = TTLCache()
+        calls = []
+        self.assertEqual(c.get_or_set('a', lambda: calls.append(1) or 'x'), 'x')
+        self.assertEqual(c.get_or_set('a', lambda: calls.append(1) or 'y'), 'x')
+        self.assertEqual(len(calls), 1)
+        c.set('b', 2)
+        c.discard_if(lambda key, value: value == 'x')
+        self.assertEqual(c.get('a'), None)
+        c.discard('b')
+        self.assertEqual(len(c), 0)
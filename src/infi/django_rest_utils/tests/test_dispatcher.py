@@ -0,0 +1,169 @@
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from infi.django_rest_utils import views
+from infi.django_rest_utils.dispatcher import BackgroundDispatcher
+from infi.django_rest_utils.models import UserActivity
+
+TIMEOUT = 5
+
+
+class BackgroundDispatcherTest(unittest.TestCase):
+    def make_dispatcher(self, **kwargs):
+        return BackgroundDispatcher('test', **dict(dict(retry_delay=0, rate_limit=0), **kwargs))
+
+    def test_run(self):
+        dispatcher = self.make_dispatcher()
+        calls = []
+        self.assertTrue(dispatcher.submit(calls.append, (1,)))
+        self.assertTrue(dispatcher.submit(lambda value, other: calls.append(value + other), (2,), dict(other=3)))
+        dispatcher._queue.join()
+        self.assertEqual(calls, [1, 5])
+
+    def test_retries(self):
+        dispatcher = self.make_dispatcher(max_retries=2)
+        attempts = []
+        failures = []
+
+        def flaky(succeed_at):
+            attempts.append(succeed_at)
+            if len(attempts) < succeed_at:
+                raise RuntimeError('Failed')
+        dispatcher.submit(flaky, (3,), on_failure=failures.append)
+        dispatcher._queue.join()
+        self.assertEqual((len(attempts), failures), (3, []))
+        del attempts[:]
+        dispatcher.submit(flaky, (4,), on_failure=failures.append)
+        # A failing failure callback doesn't stop the worker
+        dispatcher.submit(flaky, (10,), on_failure=lambda e: 1 / 0)
+        dispatcher.submit(attempts.append, ('done',))
+        dispatcher._queue.join()
+        self.assertEqual(len(attempts), 7)
+        self.assertEqual(attempts[-1], 'done')
+        self.assertEqual([str(e) for e in failures], ['Failed'])
+
+    def test_queue_full(self):
+        dispatcher = self.make_dispatcher(max_queue_size=1)
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def block():
+            started.set()
+            release.wait(TIMEOUT)
+        self.assertTrue(dispatcher.submit(block))
+        self.assertTrue(started.wait(TIMEOUT))
+        # The worker is busy, so the queue holds a single job
+        self.assertTrue(dispatcher.submit(calls.append, (1,)))
+        self.assertFalse(dispatcher.submit(calls.append, (2,)))
+        release.set()
+        dispatcher._queue.join()
+        self.assertEqual(calls, [1])
+
+    def test_rate_limit(self):
+        dispatcher = self.make_dispatcher(rate_limit=10)
+        with mock.patch('infi.django_rest_utils.dispatcher.sleep') as sleep:
+            dispatcher.submit(len, ('a',))
+            dispatcher.submit(len, ('b',))
+            dispatcher._queue.join()
+        # The second job waits for its turn (up to 0.1 seconds after the first one started)
+        [(delay,), _] = sleep.call_args
+        self.assertGreater(delay, 0)
+        self.assertLessEqual(delay, 0.1)
+
+
+class InlineDispatcher(object):
+    '''
+    Runs the submitted jobs immediately, unless the queue is "full".
+    '''
+
+    def __init__(self, full=False):
+        self.full = full
+
+    def submit(self, func, args=(), kwargs=None, on_failure=None):
+        if self.full:
+            return False
+        try:
+            func(*args, **(kwargs or {}))
+        except Exception as e:
+            on_failure(e)
+        return True
+
+
+@override_settings(SECURITY_EMAIL='security@example.com', REST_API_TOKEN_EMAIL_SUBJECT='Token',
+                   REST_API_TOKEN_EMAIL_SENDER='api@example.com')
+class TokenEmailTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user', email='user@example.com')
+
+    def setUp(self):
+        self.send_email = mock.patch.object(views, 'send_email').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def request(self, dispatcher=None):
+        with mock.patch.object(views, 'get_email_dispatcher', return_value=dispatcher or InlineDispatcher()):
+            request = APIRequestFactory().post('/', dict(user_name='user'))
+            return views.get_rest_api_token_for_user(request).status_code
+
+    def get_sent_at(self):
+        return UserActivity.objects.get(user=self.user).last_rest_api_token_email_sent_at
+
+    def test_reserve(self):
+        activity = UserActivity.objects.create(user=self.user)
+        # Another request, which loaded the activity before the email was sent
+        concurrent = UserActivity.objects.get(pk=activity.pk)
+        self.assertTrue(activity.reserve_rest_api_token_email())
+        self.assertTrue(concurrent.may_send_rest_api_token_email())
+        self.assertFalse(concurrent.reserve_rest_api_token_email())
+        self.assertIsNone(concurrent.last_rest_api_token_email_sent_at)
+        self.assertEqual(self.get_sent_at(), activity.last_rest_api_token_email_sent_at)
+        # After the interval, another email may be sent
+        UserActivity.objects.filter(pk=activity.pk).update(last_rest_api_token_email_sent_at=timezone.now() -
+                                                           timedelta(days=1, seconds=1))
+        self.assertTrue(concurrent.reserve_rest_api_token_email())
+
+    def test_release(self):
+        activity = UserActivity.objects.create(user=self.user)
+        self.assertTrue(activity.reserve_rest_api_token_email())
+        activity.release_rest_api_token_email(None)
+        self.assertIsNone(self.get_sent_at())
+        # A stale instance doesn't release a newer reservation
+        stale = UserActivity.objects.get(pk=activity.pk)
+        stale.last_rest_api_token_email_sent_at = timezone.now() - timedelta(days=2)
+        self.assertTrue(activity.reserve_rest_api_token_email())
+        stale.release_rest_api_token_email(None)
+        self.assertEqual(self.get_sent_at(), activity.last_rest_api_token_email_sent_at)
+
+    def test_send(self):
+        self.assertEqual(self.request(), 200)
+        [(args, _)] = self.send_email.call_args_list
+        self.assertEqual(args[-1], ['user@example.com'])
+        self.assertIsNotNone(self.get_sent_at())
+        # The second request within the interval is rejected
+        self.assertEqual(self.request(), 500)
+        self.assertEqual(self.send_email.call_count, 1)
+
+    def test_dispatch_failure(self):
+        self.send_email.side_effect = RuntimeError('Mail relay is down')
+        self.assertEqual(self.request(), 200)
+        # The reservation is released, so that the user can ask again
+        self.assertIsNone(self.get_sent_at())
+        self.send_email.side_effect = None
+        self.assertEqual(self.request(), 200)
+        self.assertIsNotNone(self.get_sent_at())
+
+    def test_queue_full(self):
+        self.assertEqual(self.request(InlineDispatcher(full=True)), 500)
+        self.send_email.assert_not_called()
+        self.assertIsNone(self.get_sent_at())
+        self.assertEqual(self.request(), 200)
+
+    def test_unknown_user(self):
+        request = APIRequestFactory().post('/', dict(user_name='unknown'))
+        self.assertEqual(views.get_rest_api_token_for_user(request).status_code, 500)
+        self.assertFalse(UserActivity.objects.exists())
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+from infi.django_rest_utils.metrics import HistogramRegistry, to_prometheus_text, _MmapRows, _INITIAL_FILE_SIZE
+
+
+class HistogramRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_in_memory(self):
+        registry = HistogramRegistry()
+        registry.observe(['a', '-', 'json', '2xx', 'total'], 0.003)
+        registry.observe(['a', '-', 'json', '2xx', 'total'], 100)
+        [(labels, row)] = registry.collect().items()
+        self.assertEqual(labels, ('a', '-', 'json', '2xx', 'total'))
+        self.assertEqual(row[2], 1)    # 0.005 bucket
+        self.assertEqual(row[-3], 1)   # +Inf bucket
+        self.assertEqual(row[-2], 100.003)
+        self.assertEqual(row[-1], 2)
+
+    def test_processes_are_aggregated(self):
+        registry = HistogramRegistry(self.directory)
+        registry.observe(['a', '-', 'json', '2xx', 'total'], 0.003)
+        # Another worker process, with its own file
+        other = _MmapRows(os.path.join(self.directory, 'metrics_1.db'))
+        for i in range(2000):
+            other.add('["b", "-", "csv", "2xx", "total"]', 0, 0.0005)
+        other.add('["a", "-", "json", "2xx", "total"]', 2, 0.004)
+        histograms = registry.collect()
+        self.assertEqual(histograms[('a', '-', 'json', '2xx', 'total')][-1], 2)
+        self.assertEqual(histograms[('b', '-', 'csv', '2xx', 'total')][-1], 2000)
+        # Reopening a file keeps its contents
+        self.assertEqual(len(_MmapRows(os.path.join(self.directory, 'metrics_1.db'))._positions), 2)
+
+    def test_growing_file(self):
+        rows = _MmapRows(os.path.join(self.directory, 'metrics_2.db'))
+        for i in range(1000):
+            rows.add('["endpoint-%d"]' % i, 0, 1)
+        self.assertGreater(os.path.getsize(os.path.join(self.directory, 'metrics_2.db')), _INITIAL_FILE_SIZE)
+        self.assertEqual(len(HistogramRegistry(self.directory).collect()), 1000)
+
+    def test_prometheus_text(self):
+        registry = HistogramRegistry()
+        registry.observe(['a"b', '-', 'json', '2xx', 'total'], 0.003)
+        text = to_prometheus_text(registry.collect())
+        self.assertIn('# TYPE django_rest_utils_request_duration_seconds histogram', text)
+        self.assertIn('_bucket{endpoint="a\\"b",filters="-",format="json",status="2xx",stage="total",le="0.0025"} 0', text)
+        self.assertIn('_bucket{endpoint="a\\"b",filters="-",format="json",status="2xx",stage="total",le="0.005"} 1', text)
+        self.assertIn('le="+Inf"} 1', text)
+        self.assertIn('_count{endpoint="a\\"b",filters="-",format="json",status="2xx",stage="total"} 1', text)
+
+
+class FilterShapeTest(unittest.TestCase):
+    def test_undeclared_parameters(self):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+        from infi.django_rest_utils.metrics import get_filter_shape
+        from infi.django_rest_utils.tests.testapp.views import EmployeeViewSet
+        params = {'name': 'like:a', 'salary': ['gt:1', 'lt:5'], 'q': 'x', 'sort': 'name', 'random-1': '1',
+                  'random-2': '2'}
+        request = Request(APIRequestFactory().get('/api/employees/', params))
+        view = EmployeeViewSet(request=request, format_kwarg=None, kwargs={}, action='list')
+        self.assertEqual(get_filter_shape(request, view), 'name:like,other,salary:gt,salary:lt')
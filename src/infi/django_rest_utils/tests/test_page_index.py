@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+from django.test import TestCase, override_settings
+from infi.django_rest_utils import page_index
+from infi.django_rest_utils.tests.testapp.models import Employee
+
+ROWS = 40
+PER_PAGE = 3
+
+
+@override_settings(REST_PAGE_INDEX_INTERVAL=2)
+class PageIndexTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        for i in range(ROWS):
+            # Leading keys with duplicates, which span the boundaries
+            Employee.objects.create(name='e%02d' % i, salary=(i * 7) % 10, created=start + timedelta(hours=i % 6))
+
+    def setUp(self):
+        page_index._indexes.clear()
+
+    def get_pages(self, queryset):
+        pages = []
+        for offset in range(0, ROWS + PER_PAGE, PER_PAGE):
+            seeked, seeked_offset = page_index.seek(queryset, offset, PER_PAGE)
+            pages.append([employee.name for employee in seeked[seeked_offset:seeked_offset + PER_PAGE]])
+        return pages
+
+    def assert_pages(self, queryset):
+        expected = []
+        for offset in range(0, ROWS + PER_PAGE, PER_PAGE):
+            expected.append([employee.name for employee in queryset[offset:offset + PER_PAGE]])
+        self.assertEqual(self.get_pages(queryset), expected)
+        # Seeking deeper pages reuses the boundaries which were already sampled
+        self.assertEqual(self.get_pages(queryset), expected)
+
+    def get_index(self, queryset):
+        return page_index._indexes.get((queryset.db, str(queryset.query), 2 * PER_PAGE))
+
+    def test_ascending(self):
+        queryset = Employee.objects.order_by('salary', 'pk')
+        self.assert_pages(queryset)
+        index = self.get_index(queryset)
+        self.assertEqual(len(index.boundaries), ROWS // (2 * PER_PAGE))
+        self.assertTrue(index.complete)
+
+    def test_sample(self):
+        # The key values of the boundaries are selected by the same query as their row numbers
+        queryset = Employee.objects.order_by('salary', 'pk')
+        index = page_index.PageIndex(page_index.get_ordering_keys(queryset), 2 * PER_PAGE)
+        with self.assertNumQueries(1):
+            boundaries = index._sample(queryset, 10)
+        self.assertEqual(boundaries, list(queryset.values_list('salary', 'pk'))[5::6])
+
+    def test_descending(self):
+        self.assert_pages(Employee.objects.order_by('-salary', 'name', '-pk'))
+
+    def test_reverse(self):
+        queryset = Employee.objects.order_by('salary', '-pk').reverse()
+        self.assertEqual(page_index.get_ordering_keys(queryset), [('salary', True), ('id', False)])
+        self.assert_pages(queryset)
+
+    def test_timestamps(self):
+        queryset = Employee.objects.order_by('-created', 'pk')
+        self.assert_pages(queryset)
+        self.assertIsInstance(self.get_index(queryset).boundaries[0][0], datetime)
+
+    def test_not_indexed(self):
+        # A nullable key, and an ordering which is not total
+        for queryset in (Employee.objects.order_by('department', 'pk'), Employee.objects.order_by('salary')):
+            self.assertIsNone(page_index.get_ordering_keys(queryset))
+            self.assertEqual(page_index.seek(queryset, 30, PER_PAGE), (queryset, 30))
@@ -0,0 +1,123 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.db.models import Q
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from infi.django_rest_utils import partitions
+from infi.django_rest_utils.pagination import PartitionedPaginator
+from infi.django_rest_utils.partitions import Partition, PartitionPlan, cover, get_filter_range, get_partition_plan
+from infi.django_rest_utils.tests.testapp.models import Employee
+
+
+def month(m):
+    return datetime(2020, m, 1, tzinfo=timezone.utc)
+
+
+class PartitionsTest(unittest.TestCase):
+    def test_cover(self):
+        partitions = [Partition('t_y2020m01', month(1), month(2), 10), Partition('t_y2020m03', month(3), month(4), 10)]
+        ranges = [(p.name, p.start, p.end) for p in cover(partitions)]
+        self.assertEqual(ranges, [(None, None, month(1)),
+                                  ('t_y2020m01', month(1), month(2)),
+                                  (None, month(2), month(3)),
+                                  ('t_y2020m03', month(3), month(4)),
+                                  (None, month(4), None)])
+
+    def test_filter_range(self):
+        self.assertEqual(get_filter_range([]), (None, None))
+        self.assertEqual(get_filter_range(['ge:2020-01-01T00:00:00Z', 'lt:2020-03-01T00:00:00Z', 'ne:x']),
+                         (month(1), month(3)))
+        self.assertEqual(get_filter_range(['eq:2020-02-01T00:00:00Z']), (month(2), month(2)))
+
+    def test_restrict(self):
+        partition = Partition('t_y2020m04', month(4), month(5), 300)
+        self.assertFalse(partition.overlaps(month(5), None))
+        self.assertTrue(partition.overlaps(month(1), month(4)))
+        self.assertEqual(partition.restrict(datetime(2020, 4, 16, tzinfo=timezone.utc), None).approximate_count, 150)
+        self.assertIs(partition.restrict(month(1), month(6)), partition)
+
+
+class PartitionedPaginatorTest(TestCase):
+    # Rows per month - there are none in February
+    ROWS = {1: 3, 3: 2, 4: 3}
+
+    @classmethod
+    def setUpTestData(cls):
+        for m, count in cls.ROWS.items():
+            for i in range(count):
+                Employee.objects.create(name='%d-%d' % (m, i), created=month(m) + timedelta(days=i + 1))
+
+    def setUp(self):
+        monthly = [Partition('t_y2020m%02d' % m, month(m), month(m + 1), self.ROWS.get(m, 0)) for m in range(1, 5)]
+        patcher = mock.patch.object(partitions, 'get_partitions', return_value=monthly)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queried = []
+        get_queryset = PartitionPlan.get_queryset
+
+        def spy(plan, partition):
+            self.queried.append(partition.name)
+            return get_queryset(plan, partition)
+        patcher = mock.patch.object(PartitionPlan, 'get_queryset', spy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_paginator(self, queryset=None, per_page=2):
+        queryset = Employee.objects.order_by('created') if queryset is None else queryset
+        return PartitionedPaginator(get_partition_plan(queryset, 'created'), per_page)
+
+    def get_names(self, page):
+        return [employee.name for employee in page]
+
+    def test_pages(self):
+        names = list(Employee.objects.order_by('created').values_list('name', flat=True))
+        paginator = self.get_paginator()
+        pages = []
+        for number in range(1, 5):
+            page = paginator.page(number)
+            pages.append((self.get_names(page), page.has_next()))
+        self.assertEqual(pages, [(names[0:2], True), (names[2:4], True), (names[4:6], True), (names[6:8], False)])
+        self.assertRaises(EmptyPage, paginator.page, 5)
+        paginator = self.get_paginator(Employee.objects.order_by('-created'), per_page=3)
+        self.assertEqual(self.get_names(paginator.page(2)), names[::-1][3:6])
+
+    def test_stop_when_full(self):
+        page = self.get_paginator().page(2)
+        self.assertEqual(self.get_names(page), ['1-2', '3-0'])
+        # The page and the next object are in the partitions up to March
+        self.assertEqual(self.queried, [None, 't_y2020m01', 't_y2020m02', 't_y2020m03'])
+
+    def test_skip_partitions(self):
+        paginator = self.get_paginator(per_page=3)
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.page(3)
+        # Partitions before the page are skipped by counts limited to the page's offset (6 rows), and rows are
+        # fetched only from April on
+        self.assertEqual(self.get_names(page), ['4-1', '4-2'])
+        fetches = [query['sql'] for query in queries.captured_queries if 'COUNT(*)' not in query['sql']]
+        self.assertEqual(len(fetches), 2)
+        self.assertFalse(page.has_next())
+        self.assertEqual(self.queried, [None, 't_y2020m01', 't_y2020m02', 't_y2020m03', 't_y2020m04', None])
+
+    def test_approximate(self):
+        queryset = Employee.objects.order_by('created')
+        approximate = [
+            queryset,
+            queryset.filter(created__gte=month(2)),
+            queryset.filter(created__range=(month(2), month(4)), created__lt=month(3)),
+        ]
+        for filtered in approximate:
+            self.assertTrue(get_partition_plan(filtered, 'created').approximate)
+        for filtered in (queryset.filter(name='1-0'), queryset.exclude(created=month(1)),
+                         queryset.filter(Q(created__lt=month(2)) | Q(name='4-0')),
+                         queryset.filter(department__name='x')):
+            self.assertFalse(get_partition_plan(filtered, 'created').approximate)
+        paginator = self.get_paginator()
+        self.assertEqual(paginator.count, 8)
+        self.assertTrue(paginator.approximated_number_of_objects)
+        paginator = self.get_paginator(queryset.filter(salary__gt=0))
+        self.assertEqual(paginator.count, 0)
+        self.assertFalse(paginator.approximated_number_of_objects)
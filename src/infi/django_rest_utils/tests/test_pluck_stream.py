@@ -0,0 +1,45 @@
+import json
+import unittest
+from io import StringIO
+from infi.django_rest_utils.pluck import traverse
+from infi.django_rest_utils.pluck_stream import iter_pluck
+
+
+class PluckStreamTest(unittest.TestCase):
+    def assertSameAsTraversal(self, path, d):
+        for chunk_size in (1, 3, 1024):
+            results = iter_pluck(StringIO(json.dumps(d)), [path], chunk_size=chunk_size)
+            self.assertEqual(sorted(map(repr, results)), sorted(map(repr, traverse(path, d))))
+
+    def test_traversal(self):
+        self.assertSameAsTraversal('a', {'a': 1})
+        self.assertSameAsTraversal('a.0', {'a': [1]})
+        self.assertSameAsTraversal('a.2', {'a': [1]})
+        self.assertSameAsTraversal('a.k', {'a': [1]})
+        self.assertSameAsTraversal('z', {'a': 1})
+        self.assertSameAsTraversal('a.b', {'a': {'b': 2}})
+        self.assertSameAsTraversal('a.b', {'a': None})
+        self.assertSameAsTraversal('*', [3, 4])
+        self.assertSameAsTraversal('b.*', {'b': [3, 4]})
+        self.assertSameAsTraversal('y.*', {'b': [3, 4]})
+        self.assertSameAsTraversal('b.*.a', {'b': {'1': {'a': 5}, '2': {'a': 6}, '3': 7}})
+        self.assertSameAsTraversal('y.a', {'y': [3, 4]})
+        self.assertSameAsTraversal('a.0.', {'a': [1]})
+        self.assertSameAsTraversal('r.*.n', {'r': [{'n': 'x\\"yé'}, {'m': 1.5e3}, {'n': [True, False, None]}]})
+
+    def test_multiple_paths_in_one_pass(self):
+        raw = '{"result": [{"a": 1, "b": {"c": [1, 2]}}, {"a": 2}]}'
+        results = list(iter_pluck(StringIO(raw), ['result.*.a', 'result.*.b.c.1', 'result.0.b']))
+        self.assertEqual(results, [('result.0.a', 1), ('result.0.b.c.1', 2), ('result.0.b', {'c': [1, 2]}),
+                                   ('result.1.a', 2), ('result.1.b.c.1', None)])
+
+    def test_ndjson(self):
+        raw = '{"a": 1}\n{"a": 2}\n'
+        results = list(iter_pluck(StringIO(raw), ['*.a', '5.a'], ndjson=True))
+        self.assertEqual(results, [('0.a', 1), ('1.a', 2), ('5.a', None)])
+
+    def test_invalid_json(self):
+        with self.assertRaises(ValueError):
+            list(iter_pluck(StringIO('{"a": [1, 2'), ['a.*']))
+        with self.assertRaises(ValueError):
+            list(iter_pluck(StringIO('{"a": nope}'), ['a']))
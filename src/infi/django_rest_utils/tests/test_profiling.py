@@ -0,0 +1,142 @@
+import cProfile
+import os
+import shutil
+import tempfile
+import unittest
+from io import StringIO
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from infi.django_rest_utils import profiling
+from infi.django_rest_utils.tests.testapp.models import Employee
+
+URL = '/api/profiled/'
+
+
+def make_profile():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    sorted(range(10))
+    profiler.disable()
+    return profiler
+
+
+class ProfileRingTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_eviction(self):
+        ring = profiling.ProfileRing(os.path.join(self.directory, 'profiles'), max_profiles=3)
+        self.assertEqual(ring.list(), [])
+        names = [ring.save(make_profile(), dict(index=i)) for i in range(5)]
+        # The oldest profiles are removed, and the rest are listed newest first
+        self.assertEqual([profile['index'] for profile in ring.list()], [4, 3, 2])
+        self.assertEqual([profile['name'] for profile in ring.list()], names[:1:-1])
+        self.assertEqual(sorted(os.listdir(ring.directory)),
+                         sorted(name + extension for name in names[2:] for extension in ('.json', '.prof')))
+        # The stats of several profiles are combined
+        calls = dict((function, stat[1]) for (_, _, function), stat in ring.get_stats(names[2:]).stats.items())
+        self.assertEqual(calls['<built-in method builtins.sorted>'], 3)
+
+    def test_order(self):
+        # Names are ordered numerically, not as strings
+        ring = profiling.ProfileRing(self.directory)
+        for name in ('20200101000000-9-10', '20200101000000-10-2', '20200101000000-9-9'):
+            for extension in ('.json', '.prof'):
+                with open(os.path.join(self.directory, name + extension), 'w') as f:
+                    f.write('{"name": "%s"}' % name)
+        self.assertEqual(ring._names(), ['20200101000000-9-9', '20200101000000-9-10', '20200101000000-10-2'])
+
+
+class ProfilingTestMixin(object):
+    def setUp(self):
+        super(ProfilingTestMixin, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(PROFILING_DIR=self.directory, PROFILING_SAMPLE_RATE=1, PROFILING_THRESHOLD=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get_profiles(self):
+        return profiling.get_profile_ring().list()
+
+
+class ProfilingMixinTest(ProfilingTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        Employee.objects.create(name='a')
+
+    def setUp(self):
+        super(ProfilingMixinTest, self).setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_profile(self):
+        self.assertEqual(self.client.get(URL, dict(name='a')).status_code, 200)
+        [profile] = self.get_profiles()
+        self.assertEqual((profile['method'], profile['path'], profile['view']), ('GET', URL, 'ProfiledViewSet'))
+        self.assertEqual((profile['params'], profile['status'], profile['streaming']), (dict(name=['a']), 200, False))
+        stats = profiling.get_profile_ring().get_stats([profile['name']])
+        self.assertTrue(any(function == 'list' for _, _, function in stats.stats))
+
+    def test_stream(self):
+        response = self.client.get(URL, dict(stream='1'))
+        # The stream is profiled until it ends
+        self.assertEqual(self.get_profiles(), [])
+        b''.join(response.streaming_content)
+        [profile] = self.get_profiles()
+        self.assertEqual((profile['status'], profile['streaming']), (None, True))
+
+    def test_not_profiled(self):
+        with override_settings(PROFILING_THRESHOLD=60000):
+            self.client.get(URL)
+        with override_settings(PROFILING_SAMPLE_RATE=0):
+            self.client.get(URL)
+        with override_settings(PROFILING_DIR=None):
+            self.assertFalse(profiling.should_profile())
+            self.client.get(URL)
+        self.assertEqual(self.get_profiles(), [])
+
+
+class RestProfilesCommandTest(ProfilingTestMixin, TestCase):
+    def call(self, *args):
+        out = StringIO()
+        call_command('rest_profiles', *args, stdout=out)
+        return out.getvalue()
+
+    def save(self, **info):
+        info = dict(dict(time='2020-01-01T00:00:00', method='GET', path='/api/x/', view='XViewSet', params={},
+                         status=200, streaming=False, duration=6000.25), **info)
+        return profiling.get_profile_ring().save(make_profile(), info)
+
+    def test_list(self):
+        self.assertEqual(self.call(), 'No profiles\n')
+        first = self.save(params=dict(name=['a', 'b']))
+        second = self.save(status=None, streaming=True, duration=12345.67)
+        lines = self.call().splitlines()
+        self.assertEqual(lines, [
+            '%s  2020-01-01T00:00:00    12345.7ms  stream  GET /api/x/' % second,
+            '%s  2020-01-01T00:00:00     6000.2ms  200  GET /api/x/?name=a&name=b' % first,
+        ])
+
+    def test_summary(self):
+        first, second = self.save(), self.save()
+        output = self.call(first)
+        self.assertTrue(output.startswith(first + '  '))
+        self.assertNotIn(second, output)
+        self.assertIn('function calls', output)
+        self.assertIn('{built-in method builtins.sorted}', output)
+        output = self.call('--summary', '--sort', 'calls', '--limit', '1')
+        self.assertIn(first, output)
+        self.assertIn(second, output)
+        self.assertIn('List reduced from', output)
+
+    def test_errors(self):
+        with self.assertRaises(CommandError):
+            self.call('unknown')
+        with override_settings(PROFILING_DIR=None):
+            with self.assertRaises(CommandError):
+                self.call()
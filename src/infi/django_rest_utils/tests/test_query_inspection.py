@@ -0,0 +1,24 @@
+import unittest
+from infi.django_rest_utils.query_inspection import QueryRecorder, sql_template
+
+
+class QueryInspectionTest(unittest.TestCase):
+    def test_sql_template(self):
+        self.assertEqual(sql_template('SELECT "t1"."a" FROM "t1" WHERE "t1"."id" IN (%s, %s,%s) LIMIT 21'),
+                         'SELECT "t1"."a" FROM "t1" WHERE "t1"."id" IN (...) LIMIT ?')
+        self.assertEqual(sql_template("SELECT a FROM t WHERE b = 'it''s' AND c > 1.5"),
+                         'SELECT a FROM t WHERE b = ? AND c > ?')
+
+    def test_suspects(self):
+        recorder = QueryRecorder()
+        execute = lambda sql, params, many, context: None
+        recorder(execute, 'SELECT * FROM "employee" LIMIT 100', None, False, None)
+        for i in range(100):
+            recorder(execute, 'SELECT * FROM "department" WHERE "id" = %s LIMIT 21', [i], False, None)
+            recorder(execute, 'UPDATE "employee" SET "seen" = 1', None, False, None)
+        self.assertEqual(recorder.count, 201)
+        [suspect] = recorder.get_suspects(5, {'department': ['department_name']})
+        self.assertEqual(suspect.count, 100)
+        self.assertEqual(suspect.table, 'department')
+        self.assertEqual(suspect.fields, ['department_name'])
+        self.assertEqual(recorder.get_suspects(101), [])
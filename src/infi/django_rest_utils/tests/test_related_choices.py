@@ -0,0 +1,47 @@
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from infi.django_rest_utils.tests.testapp.models import Department
+from infi.django_rest_utils.tests.testapp.views import EmployeeViewSet
+
+URL = '/api/employees/choices/department/'
+
+
+class RelatedChoicesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        for name in ('b', 'a', 'c', 'a'):
+            Department.objects.create(name=name)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_names(self, params):
+        names = []
+        while True:
+            response = self.client.get(URL, params)
+            self.assertEqual(response.status_code, 200)
+            names.extend(choice['display_name'] for choice in response.data['results'])
+            if not response.data['next']:
+                return names
+            params = dict(params, after=parse_qs(urlsplit(response.data['next']).query)['after'][0])
+
+    def test_pages(self):
+        self.assertEqual(self.get_names({'page_size': 1}), ['a', 'a', 'b', 'c'])
+        self.assertEqual(self.get_names({'page_size': 3, 'q': 'a'}), ['a', 'a'])
+
+    def test_invalid_page_size(self):
+        for page_size in ('0', '-1', 'x'):
+            self.assertEqual(self.client.get(URL, {'page_size': page_size}).status_code, 400)
+
+    def test_invalid_after(self):
+        self.assertEqual(self.client.get(URL, {'after': 'abc'}).status_code, 400)
+        # By primary key
+        with mock.patch.object(EmployeeViewSet, 'related_choices_search_fields', {}):
+            self.assertEqual(self.client.get(URL, {'after': 'abc'}).status_code, 400)
+            response = self.client.get(URL, {'after': Department.objects.order_by('pk')[2].pk})
+            self.assertEqual([choice['display_name'] for choice in response.data['results']], ['a'])
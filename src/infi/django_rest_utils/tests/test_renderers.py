@@ -0,0 +1,124 @@
+import struct
+import unittest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from infi.django_rest_utils.renderers import InfinidatCBORRenderer, InfinidatMessagePackRenderer, frame_record
+from infi.django_rest_utils.tests.testapp.models import Employee
+from infi.django_rest_utils.tests.testapp.views import EmployeeSerializer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+STREAM_URL = '/api/time-limited/'
+
+
+def read_records(content):
+    '''
+    Splits a length-delimited stream into its records.
+    '''
+    records = []
+    while content:
+        length, = struct.unpack('>I', content[:4])
+        records.append(content[4:4 + length])
+        content = content[4 + length:]
+    return records
+
+
+class FrameRecordTest(unittest.TestCase):
+    def test_frame_record(self):
+        self.assertEqual(frame_record(b'abc'), b'\x00\x00\x00\x03abc')
+        self.assertEqual(frame_record(b''), b'\x00\x00\x00\x00')
+        payload = b'x' * 70000
+        self.assertEqual(read_records(frame_record(payload) + frame_record(b'y')), [payload, b'y'])
+
+
+class BinaryRendererTestMixin(object):
+    renderer_class = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        for name in ('a', 'b', 'c'):
+            Employee.objects.create(name=name, salary=len(name))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def loads(self, data):
+        raise NotImplementedError()
+
+    def get(self, url, **params):
+        params['format'] = self.renderer_class.format
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], self.renderer_class.media_type)
+        return response
+
+    def test_paginated(self):
+        response = self.get('/api/employees/', sort='name', page_size=2, fields='name,salary')
+        content = self.loads(response.content)
+        self.assertIsNone(content['error'])
+        self.assertEqual(content['metadata']['ready'], True)
+        self.assertEqual(content['metadata']['page_size'], 2)
+        self.assertNotIn('results', content['metadata'])
+        self.assertEqual(content['result'], [dict(name='a', salary=1), dict(name='b', salary=1)])
+
+    def test_object(self):
+        employee = Employee.objects.get(name='a')
+        content = self.loads(self.get('/api/employees/%d/' % employee.pk).content)
+        self.assertEqual(content['result']['name'], 'a')
+        # Timestamps are converted like the JSON output does
+        self.assertEqual(content['result']['created'], EmployeeSerializer(employee).data['created'])
+
+    def test_error(self):
+        response = self.client.get('/api/employees/0/', dict(format=self.renderer_class.format))
+        self.assertEqual(response.status_code, 404)
+        content = self.loads(response.content)
+        self.assertIsNone(content['result'])
+        self.assertIn('message', content['error'])
+        self.assertEqual(self.renderer_class().render(None), b'')
+
+    def test_stream(self):
+        response = self.get(STREAM_URL, stream='1', sort='name', fields='name')
+        self.assertIn('.%s"' % self.renderer_class.format, response['Content-Disposition'])
+        records = [self.loads(record) for record in read_records(b''.join(response.streaming_content))]
+        self.assertEqual(records[0], dict(error=None, metadata=dict(ready=True)))
+        self.assertEqual(records[1:], [dict(name='a'), dict(name='b'), dict(name='c')])
+
+    def test_stream_error(self):
+        original = EmployeeSerializer.to_representation
+
+        def to_representation(serializer, instance):
+            if instance.name == 'b':
+                raise ValueError('Failed')
+            return original(serializer, instance)
+        with mock.patch.object(EmployeeSerializer, 'to_representation', to_representation):
+            response = self.get(STREAM_URL, stream='1', sort='name', fields='name')
+            records = [self.loads(record) for record in read_records(b''.join(response.streaming_content))]
+        # A failure is rendered as an error record, and the stream goes on
+        self.assertEqual(records[1:], [dict(name='a'), dict(error='Failed'), dict(name='c')])
+
+
+@unittest.skipUnless(msgpack, 'requires msgpack')
+class MessagePackRendererTest(BinaryRendererTestMixin, TestCase):
+    renderer_class = InfinidatMessagePackRenderer
+
+    def loads(self, data):
+        return msgpack.unpackb(data, raw=False)
+
+
+@unittest.skipUnless(cbor2, 'requires cbor2')
+class CBORRendererTest(BinaryRendererTestMixin, TestCase):
+    renderer_class = InfinidatCBORRenderer
+
+    def loads(self, data):
+        return cbor2.loads(data)
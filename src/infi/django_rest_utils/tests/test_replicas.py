@@ -0,0 +1,110 @@
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from infi.django_rest_utils import replicas
+from infi.django_rest_utils.tests.testapp.lag import LAGS
+from infi.django_rest_utils.tests.testapp.models import Department, Employee
+
+URL = '/api/replica-employees/'
+REPLICA_SETTINGS = dict(REST_READ_REPLICAS=['replica'],
+                        REST_REPLICA_LAG_PROBE='infi.django_rest_utils.tests.testapp.lag.probe_lag')
+
+
+class ReplicaTestMixin(object):
+    # The replica is a separate (empty) database, so queries which are sent to it find no rows
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        super(ReplicaTestMixin, self).setUp()
+        replicas._lags.clear()
+        LAGS.clear()
+        cache.clear()
+        settings = override_settings(**REPLICA_SETTINGS)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ChooseReplicaTest(ReplicaTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.other_user = User.objects.create_user('other')
+
+    def test_lag(self):
+        self.assertEqual(replicas.choose_replica(), 'replica')
+        for lag, expected in ((5, 'replica'), (6, None), (RuntimeError('Unavailable'), None), (None, None)):
+            replicas._lags.clear()
+            LAGS['replica'] = lag
+            self.assertEqual(replicas.choose_replica(), expected)
+        with override_settings(REST_READ_REPLICAS=[]):
+            self.assertIsNone(replicas.choose_replica())
+
+    def test_lag_cache(self):
+        LAGS['replica'] = RuntimeError('Unavailable')
+        self.assertIsNone(replicas.get_lag('replica'))
+        LAGS['replica'] = 1
+        # The failure is cached too
+        self.assertIsNone(replicas.choose_replica())
+        with override_settings(REST_REPLICA_LAG_CACHE_TTL=0):
+            replicas._lags.clear()
+            self.assertEqual(replicas.choose_replica(), 'replica')
+            LAGS['replica'] = 10
+            self.assertIsNone(replicas.choose_replica())
+
+    def test_pin(self):
+        self.assertFalse(replicas.is_pinned(self.user))
+        replicas.pin_user(self.user)
+        self.assertTrue(replicas.is_pinned(self.user))
+        self.assertIsNone(replicas.choose_replica(self.user))
+        self.assertFalse(replicas.is_pinned(self.other_user))
+        self.assertEqual(replicas.choose_replica(self.other_user), 'replica')
+        anonymous = AnonymousUser()
+        replicas.pin_user(anonymous)
+        self.assertFalse(replicas.is_pinned(anonymous))
+        with override_settings(REST_READ_REPLICAS=[]):
+            replicas.pin_user(self.other_user)
+        self.assertFalse(replicas.is_pinned(self.other_user))
+
+
+class ReplicaRoutingMixinTest(ReplicaTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.department = Department.objects.create(name='R&D')
+        cls.employee = Employee.objects.create(name='a', department=cls.department)
+
+    def setUp(self):
+        super(ReplicaRoutingMixinTest, self).setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_names(self):
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.data['results']]
+
+    def test_routing(self):
+        self.assertEqual(self.get_names(), [])
+        response = self.client.get(URL + 'choices/department/')
+        self.assertEqual(response.data['results'], [])
+        response = self.client.options(URL)
+        self.assertEqual(response.data['actions']['POST']['department']['choices_count'], 0)
+        # Retrieving a single object uses the primary database
+        self.assertEqual(self.client.get(URL + '%d/' % self.employee.pk).status_code, 200)
+        LAGS['replica'] = 60
+        replicas._lags.clear()
+        self.assertEqual(self.get_names(), ['a'])
+        response = self.client.get(URL + 'choices/department/')
+        self.assertEqual([choice['display_name'] for choice in response.data['results']], ['R&D'])
+
+    def test_pin_after_write(self):
+        response = self.client.post(URL, dict(name='b', salary='x'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.get_names(), [])
+        response = self.client.post(URL, dict(name='b', salary=1), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.get_names(), ['a', 'b'])
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('other'))
+        self.assertEqual(other.get(URL).data['results'], [])
@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from unittest import mock
+from infi.django_rest_utils import rest_utils
+
+
+class PluckFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filenames = [self.write('a.json', {'result': [{'n': 1}, {'n': 2}]}),
+                          self.write('b.json', {'result': [{'n': 3}]}),
+                          self.write('c.json', {'result': []})]
+
+    def write(self, name, content):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as f:
+            f.write(content if isinstance(content, str) else json.dumps(content))
+        return filename
+
+    def pluck_files(self, patterns, paths=['result.*.n'], **kwargs):
+        stdout, stderr = StringIO(), StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            errors = rest_utils.pluck_files(patterns, paths, **kwargs)
+        return errors, stdout.getvalue().splitlines(), stderr.getvalue().splitlines()
+
+    def test_expand_filenames(self):
+        a, b, c = self.filenames
+        pattern = os.path.join(self.directory, '*.json')
+        self.assertEqual(rest_utils._expand_filenames([b, pattern, a]), [b, a, c])
+        self.assertEqual(rest_utils._expand_filenames([os.path.join(self.directory, '*.txt'), '-']), ['-'])
+
+    def test_format_result(self):
+        result = ('result.0.n', 1)
+        self.assertEqual(rest_utils._format_result(result, 'tsv'), 'result.0.n\t1')
+        self.assertEqual(rest_utils._format_result(result, 'tsv', 'a.json'), 'a.json\tresult.0.n\t1')
+        self.assertEqual(json.loads(rest_utils._format_result(result, 'ndjson')), dict(path='result.0.n', value=1))
+        self.assertEqual(json.loads(rest_utils._format_result(result, 'ndjson', 'a.json')),
+                         dict(file='a.json', path='result.0.n', value=1))
+
+    def test_pluck_file(self):
+        # The results are written to a temporary file, rather than sent back to the parent process
+        a = self.filenames[0]
+        json_filename, output_filename, count, _, error = rest_utils._pluck_file((a, ['result.*.n'], True, False, 'tsv'))
+        self.addCleanup(os.remove, output_filename)
+        self.assertEqual((json_filename, count, error), (a, 2, None))
+        with open(output_filename) as f:
+            self.assertEqual(f.read().splitlines(), [a + '\tresult.0.n\t1', a + '\tresult.1.n\t2'])
+
+    def test_pluck_files(self):
+        a, b, c = self.filenames
+        expected = [a + '\tresult.0.n\t1', a + '\tresult.1.n\t2', b + '\tresult.0.n\t3']
+        for jobs in (1, 2):
+            for stream in (False, True):
+                errors, lines, _ = self.pluck_files([a, b, c], jobs=jobs, stream=stream)
+                self.assertEqual(errors, 0)
+                self.assertEqual(lines, expected)
+        errors, lines, _ = self.pluck_files([c, b, a], jobs=2, interleave=True)
+        self.assertEqual(sorted(lines), expected)
+
+    def test_temporary_files(self):
+        spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool)
+        with mock.patch('tempfile.tempdir', spool):
+            self.pluck_files(self.filenames + [os.path.join(self.directory, 'missing.json')], jobs=2)
+        self.assertEqual(os.listdir(spool), [])
+
+    def test_errors(self):
+        a = self.filenames[0]
+        invalid = self.write('invalid.json', '{"result": [{"n": 4}, nope')
+        missing = os.path.join(self.directory, 'missing.json')
+        errors, lines, error_lines = self.pluck_files([invalid, missing, a], jobs=2, stream=True, timing=True)
+        self.assertEqual(errors, 2)
+        # The results which precede the failure are printed
+        self.assertEqual(lines, [invalid + '\tresult.0.n\t4', a + '\tresult.0.n\t1', a + '\tresult.1.n\t2'])
+        self.assertTrue(error_lines[0].startswith(invalid + ': '))
+        self.assertTrue(error_lines[1].startswith(missing + ': '))
+        self.assertTrue(error_lines[2].startswith(a + '\t2 results\t'))
+        self.assertTrue(error_lines[3].startswith('total\t3 files\t'))
+
+    def test_stdin(self):
+        # The standard input is read by the parent process, in its place among the files
+        a, b, _ = self.filenames
+        with mock.patch('sys.stdin', StringIO('{"n": 5}\n{"n": 6}\n')):
+            errors, lines, _ = self.pluck_files([a, '-', b], ['*.n'], ndjson=True, jobs=2)
+        self.assertEqual(errors, 0)
+        self.assertEqual(lines, [a + '\t0.n\tNone', '-\t0.n\t5', '-\t1.n\t6', b + '\t0.n\tNone'])
+        with mock.patch('sys.stdin', StringIO('{"result": [{"n": 5}]}')):
+            errors, lines, _ = self.pluck_files([a, '-', b], jobs=2, interleave=True)
+        self.assertEqual(sorted(lines), sorted(['-\tresult.0.n\t5', a + '\tresult.0.n\t1', a + '\tresult.1.n\t2',
+                                                b + '\tresult.0.n\t3']))
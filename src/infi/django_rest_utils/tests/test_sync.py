@@ -0,0 +1,112 @@
+import json
+from datetime import timedelta
+from urllib.parse import parse_qs, urlsplit
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from infi.django_rest_utils.models import Tombstone
+from infi.django_rest_utils.sync import format_watermark
+from infi.django_rest_utils.tests.testapp.models import Employee
+
+URL = '/api/sync-employees/'
+
+
+class IncrementalSyncTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        now = timezone.now()
+        cls.since = now - timedelta(minutes=10)
+        cls.times = dict(old=now - timedelta(minutes=20), a=now - timedelta(minutes=5), b=now - timedelta(minutes=4),
+                         recent=now)
+        for name, updated in cls.times.items():
+            Employee.objects.create(name=name)
+            # Bypasses auto_now
+            Employee.objects.filter(name=name).update(updated=updated)
+        for name, deleted_at in (('gone', now - timedelta(minutes=3)), ('gone_recently', now)):
+            employee = Employee.objects.create(name=name)
+            pk = employee.pk
+            employee.delete()
+            Tombstone.objects.filter(object_id=str(pk)).update(deleted_at=deleted_at)
+        cls.deleted_pk = Tombstone.objects.get(deleted_at=now - timedelta(minutes=3)).object_id
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        return self.client.get(URL, dict(changed_since=format_watermark(self.since), **params))
+
+    def test_paginated(self):
+        response = self.get(sort='name')
+        self.assertEqual(response.status_code, 200)
+        # Changes within the safety lag are left to the next sync
+        self.assertEqual([item['name'] for item in response.data['results']], ['a', 'b'])
+        self.assertEqual(response.data['deleted'], [int(self.deleted_pk)])
+        # The latest deletion is after the latest change
+        self.assertEqual(response.data['watermark'],
+                         format_watermark(Tombstone.objects.get(object_id=self.deleted_pk).deleted_at))
+        self.assertEqual(response['X-Sync-Watermark'], response.data['watermark'])
+
+    def test_safety_lag(self):
+        with override_settings(REST_SYNC_SAFETY_LAG=0):
+            response = self.get(sort='name')
+        self.assertEqual([item['name'] for item in response.data['results']], ['a', 'b', 'recent'])
+        self.assertEqual(len(response.data['deleted']), 2)
+        with override_settings(REST_SYNC_SAFETY_LAG=270):
+            response = self.get(sort='name')
+        self.assertEqual([item['name'] for item in response.data['results']], ['a'])
+        self.assertEqual(response.data['deleted'], [])
+        self.assertEqual(response.data['watermark'], format_watermark(self.times['a']))
+
+    def test_streamed(self):
+        response = self.get(sort='name', stream='true')
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([item['name'] for item in content['result']], ['a', 'b'])
+        self.assertEqual(content['metadata']['deleted'], [int(self.deleted_pk)])
+        self.assertEqual(content['metadata']['watermark'], response['X-Sync-Watermark'])
+
+    def get_next(self, response):
+        return dict((key, values[0]) for key, values in parse_qs(urlsplit(response.data['next']).query).items())
+
+    def test_changed_until(self):
+        response = self.get(page_size=1)
+        watermark = response.data['watermark']
+        params = self.get_next(response)
+        self.assertEqual(params['changed_until'], watermark)
+        # Changes made while paging are left to the next sync
+        Employee.objects.filter(name='old').update(updated=timezone.now() - timedelta(minutes=2))
+        response = self.client.get(URL, params)
+        self.assertEqual([item['name'] for item in response.data['results']], ['b'])
+        self.assertEqual(response.data['watermark'], watermark)
+        self.assertIsNone(response.data['next'])
+        # An explicit earlier watermark
+        response = self.get(changed_until=format_watermark(self.times['a']))
+        self.assertEqual([item['name'] for item in response.data['results']], ['a'])
+        self.assertEqual(response.data['deleted'], [])
+
+    def test_keyset(self):
+        # Pages are ordered by the watermark column, regardless of the requested order
+        response = self.get(page_size=1, sort='-name')
+        self.assertEqual([item['name'] for item in response.data['results']], ['a'])
+        self.assertIn('deleted', response.data)
+        # Objects of previous pages which leave the window don't shift the following pages
+        Employee.objects.get(name='a').delete()
+        response = self.client.get(URL, self.get_next(response))
+        self.assertEqual([item['name'] for item in response.data['results']], ['b'])
+        # Deletions are reported by the first page only
+        self.assertNotIn('deleted', response.data)
+        for cursor in ('x', 'x,1', '%s,x' % format_watermark(self.since)):
+            self.assertEqual(self.get(changed_after=cursor).status_code, 400)
+
+    def test_invalid_watermark(self):
+        self.assertEqual(self.client.get(URL, dict(changed_since='yesterday')).status_code, 400)
+        self.assertEqual(self.get(changed_until='x').status_code, 400)
+
+    def test_retention(self):
+        with override_settings(REST_TOMBSTONE_RETENTION=60):
+            self.assertEqual(self.get().status_code, 410)
+        with override_settings(REST_TOMBSTONE_RETENTION=3600):
+            self.assertEqual(self.get().status_code, 200)
@@ -0,0 +1,67 @@
+from collections import deque
+from unittest import mock
+from django import db
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+from infi.django_rest_utils import views
+from infi.django_rest_utils.tests.testapp.views import TimeLimitedViewSet
+
+
+class QueryTimeLimitTest(TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(views, '_observed_durations', {})
+        self.durations = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_time_limit(self, action):
+        view = TimeLimitedViewSet()
+        view.action = action
+        return view.get_time_limit()
+
+    def test_adaptive(self):
+        self.assertEqual(self.get_time_limit('list'), 10000)
+        # Too few samples
+        self.durations[(TimeLimitedViewSet, 'list')] = deque([500] * 19)
+        self.assertEqual(self.get_time_limit('list'), 10000)
+        # The 95th percentile of 1..2000 is 1901
+        self.durations[(TimeLimitedViewSet, 'list')] = deque(range(2000, 0, -1))
+        self.assertEqual(self.get_time_limit('list'), 1901 * 3)
+        # Each action has samples of its own
+        self.durations[(TimeLimitedViewSet, 'retrieve')] = deque([10] * 100)
+        self.assertEqual(self.get_time_limit('retrieve'), 1000)
+        self.assertEqual(self.get_time_limit('list'), 1901 * 3)
+        self.durations[(TimeLimitedViewSet, 'list')] = deque([5000] * 100)
+        self.assertEqual(self.get_time_limit('list'), 10000)
+        with mock.patch.object(TimeLimitedViewSet, 'adaptive_time_limit', False):
+            self.assertEqual(self.get_time_limit('retrieve'), 10000)
+
+    def get_client(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('user'))
+        return client
+
+    def test_samples(self):
+        # Time limits are applied (and sampled) on PostgreSQL only
+        connection = mock.MagicMock(vendor='postgresql')
+        connections = mock.MagicMock(wraps=db.connections, **{'__getitem__.return_value': connection})
+        client = self.get_client()
+        with mock.patch('django.db.connections', connections):
+            self.assertEqual(client.get('/api/time-limited/').status_code, 200)
+            response = client.get('/api/time-limited/', dict(stream='true'))
+            b''.join(response.streaming_content)
+        statement = connection.cursor.return_value.__enter__.return_value.execute
+        # The list, and the stream's view and content
+        self.assertEqual(statement.call_args_list, [mock.call('SET LOCAL statement_timeout = %s', [10000])] * 3)
+        # Streams are not sampled, since their duration includes the client's download
+        self.assertEqual(list(self.durations), [(TimeLimitedViewSet, 'list')])
+        self.assertEqual(len(self.durations[(TimeLimitedViewSet, 'list')]), 1)
+
+    def test_timeout(self):
+        client = self.get_client()
+        error = views.QueryTimeoutError(TimeLimitedViewSet.timeout_message, 1234)
+        with mock.patch.object(TimeLimitedViewSet, 'filter_queryset', side_effect=error):
+            response = client.get('/api/time-limited/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['time_limit'], 1234)
+        self.assertEqual(response.data['detail'], TimeLimitedViewSet.timeout_message)
@@ -0,0 +1,91 @@
+import re
+import unittest
+from unittest import mock
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+from infi.django_rest_utils import timing
+from infi.django_rest_utils.tests.testapp.models import Employee
+
+URL = '/api/timed/'
+SERVER_TIMING = re.compile(r'^\w+;dur=\d+\.\d(, \w+;dur=\d+\.\d)*$')
+
+
+class Request(object):
+    pass
+
+
+class StageTest(unittest.TestCase):
+    def test_disabled(self):
+        # Nothing is recorded for requests without timing, or without a request
+        for request in (None, Request()):
+            with timing.stage(request, 'filter') as stage:
+                pass
+            self.assertIs(stage, timing._NULL_STAGE)
+            timing.record_stage(request, 'serialize', 1)
+            self.assertEqual(timing.get_stage_durations(request), {})
+
+    def test_stages(self):
+        request = Request()
+        request._stage_timings = []
+        request._stage_timings_start = 100
+        with mock.patch.object(timing, 'time', side_effect=[100.5, 100.75, 101, 101.25, 103]):
+            with timing.stage(request, 'filter'):
+                pass
+            # A failing stage is recorded too
+            with self.assertRaises(ValueError):
+                with timing.stage(request, 'filter'):
+                    raise ValueError()
+            timing.record_stage(request, 'serialize', 0.002)
+            durations = timing.get_stage_durations(request)
+        # Stages which are recorded more than once are summed
+        self.assertEqual(list(durations.items()), [('filter', 500), ('serialize', 2), ('total', 3000)])
+
+    def test_format(self):
+        durations = timing.get_stage_durations(Request())
+        self.assertEqual(timing.format_server_timing(durations), '')
+        durations.update([('count', 12.34), ('page', 8), ('total', 1234.56)])
+        self.assertEqual(timing.format_server_timing(durations), 'count;dur=12.3, page;dur=8.0, total;dur=1234.6')
+
+
+class ServerTimingMixinTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+        cls.staff = User.objects.create_user('staff', is_staff=True)
+        Employee.objects.create(name='a')
+
+    def get(self, user, **extra):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(URL, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def get_stages(self, response):
+        self.assertRegex(response['Server-Timing'], SERVER_TIMING)
+        return [item.split(';')[0] for item in response['Server-Timing'].split(', ')]
+
+    def test_header(self):
+        stages = self.get_stages(self.get(self.user))
+        for name in ('count', 'page', 'serialize', 'render'):
+            self.assertIn(name, stages)
+        self.assertEqual(stages[-1], 'total')
+        # Streamed responses report the stages that precede the streaming
+        response = self.get(self.user, data=dict(stream='1'))
+        self.assertEqual(self.get_stages(response), ['search', 'filter', 'ordering', 'total'])
+        b''.join(response.streaming_content)
+
+    def test_allowed(self):
+        remote = dict(REMOTE_ADDR='10.0.0.1')
+        self.assertNotIn('Server-Timing', self.get(self.user, **remote))
+        self.assertIn('Server-Timing', self.get(self.staff, **remote))
+        with override_settings(SERVER_TIMING_ALLOWED_ADDRESSES=['10.0.0.1']):
+            self.assertIn('Server-Timing', self.get(self.user, **remote))
+            self.assertNotIn('Server-Timing', self.get(self.user))
+        with override_settings(SERVER_TIMING_ALLOWED_ADDRESSES=None):
+            self.assertIn('Server-Timing', self.get(self.user, **remote))
+
+    def test_disabled(self):
+        with override_settings(SERVER_TIMING_ENABLED=False):
+            self.assertNotIn('Server-Timing', self.get(self.staff))
@@ -0,0 +1,19 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+
+class ViewDescriptionTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('user')
+
+    def test_extra_action(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        # The description of the list is cached first
+        description = client.options('/api/described/').data['description']
+        self.assertIn('Lists the employees.', description)
+        description = client.options('/api/described/summary/').data['description']
+        self.assertIn('Summarizes the employees.', description)
+        self.assertNotIn('Lists the employees.', description)
@@ -0,0 +1,3 @@
+'''
+A Django application for the tests which need models and views (see conftest.py).
+'''
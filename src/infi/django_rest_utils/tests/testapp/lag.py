@@ -0,0 +1,12 @@
+'''
+A replication lag probe for the tests (see the REST_REPLICA_LAG_PROBE setting), which returns the lag set in LAGS
+(0 by default), or raises it when it is an exception.
+'''
+LAGS = {}
+
+
+def probe_lag(alias):
+    lag = LAGS.get(alias, 0)
+    if isinstance(lag, Exception):
+        raise lag
+    return lag
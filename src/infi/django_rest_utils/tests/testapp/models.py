@@ -0,0 +1,19 @@
+from django.db import models
+from django.utils import timezone
+from infi.django_rest_utils.sync import track_deletions
+
+
+class Department(models.Model):
+    name = models.CharField(max_length=100, db_index=True)
+
+    def __str__(self):
+        return self.name
+
+
+@track_deletions
+class Employee(models.Model):
+    name = models.CharField(max_length=100)
+    salary = models.IntegerField(default=0)
+    department = models.ForeignKey(Department, null=True, blank=True, on_delete=models.SET_NULL)
+    created = models.DateTimeField(default=timezone.now)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
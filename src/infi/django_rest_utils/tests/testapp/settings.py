@@ -0,0 +1,40 @@
+'''
+Django settings for the tests. Both databases are in-memory SQLite databases, and "replica" is a separate database
+which stands for a read replica (see replicas.py).
+'''
+SECRET_KEY = 'tests'
+USE_TZ = True
+INSTALLED_APPS = [
+    'django.contrib.contenttypes',
+    'django.contrib.auth',
+    'rest_framework',
+    'infi.django_rest_utils',
+    'infi.django_rest_utils.tests.testapp',
+]
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+}
+CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+ROOT_URLCONF = 'infi.django_rest_utils.tests.testapp.urls'
+TEMPLATES = [{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}]
+REST_UTILS_WARM_UP = False
+QUERY_OBJECT_COUNT_LIMIT = 100
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': (
+        'infi.django_rest_utils.renderers.InfinidatJSONRenderer',
+        'infi.django_rest_utils.renderers.DummyCSVRenderer',
+        'infi.django_rest_utils.renderers.InfinidatMessagePackRenderer',
+        'infi.django_rest_utils.renderers.InfinidatCBORRenderer',
+    ),
+    'DEFAULT_FILTER_BACKENDS': (
+        'infi.django_rest_utils.filters.SimpleFilter',
+        'infi.django_rest_utils.filters.InfinidatFilter',
+        'infi.django_rest_utils.filters.OrderingFilter',
+    ),
+    'DEFAULT_PERMISSION_CLASSES': ('rest_framework.permissions.IsAuthenticated',),
+    'DEFAULT_PAGINATION_CLASS': 'infi.django_rest_utils.pagination.InfinidatLargeSetPaginationSerializer',
+    'ORDERING_PARAM': 'sort',
+    'PAGE_SIZE': 50,
+    'MAX_PAGINATE_BY': 1000,
+}
@@ -0,0 +1,22 @@
+from django.urls import include, path
+from infi.django_rest_utils.routers import DefaultRouter
+from infi.django_rest_utils.views import batch_view
+from . import views
+
+router = DefaultRouter(name='Tests', description='Views for the tests')
+router.register('employees', views.EmployeeViewSet)
+router.register('bulk-employees', views.BulkEmployeeViewSet, basename='bulk-employees')
+router.register('sync-employees', views.SyncEmployeeViewSet, basename='sync-employees')
+router.register('replica-employees', views.ReplicaEmployeeViewSet, basename='replica-employees')
+router.register('time-limited', views.TimeLimitedViewSet, basename='time-limited')
+router.register('timed', views.TimedViewSet, basename='timed')
+router.register('profiled', views.ProfiledViewSet, basename='profiled')
+router.register('described', views.DescribedViewSet, basename='described')
+
+urlpatterns = [
+    path('api/', include(router.urls)),
+    path('batch/', batch_view),
+    path('missing/', views.missing_view),
+    path('denied/', views.denied_view),
+    path('text/', views.text_view),
+]
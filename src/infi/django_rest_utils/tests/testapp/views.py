@@ -0,0 +1,85 @@
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from infi.django_rest_utils.metadata import SimpleMetadata
+from infi.django_rest_utils.serializers import DefaultModelSerializer
+from infi.django_rest_utils.views import (IncrementalSyncMixin, ProfilingMixin, QueryTimeLimitMixin,
+                                         ReplicaRoutingMixin, ServerTimingMixin, StreamingMixin, ViewDescriptionMixin)
+from infi.django_rest_utils.viewsets import BulkMixin, ModelViewSet, ReadOnlyModelViewSet, RelatedChoicesMixin
+from .models import Employee
+
+
+class EmployeeSerializer(DefaultModelSerializer):
+    class Meta:
+        model = Employee
+        fields = '__all__'
+
+
+class EmployeeViewSet(RelatedChoicesMixin, ModelViewSet):
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+    related_choices_search_fields = {'department': 'name'}
+
+
+class BulkEmployeeViewSet(BulkMixin, ModelViewSet):
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+    bulk_chunk_size = 2
+
+
+class SyncEmployeeViewSet(IncrementalSyncMixin, StreamingMixin, ReadOnlyModelViewSet):
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+    changed_since_field = 'updated'
+
+
+class ReplicaEmployeeViewSet(ReplicaRoutingMixin, RelatedChoicesMixin, ModelViewSet):
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+    metadata_class = SimpleMetadata
+    metadata_cache_ttl = 0
+
+
+class TimeLimitedViewSet(QueryTimeLimitMixin, StreamingMixin, ReadOnlyModelViewSet):
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+    adaptive_time_limit = True
+    time_limit = 10000
+
+
+class TimedViewSet(ServerTimingMixin, StreamingMixin, ReadOnlyModelViewSet):
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+
+
+class ProfiledViewSet(ProfilingMixin, StreamingMixin, ReadOnlyModelViewSet):
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+
+
+class DescribedViewSet(ViewDescriptionMixin, ReadOnlyModelViewSet):
+    '''
+    Lists the employees.
+    '''
+    queryset = Employee.objects.all()
+    serializer_class = EmployeeSerializer
+
+    @action(detail=False)
+    def summary(self, request):
+        '''
+        Summarizes the employees.
+        '''
+        return Response({'count': self.get_queryset().count()})
+
+
+def missing_view(request):
+    raise Http404()
+
+
+def denied_view(request):
+    raise PermissionDenied()
+
+
+def text_view(request):
+    return HttpResponse('text', content_type='text/plain')
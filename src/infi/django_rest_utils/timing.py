@@ -0,0 +1,74 @@
+'''
+Per-stage timing of API requests, reported in a Server-Timing response header (see views.ServerTimingMixin).
+'''
+from builtins import object
+from collections import OrderedDict
+from time import time
+
+
+class _NullStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+
+    __slots__ = ('timings', 'name', 'start')
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timings.append((self.name, time() - self.start))
+        return False
+
+
+def stage(request, name):
+    '''
+    Returns a context manager which records the duration of a stage in handling the request.
+    Nothing is recorded unless timing was enabled for the request (by ServerTimingMixin), in which case the
+    overhead is a single attribute lookup.
+    '''
+    timings = getattr(request, '_stage_timings', None) if request is not None else None
+    if timings is None:
+        return _NULL_STAGE
+    return _Stage(timings, name)
+
+
+def record_stage(request, name, duration):
+    '''
+    Records a stage whose duration was measured by the caller (in seconds).
+    '''
+    timings = getattr(request, '_stage_timings', None) if request is not None else None
+    if timings is not None:
+        timings.append((name, duration))
+
+
+def get_stage_durations(request):
+    '''
+    Returns an ordered dict of stage name to total duration in milliseconds (a stage may be recorded more than once,
+    e.g. when there are several filter backends), including a "total" stage.
+    '''
+    durations = OrderedDict()
+    for name, duration in getattr(request, '_stage_timings', None) or []:
+        durations[name] = durations.get(name, 0) + duration * 1000
+    start = getattr(request, '_stage_timings_start', None)
+    if start is not None:
+        durations['total'] = (time() - start) * 1000
+    return durations
+
+
+def format_server_timing(durations):
+    return ', '.join('{};dur={:.1f}'.format(name, duration) for name, duration in durations.items())
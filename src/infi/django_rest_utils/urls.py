@@ -10,4 +10,6 @@ from . import views
 
 urlpatterns = [
     url(r'^get_rest_api_token_for_user/$', views.get_rest_api_token_for_user, name='get_rest_api_token_for_user'),
+    url(r'^batch/$', views.batch_view, name='batch'),
+    url(r'^metrics/$', views.metrics_view, name='metrics'),
 ]
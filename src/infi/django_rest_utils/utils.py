@@ -3,6 +3,9 @@ import unicodecsv
 
 
 def get_approximate_count_for_all_objects(cursor, table):
+    # The approximation is available only in PostgreSQL. Callers fall back to counting when 0 is returned.
+    if cursor.db.vendor != 'postgresql':
+        return 0
     # We count tuples in the queryset's table name, as well as possible
     # child partitions such as <table>_y2016m12
     sql = '''
@@ -10,7 +13,7 @@ def get_approximate_count_for_all_objects(cursor, table):
         WHERE relname = '{}' or relname like '{}\_y%%';
     '''
     cursor.execute(sql.format(table, table.replace('_', '\\_')))
-    return int(cursor.fetchone()[0])
+    return int(cursor.fetchone()[0] or 0)
 
 
 def to_csv_row(field_list, dct):
@@ -5,23 +5,36 @@ from builtins import zip
 from builtins import object
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.contrib.auth import get_user_model; User = get_user_model()
+from django.contrib.auth import get_user_model
 from django.core import exceptions
-from django.http import HttpResponse, StreamingHttpResponse, HttpResponseBadRequest
+from django.http import HttpResponse, StreamingHttpResponse, HttpResponseBadRequest, Http404
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.safestring import mark_safe
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
-from rest_framework.exceptions import APIException
-from rest_framework.permissions import AllowAny
+from rest_framework.exceptions import APIException, Throttled, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.permissions import AllowAny, SAFE_METHODS
 from rest_framework.relations import ManyRelatedField, RelatedField
 from rest_framework.serializers import BaseSerializer
+import cProfile
 import json
+from collections import deque, OrderedDict
+from contextlib import contextmanager
 from functools import partial
+from time import time
 from itertools import repeat, chain, islice
 from infi.django_rest_utils.pluck import pluck_result, collect_items_from_string_lists
+from .cache import cached_for_view
 from .models import APIToken, UserActivity
+from .renderers import BINARY_RENDERERS, frame_record
+from .timing import format_server_timing, get_stage_durations, record_stage
 from .utils import to_csv_row, composition, wrap_with_try_except, send_email
+from .dispatcher import get_email_dispatcher
+from .filters import _get_filterable_fields
+from . import admission, batch, metrics, partitions, profiling, replicas, sync
+from .query_inspection import QueryBudgetExceeded, QueryRecorder, get_field_tables
 from django.utils.encoding import escape_uri_path
 import logging
 
@@ -39,11 +52,16 @@ class ViewDescriptionMixin(object):
         return mark_safe('\n'.join([part for part in parts if part]))
 
     def _get_view_description_parts(self, html):
+        # Parts that don't depend on the request are cached per view class (see cache.cached_for_view),
+        # the others are rendered on every request but use the cached filterable / ordering fields
 
         func = self.settings.VIEW_DESCRIPTION_FUNCTION
         # Fixed compatibility with django rest framwork V3.9.1: send the instance to rest_framework.views.get_view_description
         # which will find its class.
-        parts = [func(self, html)]
+        # Extra actions of viewsets are described by their own docstrings, which Django REST framework passes
+        # to the view as its "description" (this is the case in OPTIONS requests too, whose action is "metadata")
+        key = ('description', html, getattr(self, 'description', None))
+        parts = [cached_for_view(self, key, lambda: func(self, html))]
 
         for authenticator in self.get_authenticators():
             if hasattr(authenticator, 'get_authenticator_description'):
@@ -61,39 +79,487 @@ class ViewDescriptionMixin(object):
                 parts.append(desc)
 
         if self.paginator and hasattr(self.paginator, 'get_paginator_description'):
-            desc = self.paginator.get_paginator_description(self, html)
+            # Depends only on the URL path
+            desc = cached_for_view(self, ('paginator', html, self.request.build_absolute_uri(self.request.path)),
+                                   lambda: self.paginator.get_paginator_description(self, html))
             parts.append(desc)
 
         if isinstance(self, StreamingMixin):
-            parts.append(render_to_string('django_rest_utils/infinidat_streaming.html', {}))
+            parts.append(cached_for_view(self, 'streaming',
+                                         lambda: render_to_string('django_rest_utils/infinidat_streaming.html', {})))
 
         return parts
 
 
 
+class QueryTimeoutError(APIException):
+    '''
+    Raised when a database query is cancelled by QueryTimeLimitMixin. The time limit is reported in the error.
+    '''
+    status_code = 400
+
+    def __init__(self, detail, time_limit):
+        super(QueryTimeoutError, self).__init__(detail)
+        self.time_limit = time_limit
+
+
+# Recent durations (in milliseconds) of successful time-limited requests, per view class and action
+_observed_durations = {}
+
+
 class QueryTimeLimitMixin(object):
+    '''
+    Limits the time each database query is allowed to run, in lists (including the object count), single object
+    retrieval and streaming responses. The limit is set with SET LOCAL inside a transaction, so it ends with it.
+    time_limit - the limit in milliseconds.
+    adaptive_time_limit - when true, the limit is time_limit_factor times the 95th percentile of the recent successful
+                          durations of the view's action (e.g. list or retrieve), but no less than min_time_limit and
+                          no more than time_limit. Streams are not sampled, since their duration depends on the
+                          client's download.
+    Note: only PostgreSQL is supported, on other databases no limit is applied.
+    '''
 
     time_limit = 30000
     timeout_message = 'Database query took to long and was cancelled.'
+    adaptive_time_limit = False
+    min_time_limit = 1000
+    time_limit_factor = 3
+    time_limit_samples = 200
 
-    def list(self, request, *args, **kwargs):
-        from django.db import connections
+    def get_durations_key(self):
+        '''
+        Returns the key of the durations which the adaptive time limit is derived from - the view class and action.
+        '''
+        return (type(self), getattr(self, 'action', None))
+
+    def get_time_limit(self):
+        durations = _observed_durations.get(self.get_durations_key())
+        if not self.adaptive_time_limit or not durations or len(durations) < 20:
+            return self.time_limit
+        p95 = sorted(durations)[int(len(durations) * 0.95)]
+        return int(max(self.min_time_limit, min(self.time_limit, p95 * self.time_limit_factor)))
+
+    @contextmanager
+    def time_limited(self, record=True):
+        '''
+        A context manager that applies the time limit to the queries made within it. When record is true, the
+        duration is sampled for the adaptive time limit.
+        '''
+        from django.db import connections, transaction
         from django.db.utils import OperationalError
-        from rest_framework.exceptions import ValidationError
         db = self.get_queryset().db
-        with connections[db].cursor() as cursor:
+        if connections[db].vendor != 'postgresql':
+            yield
+            return
+        time_limit = self.get_time_limit()
+        start = time()
+        try:
+            with transaction.atomic(using=db):
+                with connections[db].cursor() as cursor:
+                    cursor.execute('SET LOCAL statement_timeout = %s', [time_limit])
+                yield
+        except OperationalError as e:
+            message = e.message if hasattr(e, 'message') else str(e)
+            if 'statement timeout' in message:
+                raise QueryTimeoutError(self.timeout_message, time_limit)
+            raise
+        if record:
+            durations = _observed_durations.setdefault(self.get_durations_key(),
+                                                       deque(maxlen=self.time_limit_samples))
+            durations.append((time() - start) * 1000)
+
+    def list(self, request, *args, **kwargs):
+        # Streams run their queries while the content is generated (see wrap_stream), so they are not sampled here
+        is_streamed = getattr(self, 'is_streamed', None)
+        with self.time_limited(record=not (is_streamed and is_streamed(request))):
+            return super(QueryTimeLimitMixin, self).list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        with self.time_limited():
+            return super(QueryTimeLimitMixin, self).retrieve(request, *args, **kwargs)
+
+    def wrap_stream(self, content):
+        parent = getattr(super(QueryTimeLimitMixin, self), 'wrap_stream', None)
+        content = parent(content) if parent else content
+        # The streamed content is generated after the view returns, so it needs a time limit of its own
+        with self.time_limited(record=False):
+            for chunk in content:
+                yield chunk
+
+    def handle_exception(self, exc):
+        response = super(QueryTimeLimitMixin, self).handle_exception(exc)
+        if isinstance(exc, QueryTimeoutError):
+            response.data['time_limit'] = exc.time_limit
+        return response
+
+
+
+class ServerTimingMixin(object):
+    '''
+    A view mixin which measures the stages of handling the request - filtering, counting, fetching the page,
+    serialization, plucking and rendering - and reports them in a Server-Timing header.
+    Timing is enabled unless the SERVER_TIMING_ENABLED setting is false. Since the timings reveal details of the
+    server's work, the header is only sent to staff users and to the addresses in SERVER_TIMING_ALLOWED_ADDRESSES
+    (by default, only to local clients). When the SERVER_TIMING_LOG setting is true,
+    the timings of each request are also logged as a JSON line, and when the REST_METRICS_ENABLED setting is true
+    they are recorded in latency histograms (see metrics.py).
+    '''
+
+    def initial(self, request, *args, **kwargs):
+        if getattr(settings, 'SERVER_TIMING_ENABLED', True):
+            request._stage_timings = []
+            request._stage_timings_start = time()
+        super(ServerTimingMixin, self).initial(request, *args, **kwargs)
+
+    def paginate_queryset(self, queryset):
+        page = super(ServerTimingMixin, self).paginate_queryset(queryset)
+        self._serialization_start = time()
+        return page
+
+    def get_paginated_response(self, data):
+        # The page is serialized between paginate_queryset and get_paginated_response
+        start = getattr(self, '_serialization_start', None)
+        if start is not None:
+            record_stage(self.request, 'serialize', time() - start)
+        return super(ServerTimingMixin, self).get_paginated_response(data)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ServerTimingMixin, self).finalize_response(request, response, *args, **kwargs)
+        if getattr(request, '_stage_timings', None) is None:
+            return response
+        if hasattr(response, 'add_post_render_callback') and not response.is_rendered:
+            # Add the header after rendering, so that the rendering stage is included
+            response.add_post_render_callback(lambda rendered: self._add_server_timing(request, rendered))
+        else:
+            self._add_server_timing(request, response)
+        return response
+
+    def wrap_stream(self, content):
+        parent = getattr(super(ServerTimingMixin, self), 'wrap_stream', None)
+        content = parent(content) if parent else content
+        if getattr(self.request, '_stage_timings', None) is None:
+            return content
+        self._streamed_response = None
+        return self._timed_stream(content)
+
+    def _timed_stream(self, content):
+        # The streamed content is generated after the response headers are sent, so it's only covered by the log
+        # line and the metrics, which are emitted once the stream ends
+        start = time()
+        try:
+            for chunk in content:
+                yield chunk
+        finally:
+            record_stage(self.request, 'stream', time() - start)
+            if self._streamed_response is not None:
+                self._report_timings(self.request, self._streamed_response, get_stage_durations(self.request))
+
+    def may_see_server_timing(self, request):
+        '''
+        Returns whether the Server-Timing header is sent in the response to the given request.
+        '''
+        return getattr(getattr(request, 'user', None), 'is_staff', False) or \
+            _is_allowed_address(request, 'SERVER_TIMING_ALLOWED_ADDRESSES')
+
+    def _add_server_timing(self, request, response):
+        durations = get_stage_durations(request)
+        if self.may_see_server_timing(request):
+            response['Server-Timing'] = format_server_timing(durations)
+        if response.streaming and hasattr(self, '_streamed_response'):
+            # Reported when the stream ends (see _timed_stream)
+            self._streamed_response = response
+            return
+        self._report_timings(request, response, durations)
+
+    def _report_timings(self, request, response, durations):
+        if metrics.is_enabled():
+            metrics.observe_request(request, self, response, durations)
+        if getattr(settings, 'SERVER_TIMING_LOG', False):
+            logger.info(json.dumps(OrderedDict([
+                ('method', request.method),
+                ('path', request.path),
+                ('view', type(self).__name__),
+                ('status', response.status_code),
+                ('stages', OrderedDict((name, round(duration, 3)) for name, duration in durations.items())),
+            ])))
+
+
+class ProfilingMixin(object):
+    '''
+    A view mixin which profiles a sample of the requests (PROFILING_SAMPLE_RATE, by default 1%) with cProfile, and
+    keeps the profiles of requests that take longer than PROFILING_THRESHOLD milliseconds (by default 5000) in the
+    PROFILING_DIR directory, along with the request's query parameters. Profiling is disabled unless PROFILING_DIR
+    is defined. Use the rest_profiles management command to list and summarize the profiles.
+    '''
+
+    def dispatch(self, request, *args, **kwargs):
+        self._profiler = None
+        if profiling.should_profile():
+            profiler = cProfile.Profile()
             try:
-                cursor.execute('SET statement_timeout = %s', [self.time_limit])
-                return super(QueryTimeLimitMixin, self).list(request, *args, **kwargs)
-            except OperationalError as e:
-                message = e.message if hasattr(e, 'message') else str(e)
-                if 'statement timeout' in message:
-                    raise ValidationError(self.timeout_message)
-                raise
-            finally:
-                cursor.execute('SET statement_timeout = DEFAULT')
+                profiler.enable()
+            except ValueError:
+                # Another profiler is active (e.g. in a concurrent request, since Python 3.12)
+                return super(ProfilingMixin, self).dispatch(request, *args, **kwargs)
+            self._profiler = profiler
+            self._profiling_start = time()
+        try:
+            response = super(ProfilingMixin, self).dispatch(request, *args, **kwargs)
+        finally:
+            if self._profiler:
+                self._profiler.disable()
+        if self._profiler and not (response.streaming and getattr(self, '_profiled_stream', False)):
+            self._save_profile(request, response)
+        return response
+
+    def wrap_stream(self, content):
+        parent = getattr(super(ProfilingMixin, self), 'wrap_stream', None)
+        content = parent(content) if parent else content
+        self._profiled_stream = self._profiler is not None
+        if not self._profiled_stream:
+            return content
+        return self._profile_stream(content)
+
+    def _profile_stream(self, content):
+        # The streamed content is generated after dispatch returns, so profiling is resumed while iterating over it
+        profiler = self._profiler
+        try:
+            profiler.enable()
+        except ValueError:
+            profiler = None
+        try:
+            for chunk in content:
+                yield chunk
+        finally:
+            if profiler:
+                profiler.disable()
+                self._save_profile(self.request, None)
+
+    def _save_profile(self, request, response):
+        duration = (time() - self._profiling_start) * 1000
+        if duration < profiling.get_threshold():
+            return
+        info = dict(
+            time=timezone.now().isoformat(),
+            method=request.method,
+            path=request.path,
+            view=type(self).__name__,
+            params=dict(request.GET.lists()),
+            status=response.status_code if response is not None else None,
+            streaming=response is None,
+            duration=round(duration, 1),
+        )
+        try:
+            profiling.get_profile_ring().save(self._profiler, info)
+        except (IOError, OSError):
+            logger.exception('Failed to save the profile of a slow request')
 
 
+class QueryInspectionMixin(object):
+    '''
+    A view mixin for development and tests, which inspects the database queries executed by list (including the
+    generation of streamed responses), and warns about statements that are repeated N_PLUS_ONE_THRESHOLD times or
+    more (by default 5) - typically a related object that is fetched separately for each serialized object - naming
+    the serializer fields that read the table.
+    When the view defines query_budget and the number of queries exceeds it, a warning is logged, or with the
+    QUERY_BUDGET_STRICT setting QueryBudgetExceeded is raised (which fails the test that made the request).
+    Inspection is enabled when the QUERY_INSPECTION_ENABLED setting is true (by default, when DEBUG is true).
+    '''
+    query_budget = None
+
+    def list(self, request, *args, **kwargs):
+        self._query_recorder = None
+        if not getattr(settings, 'QUERY_INSPECTION_ENABLED', settings.DEBUG):
+            return super(QueryInspectionMixin, self).list(request, *args, **kwargs)
+        recorder = self._query_recorder = QueryRecorder()
+        with recorder.recording():
+            response = super(QueryInspectionMixin, self).list(request, *args, **kwargs)
+        if not response.streaming:
+            self.check_queries(recorder)
+        return response
+
+    def wrap_stream(self, content):
+        parent = getattr(super(QueryInspectionMixin, self), 'wrap_stream', None)
+        content = parent(content) if parent else content
+        recorder = getattr(self, '_query_recorder', None)
+        if recorder is None:
+            return content
+        return self._inspect_stream(content, recorder)
+
+    def _inspect_stream(self, content, recorder):
+        with recorder.recording():
+            for chunk in content:
+                yield chunk
+        self.check_queries(recorder)
+
+    def check_queries(self, recorder):
+        threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', 5)
+        suspects = recorder.get_suspects(threshold, get_field_tables(self.get_serializer()))
+        view_name = type(self).__name__
+        for suspect in suspects:
+            logger.warning('Possible N+1 queries in %s: %d queries (%.1fms) from serializer field(s) %s: %s',
+                           view_name, suspect.count, suspect.duration * 1000,
+                           ', '.join(suspect.fields) or 'unknown', suspect.template)
+        if self.query_budget is not None and recorder.count > self.query_budget:
+            message = '{} executed {} queries, exceeding its budget of {}'.format(
+                view_name, recorder.count, self.query_budget)
+            if suspects:
+                message += ' (repeated: {})'.format('; '.join('{} x {} [{}]'.format(
+                    suspect.count, suspect.table, ', '.join(suspect.fields)) for suspect in suspects))
+            if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+
+class FullSyncRequired(APIException):
+    '''
+    Raised by IncrementalSyncMixin when the deletions since the requested watermark are no longer known.
+    '''
+    status_code = 410
+    default_detail = 'A full sync is required'
+
+
+class IncrementalSyncMixin(object):
+    '''
+    A mixin for lists (paginated or streamed) that lets clients mirror a table incrementally. With
+    "changed_since=<watermark>", only the objects whose changed_since_field is after the watermark are listed, and
+    the ids of objects deleted since (when the model is tracked with sync.track_deletions) are reported in the
+    "deleted" metadata of the first page. The next watermark is reported in the "watermark" metadata and the
+    X-Sync-Watermark header.
+    Pages are ordered by (changed_since_field, primary key) and paginated by keyset - the "changed_after" parameter
+    holds the cursor of the last object in the previous page - and following pages are pinned to the same window
+    with a "changed_until" parameter in their links (see sync.py).
+    The column should be indexed, and should be a timestamp (such as a DateTimeField with auto_now=True) or a number
+    that increases on every change.
+    '''
+
+    changed_since_field = None
+    _sync_window = None
+    _sync_next = None
+    _sync_page_size = None
+
+    def list(self, request, *args, **kwargs):
+        since = request.query_params.get('changed_since')
+        if not since or not self.changed_since_field:
+            return super(IncrementalSyncMixin, self).list(request, *args, **kwargs)
+        queryset = super(IncrementalSyncMixin, self).filter_queryset(self.get_queryset())
+        cursor = request.query_params.get('changed_after')
+        try:
+            # Deletions are reported by the first page only
+            self._sync_window = sync.get_sync_window(queryset, self.changed_since_field, since,
+                                                     request.query_params.get('changed_until'),
+                                                     deletions=not cursor)
+        except sync.WatermarkExpired as e:
+            raise FullSyncRequired(str(e))
+        except sync.WatermarkError as e:
+            raise ValidationError(str(e))
+        response = super(IncrementalSyncMixin, self).list(request, *args, **kwargs)
+        response['X-Sync-Watermark'] = self._sync_window.watermark
+        if isinstance(getattr(response, 'data', None), dict):
+            # Paginated results, whose keys end up in the metadata
+            response.data.update(self.get_sync_metadata())
+            if response.data.get('next'):
+                response.data['next'] = replace_query_param(response.data['next'], 'changed_until',
+                                                            self._sync_window.watermark)
+        return response
+
+    def paginate_queryset(self, queryset):
+        if self._sync_window is None or self.paginator is None:
+            return super(IncrementalSyncMixin, self).paginate_queryset(queryset)
+        page_size = self.paginator.get_page_size(self.request)
+        if not page_size:
+            return None
+        try:
+            queryset = self._sync_window.seek(queryset, self.request.query_params.get('changed_after'))
+        except sync.WatermarkError as e:
+            raise ValidationError(str(e))
+        objects = list(queryset[:page_size + 1])
+        self._sync_next = None
+        if len(objects) > page_size:
+            objects = objects[:page_size]
+            self._sync_next = replace_query_param(self.request.build_absolute_uri(), 'changed_after',
+                                                  self._sync_window.format_cursor(objects[-1]))
+        self._sync_page_size = page_size
+        return objects
+
+    def get_paginated_response(self, data):
+        if self._sync_window is None:
+            return super(IncrementalSyncMixin, self).get_paginated_response(data)
+        return Response(OrderedDict([
+            ('page_size', self._sync_page_size),
+            ('next', self._sync_next),
+            ('results', data)
+        ]))
+
+    def get_sync_metadata(self):
+        metadata = OrderedDict([('watermark', self._sync_window.watermark)])
+        if not self.request.query_params.get('changed_after'):
+            metadata['deleted'] = self._sync_window.deleted_ids
+        return metadata
+
+    def get_stream_metadata(self):
+        metadata = super(IncrementalSyncMixin, self).get_stream_metadata()
+        if self._sync_window is not None:
+            metadata.update(self.get_sync_metadata())
+        return metadata
+
+    def filter_queryset(self, queryset):
+        queryset = super(IncrementalSyncMixin, self).filter_queryset(queryset)
+        if self._sync_window is not None:
+            queryset = self._sync_window.filter(queryset)
+        return queryset
+
+
+class PartitionAwareMixin(object):
+    '''
+    A mixin for views of tables which are partitioned by month on a datetime column (see partitions.py). When the
+    list is ordered by the partition column, streaming walks the partitions in order, and
+    pagination.InfinidatPartitionedPaginationSerializer stops at the partition that fills the page. The relevant
+    partitions are narrowed down by the request's filters on partition_field - the name of a DATETIME
+    FilterableField whose source is the partition column.
+    '''
+
+    partition_field = None
+
+    def get_partition_plan(self, queryset):
+        if not self.partition_field:
+            return None
+        field = next((f for f in _get_filterable_fields(self) if f.name == self.partition_field), None)
+        if field is None or callable(field.source) or '__' in field.source:
+            return None
+        return partitions.get_partition_plan(queryset, field.source, self.request.query_params.getlist(field.name))
+
+    def get_stream_iterator(self, queryset):
+        plan = self.get_partition_plan(queryset)
+        if plan is None:
+            return super(PartitionAwareMixin, self).get_stream_iterator(queryset)
+        return plan.iterator()
+
+
+class ReplicaRoutingMixin(object):
+    '''
+    A mixin that sends the queries of read-only actions - lists (including their counts and streaming), OPTIONS
+    metadata and related field choices - to a read replica whose replication lag is low enough (see replicas.py).
+    Other actions, such as retrieving a single object, use the primary database. After a successful write through the
+    view, the user's reads are pinned to the primary database for a few seconds, so that the user sees the change.
+    '''
+
+    replica_actions = ('list', 'metadata', 'related_choices')
+
+    def initial(self, request, *args, **kwargs):
+        super(ReplicaRoutingMixin, self).initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and getattr(self, 'action', None) in self.replica_actions:
+            request.read_replica = replicas.choose_replica(request.user)
+
+    def get_queryset(self):
+        return replicas.route(super(ReplicaRoutingMixin, self).get_queryset(), self.request)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(ReplicaRoutingMixin, self).finalize_response(request, response, *args, **kwargs)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            replicas.pin_user(request.user)
+        return response
+
 
 class StreamingMixin(object):
     '''
@@ -102,16 +568,45 @@ class StreamingMixin(object):
     very large) into memory.
     To activate streaming, the request query parameters must include
     "stream=1" or "stream=true"
+    With "format=msgpack" or "format=cbor", the stream is a sequence of length-delimited
+    records (see renderers.frame_record): the envelope without a result, then one record per object.
+    The number of concurrent streams is limited (see admission.py); requests over the limits get HTTP 429.
     '''
 
+    too_many_streams_message = 'Too many concurrent streams.'
+
+    def is_streamed(self, request):
+        '''
+        Returns whether the list of the given request is streamed.
+        '''
+        return request.GET.get('stream', '').lower() in ('1', 'true') or request.GET.get('format', '').lower() == 'csv'
+
     def list(self, request, *args, **kwargs):
-        is_csv = request.GET.get('format', '').lower() == 'csv'
-        is_stream = request.GET.get('stream', '').lower() in ('1', 'true') or is_csv
-        if is_stream:
-            return self._create_streamed_response(request, is_csv)
+        if self.is_streamed(request):
+            return self._create_streamed_response(request, request.GET.get('format', '').lower())
         else:
             return super(StreamingMixin, self).list(request, *args, **kwargs)
 
+    def wrap_stream(self, content):
+        '''
+        A hook for mixins that need to run code around the iteration of the streamed content, such as
+        QueryTimeLimitMixin. Implementations should call the parent's wrap_stream if there is one.
+        '''
+        parent = getattr(super(StreamingMixin, self), 'wrap_stream', None)
+        return parent(content) if parent else content
+
+    def get_stream_metadata(self):
+        '''
+        Returns the metadata of streamed JSON and binary responses, which precedes the objects.
+        '''
+        return OrderedDict([('ready', True)])
+
+    def get_stream_iterator(self, queryset):
+        '''
+        Returns an iterator over the objects to stream.
+        '''
+        return queryset.iterator()
+
     def _infer_field_list(self, request, serializer):
         field_list_param = request.query_params.getlist('fields')
         is_flat = request.GET.get('format', '').lower() in ('csv', 'flatjson')
@@ -141,20 +636,53 @@ class StreamingMixin(object):
         return 'attachment; filename="{filename}.{extension}"'.format(filename=self._infer_filename(),
                                                                       extension=extension)
 
-    def _create_streamed_response(self, request, is_csv):
+    def acquire_stream_slot(self, request):
+        '''
+        Returns the admission of a stream (see admission.Slot), or raises Throttled when the request is over the
+        limits of concurrent streams.
+        '''
+        slot = admission.acquire(request)
+        if slot is None:
+            raise Throttled(wait=admission.get_retry_after(), detail=self.too_many_streams_message)
+        return slot
+
+    def _create_streamed_response(self, request, stream_format):
+        slot = self.acquire_stream_slot(request)
+        try:
+            response = self._build_streamed_response(request, stream_format)
+        except Exception:
+            slot.release()
+            raise
+        # The slot is released when the response is exhausted or closed
+        response.streaming_content = admission.ReleasingIterator(response.streaming_content, slot)
+        return response
+
+    def _build_streamed_response(self, request, stream_format):
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset)
         field_list = self._infer_field_list(request, serializer)
-        if is_csv:
+        metadata = self.get_stream_metadata()
+        render_error = lambda message: json.dumps({'error': message})
+        if stream_format == 'csv':
             content_type='text/csv'
             header = ','.join(field_list) + '\n'
             footer = ''
             delimiter = ''
             dict_renderering_function = partial(to_csv_row, field_list)
             extension = 'csv'
+        elif stream_format in BINARY_RENDERERS:
+            # A sequence of length-delimited records: the envelope (without the result), followed by one record per object
+            renderer = BINARY_RENDERERS[stream_format]
+            content_type = renderer.media_type
+            header = frame_record(renderer.dumps({'error': None, 'metadata': metadata}))
+            footer = b''
+            delimiter = b''
+            dict_renderering_function = composition(renderer.dumps, frame_record)
+            render_error = composition(lambda message: {'error': message}, renderer.dumps, frame_record)
+            extension = renderer.format
         else:
             content_type = 'application/json'
-            header = '{"error": null, "metadata": {"ready": true}, "result": [\n'
+            header = '{"error": null, "metadata": %s, "result": [\n' % json.dumps(metadata)
             footer = '\n]}'
             delimiter = ',\n'
             dict_renderering_function = json.dumps
@@ -166,10 +694,10 @@ class StreamingMixin(object):
             dict_renderering_function # dict => str
         )
         safe_rendering_function = wrap_with_try_except(renderering_function,
-                                                       on_except= lambda e: json.dumps({'error': e.message if hasattr(e, 'message') else str(e)}),
+                                                       on_except= lambda e: render_error(e.message if hasattr(e, 'message') else str(e)),
                                                        logger=logger)
         # map every model object to its string representation
-        rendered_queryset_iterator = map(safe_rendering_function, queryset.iterator())
+        rendered_queryset_iterator = map(safe_rendering_function, self.get_stream_iterator(queryset))
 
         # Add a delimiter -before- every "row"
         # The chain and zip pattern is common for combining two iterators in a round robin fasion
@@ -184,7 +712,7 @@ class StreamingMixin(object):
             with_leading_delimiters, # rest of the rows with a delimiter before each one
             repeat(footer, 1) # footer
         )
-        response = StreamingHttpResponse(with_header_and_footer, content_type=content_type)
+        response = StreamingHttpResponse(self.wrap_stream(with_header_and_footer), content_type=content_type)
         response['Content-Disposition'] = self._infer_content_disposition(extension)
         return response
 
@@ -210,29 +738,72 @@ def get_rest_api_token_for_user(request, *args, **kwargs):
     user_name = data.get("user_name")
     was_token_email_sent = False
     try:
-        user = User.objects.get(username=user_name)
+        user = get_user_model().objects.get(username=user_name)
     except exceptions.ObjectDoesNotExist:
         logger.warning("REST API get_rest_api_token_for_user called for non-existing user {}".format(user_name))
     else:
         do_reject_email_request = True
         try:
-            user_activity = UserActivity.objects.get(user=user)
-        except exceptions.ObjectDoesNotExist:
-            user_activity = UserActivity.objects.create(user=user)
-        if user_activity.may_send_rest_api_token_email():
+            user_activity, _ = UserActivity.objects.get_or_create(user=user)
+        except UserActivity.MultipleObjectsReturned:
+            user_activity = UserActivity.objects.filter(user=user).order_by('pk').first()
+        previous_email_sent_at = user_activity.last_rest_api_token_email_sent_at
+        if user_activity.may_send_rest_api_token_email() and user_activity.reserve_rest_api_token_email():
+            # Sending is reserved with a conditional update, so concurrent requests can't send more than one email
             do_reject_email_request = False
             user_rest_api_token = APIToken.objects.for_user(user).token
+            release = lambda e=None: user_activity.release_rest_api_token_email(previous_email_sent_at)
             try:
                 plaintext_body = """Dear user,\n\nYou requested the following information:\n\n\t\t\t{}\n\nIf you did not request this information, please inform {} that you received an unsolicited email with sensitive information, but do not forward this email.\n\nThis email contains sensitive information. Do not share the contents of this email, reply to it, or forward it to anyone.\n\nThank you,\nInventory Support Team""".format(user_rest_api_token, settings.SECURITY_EMAIL)
-                send_email(settings.REST_API_TOKEN_EMAIL_SUBJECT, None, plaintext_body, settings.REST_API_TOKEN_EMAIL_SENDER, [user.email])
-            except KeyError as ke:
+                email_args = (settings.REST_API_TOKEN_EMAIL_SUBJECT, None, plaintext_body, settings.REST_API_TOKEN_EMAIL_SENDER, [user.email])
+            except (KeyError, AttributeError) as ke:
                 logger.warning("REST API get_rest_api_token_for_user called though required {} setting is missing".format(ke))
-            except Exception as e:
-                pass
+                release()
             else:
-                user_activity.last_rest_api_token_email_sent_at = timezone.now()
-                user_activity.save()
-                was_token_email_sent = True
-        delivery_state = 'succeeded' if was_token_email_sent else 'rejected' if do_reject_email_request else 'failed'
-        logger.info("REST API get_rest_api_token_for_user called for user {}; previous token email sent at {}; delivery of another token email {}".format(user_name, user_activity.last_rest_api_token_email_sent_at, delivery_state))
+                # The email is delivered by a background thread, so that a slow mail relay doesn't tie up the worker
+                was_token_email_sent = get_email_dispatcher().submit(send_email, email_args, on_failure=release)
+                if not was_token_email_sent:
+                    release()
+        delivery_state = 'queued' if was_token_email_sent else 'rejected' if do_reject_email_request else 'failed'
+        logger.info("REST API get_rest_api_token_for_user called for user {}; previous token email sent at {}; delivery of another token email {}".format(user_name, previous_email_sent_at, delivery_state))
     return HttpResponse(status=(200 if was_token_email_sent else 500))  # No text shall be added!
+
+
+def _is_allowed_address(request, setting_name):
+    '''
+    Returns whether the request comes from one of the addresses listed by the given setting (by default, only local
+    addresses). A setting of None allows any address.
+    '''
+    allowed = getattr(settings, setting_name, ('127.0.0.1', '::1'))
+    return allowed is None or request.META.get('REMOTE_ADDR') in allowed
+
+
+def metrics_view(request):
+    """
+    Returns the latency histograms collected by ServerTimingMixin and the gauges of active streams (see admission.py),
+    in the Prometheus text format.
+    Available when the REST_METRICS_ENABLED setting is true, to the addresses in REST_METRICS_ALLOWED_ADDRESSES
+    (by default, only to local clients).
+    """
+    if not metrics.is_enabled() or not _is_allowed_address(request, 'REST_METRICS_ALLOWED_ADDRESSES'):
+        raise Http404()
+    text = metrics.to_prometheus_text(metrics.get_registry().collect()) + admission.to_prometheus_text()
+    return HttpResponse(text, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api_view(['POST'])
+def batch_view(request):
+    """
+    Executes a list of GET requests (relative URLs) and returns their responses together, each with its URL and status.
+    The body is either a list of URLs or an object with a "requests" list. At most REST_BATCH_MAX_REQUESTS URLs are
+    accepted (50 by default), and they are executed by a pool of REST_BATCH_MAX_WORKERS threads (4 by default).
+    """
+    try:
+        urls = batch.parse_urls(request.data)
+    except batch.BatchError as e:
+        raise ValidationError(str(e))
+    responses = batch.execute_all(request, urls, excluded_views=(batch_view,))
+    # The bodies of the responses are already JSON, so they are embedded in the envelope without being decoded
+    content = b''.join([b'{"metadata":{"ready":true},"result":[', b','.join(r.to_json() for r in responses),
+                        b'],"error":null}'])
+    return HttpResponse(content, content_type='application/json')
@@ -1,6 +1,23 @@
 from builtins import object
-from rest_framework import viewsets
+from collections import OrderedDict
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework import status, viewsets, serializers
+from rest_framework.exceptions import APIException, NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from functools import partial
+from .parsers import NDJSONParser
+from . import replicas
+
+try:
+    from rest_framework.decorators import action
+except ImportError:
+    # djangorestframework < 3.8
+    from rest_framework.decorators import list_route
+    action = lambda detail, **kwargs: list_route(**kwargs)
 
 class FilteredSerializerMixin(object):
     def get_filtered_serializer(self, request, *args, **kwargs):
@@ -24,6 +41,325 @@ class FilteredSerializerMixin(object):
         return
 
 
+class RelatedChoicesMixin(object):
+    '''
+    Adds a choices/<field name>/ endpoint which lists the possible values of a related field, instead of inlining
+    all of them in OPTIONS responses (see metadata.SimpleMetadata).
+    The list is ordered by the field's search column and paginated by keyset - the "after" parameter holds the primary
+    key of the last object in the previous page. The "q" parameter filters by a prefix of the search column.
+    related_choices_search_fields maps field names to their search column, which should be indexed. By default
+    the primary key is used.
+    '''
+
+    related_choices_search_fields = {}
+    related_choices_page_size = 100
+    related_choices_max_page_size = 1000
+
+    @action(detail=False, methods=['get'], url_path=r'choices/(?P<field_name>[^/.]+)', url_name='related-choices')
+    def related_choices(self, request, field_name=None, *args, **kwargs):
+        relation = self.get_related_choices_field(field_name)
+        search_field = self.related_choices_search_fields.get(field_name, 'pk')
+        queryset = replicas.route(relation.get_queryset(), request)
+        terms = request.query_params.get('q')
+        if terms:
+            queryset = queryset.filter(**{search_field + '__startswith': terms})
+        after = request.query_params.get('after')
+        if after:
+            try:
+                after = queryset.model._meta.pk.to_python(after)
+            except DjangoValidationError:
+                raise ValidationError('Invalid value for "after"')
+            queryset = self._filter_related_choices_after(queryset, search_field, after)
+        try:
+            page_size = min(int(request.query_params.get('page_size', self.related_choices_page_size)),
+                            self.related_choices_max_page_size)
+        except ValueError:
+            raise ValidationError('page_size must be an integer')
+        if page_size < 1:
+            raise ValidationError('page_size must be at least 1')
+        ordering = ['pk'] if search_field == 'pk' else [search_field, 'pk']
+        objects = list(queryset.order_by(*ordering)[:page_size + 1])
+        next_url = None
+        if len(objects) > page_size:
+            objects = objects[:page_size]
+            next_url = replace_query_param(request.build_absolute_uri(), 'after', objects[-1].pk)
+        return Response(OrderedDict([
+            ('page_size', page_size),
+            ('next', next_url),
+            ('results', [dict(value=relation.to_representation(obj), display_name=relation.display_value(obj))
+                         for obj in objects])
+        ]))
+
+    def get_related_choices_field(self, field_name):
+        '''
+        Returns the related serializer field (or the child relation of a many-related field) with the given name.
+        '''
+        field = self.get_serializer().fields.get(field_name)
+        if isinstance(field, serializers.ManyRelatedField):
+            field = field.child_relation
+        if not isinstance(field, serializers.RelatedField) or field.read_only:
+            raise NotFound('"%s" is not a writable related field' % field_name)
+        return field
+
+    def _filter_related_choices_after(self, queryset, search_field, after):
+        if search_field == 'pk':
+            return queryset.filter(pk__gt=after)
+        try:
+            last_values = queryset.filter(pk=after).values_list(search_field, flat=True)[:1]
+            last_value = last_values[0] if last_values else None
+        except (ValueError, TypeError):
+            raise ValidationError('Invalid value for "after"')
+        if last_value is None:
+            return queryset.filter(pk__gt=after)
+        return queryset.filter(Q(**{search_field + '__gt': last_value}) |
+                               Q(**{search_field: last_value, 'pk__gt': after}))
+
+
+class BulkValidationError(APIException):
+    '''
+    Raised when some of the items of a bulk request are invalid. The errors of each item are reported in the error,
+    along with the item's index in the request.
+    '''
+    status_code = 400
+
+    def __init__(self, item_errors, total):
+        super(BulkValidationError, self).__init__('%d of %d items are invalid' % (len(item_errors), total))
+        self.items = [OrderedDict([('index', index), ('errors', errors)]) for index, errors in sorted(item_errors.items())]
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    '''
+    Validates a list of items, where each item of an update is validated against its own instance (from the
+    "instances" dict, keyed by primary key - to_pk converts the "id" of an item to a key of the dict).
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.instances = kwargs.pop('instances', None)
+        self.to_pk = kwargs.pop('to_pk', lambda value: value)
+        super(BulkListSerializer, self).__init__(*args, **kwargs)
+
+    def run_child_validation(self, data):
+        if self.instances is not None and isinstance(data, dict):
+            try:
+                self.child.instance = self.instances.get(self.to_pk(data.get('id')))
+            except DjangoValidationError:
+                self.child.instance = None
+        else:
+            self.child.instance = None
+        self.child.initial_data = data
+        return super(BulkListSerializer, self).run_child_validation(data)
+
+
+class BulkMixin(object):
+    '''
+    Adds a bulk/ endpoint which creates (POST), updates (PUT or PATCH) or deletes (DELETE) many objects in a single
+    transaction. The request body is a list of objects, either as a JSON array or as NDJSON (one object per line).
+    Updated objects are identified by their "id", and deleted objects by their "id" or by a list of ids.
+    Items are validated in chunks of bulk_chunk_size (the REST_BULK_CHUNK_SIZE setting, 500 by default), and written
+    with bulk_create/bulk_update in chunks of the same size. When any of the items is invalid, nothing is written and
+    the errors of each invalid item are returned.
+    Note that bulk writes bypass perform_create, perform_update, perform_destroy and the serializer's create and
+    update methods - override build_bulk_instance and the perform_bulk_* methods to customize them.
+    '''
+
+    bulk_chunk_size = None
+    bulk_max_items = 10000
+    accepts_ndjson = False
+
+    def get_parsers(self):
+        parsers = super(BulkMixin, self).get_parsers()
+        if self.accepts_ndjson:
+            parsers.append(NDJSONParser())
+        return parsers
+
+    def get_bulk_chunk_size(self):
+        return self.bulk_chunk_size or getattr(settings, 'REST_BULK_CHUNK_SIZE', 500)
+
+    @action(detail=False, methods=['post', 'put', 'patch', 'delete'], url_path='bulk', url_name='bulk',
+            accepts_ndjson=True)
+    def bulk(self, request, *args, **kwargs):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError('Expected a list of items')
+        if len(items) > self.bulk_max_items:
+            raise ValidationError('Too many items (the maximum is %d)' % self.bulk_max_items)
+        model = self.get_queryset().model
+        with transaction.atomic(using=router.db_for_write(model)):
+            if request.method == 'POST':
+                return self.bulk_create(items)
+            if request.method == 'DELETE':
+                return self.bulk_destroy(items)
+            return self.bulk_update(items, partial=request.method == 'PATCH')
+
+    def _iter_chunks(self, items):
+        chunk_size = self.get_bulk_chunk_size()
+        for start in range(0, len(items), chunk_size):
+            yield start, items[start:start + chunk_size]
+
+    def _validate_chunk(self, chunk, start, item_errors, instances=None, partial=False):
+        serializer = BulkListSerializer(child=self.get_serializer(partial=partial), data=chunk, partial=partial,
+                                        instances=instances, to_pk=self.get_queryset().model._meta.pk.to_python,
+                                        context=self.get_serializer_context())
+        if serializer.is_valid():
+            return serializer.validated_data
+        errors = serializer.errors
+        if isinstance(errors, list):
+            errors = dict(enumerate(errors))
+        for index, error in errors.items():
+            if error:
+                item_errors[start + int(index)] = error
+        return None
+
+    def _split_m2m(self, model, validated_data):
+        m2m_names = set(field.name for field in model._meta.many_to_many)
+        values = dict((name, value) for name, value in validated_data.items() if name not in m2m_names)
+        m2m_values = dict((name, value) for name, value in validated_data.items() if name in m2m_names)
+        return values, m2m_values
+
+    def build_bulk_instance(self, model, validated_data):
+        '''
+        Returns a new, unsaved model instance of a bulk create. Override it to set fields which are not part of the
+        request (e.g. the requesting user).
+        '''
+        return model(**validated_data)
+
+    def perform_bulk_create(self, model, instances):
+        return model._default_manager.bulk_create(instances, batch_size=self.get_bulk_chunk_size())
+
+    def perform_bulk_update(self, model, instances, field_names):
+        model._default_manager.bulk_update(instances, field_names, batch_size=self.get_bulk_chunk_size())
+
+    def perform_bulk_destroy(self, queryset):
+        queryset.delete()
+
+    def _get_items_with_ids(self, items, item_errors, allow_ids=False):
+        '''
+        Returns the ids of the items, converted to primary key values (so that e.g. 5 and "5" are the same id).
+        Items without a valid id are reported as item errors, and their id is None.
+        '''
+        to_pk = self.get_queryset().model._meta.pk.to_python
+        ids = []
+        for index, item in enumerate(items):
+            if isinstance(item, dict) and item.get('id') is not None:
+                pk = item['id']
+            elif allow_ids and item is not None and not isinstance(item, (dict, list)):
+                pk = item
+            else:
+                item_errors[index] = {'id': ['This field is required.']}
+                ids.append(None)
+                continue
+            try:
+                ids.append(to_pk(pk))
+            except DjangoValidationError:
+                item_errors[index] = {'id': ['Invalid id.']}
+                ids.append(None)
+        return ids
+
+    def _get_instances(self, ids, item_errors):
+        '''
+        Returns the objects with the given ids, locked for the rest of the transaction. Missing objects and objects
+        the user has no permission for are reported as item errors.
+        '''
+        instances = {}
+        valid_ids = [pk for pk in ids if pk is not None]
+        queryset = self.filter_queryset(self.get_queryset())
+        # Only the objects' own rows are locked - the nullable side of an outer join (e.g. a nullable foreign key
+        # in select_related) can't be locked in PostgreSQL
+        of = ('self',) if connections[queryset.db].features.has_select_for_update_of else ()
+        queryset = queryset.select_for_update(of=of)
+        for chunk_start in range(0, len(valid_ids), self.get_bulk_chunk_size()):
+            chunk = valid_ids[chunk_start:chunk_start + self.get_bulk_chunk_size()]
+            instances.update(queryset.in_bulk(chunk))
+        ret = {}
+        for index, pk in enumerate(ids):
+            if pk is None:
+                continue
+            instance = instances.get(pk)
+            if instance is None:
+                item_errors[index] = {'id': ['Not found.']}
+                continue
+            self.check_object_permissions(self.request, instance)
+            ret[pk] = instance
+        return ret
+
+    def bulk_create(self, items):
+        model = self.get_queryset().model
+        item_errors = {}
+        validated = []
+        for start, chunk in self._iter_chunks(items):
+            validated.extend(self._validate_chunk(chunk, start, item_errors) or [])
+        if item_errors:
+            raise BulkValidationError(item_errors, len(items))
+        instances = []
+        all_m2m_values = []
+        for validated_data in validated:
+            values, m2m_values = self._split_m2m(model, validated_data)
+            instances.append(self.build_bulk_instance(model, values))
+            all_m2m_values.append(m2m_values)
+        instances = self.perform_bulk_create(model, instances)
+        for instance, m2m_values in zip(instances, all_m2m_values):
+            for name, value in m2m_values.items():
+                getattr(instance, name).set(value)
+        data = self.get_serializer(instances, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    def bulk_update(self, items, partial=False):
+        model = self.get_queryset().model
+        item_errors = {}
+        ids = self._get_items_with_ids(items, item_errors)
+        if len(set(pk for pk in ids if pk is not None)) < len([pk for pk in ids if pk is not None]):
+            raise ValidationError('Each object may appear only once')
+        instances = self._get_instances(ids, item_errors)
+        updates = []
+        for start, chunk in self._iter_chunks(items):
+            chunk_errors = {}
+            validated = self._validate_chunk(chunk, start, chunk_errors, instances, partial)
+            for index, error in chunk_errors.items():
+                item_errors.setdefault(index, error)
+            if validated is not None:
+                updates.extend(zip(ids[start:start + len(chunk)], validated))
+        if item_errors:
+            raise BulkValidationError(item_errors, len(items))
+        field_names = set()
+        updated = []
+        # bulk_update doesn't call pre_save, which refreshes auto_now fields (e.g. the columns of incremental syncs)
+        auto_now_fields = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        for pk, validated_data in updates:
+            instance = instances[pk]
+            values, m2m_values = self._split_m2m(model, validated_data)
+            for name, value in values.items():
+                setattr(instance, name, value)
+            for name, value in m2m_values.items():
+                getattr(instance, name).set(value)
+            field_names.update(values)
+            if values:
+                for field in auto_now_fields:
+                    field.pre_save(instance, False)
+                    field_names.add(field.name)
+            updated.append(instance)
+        if field_names:
+            self.perform_bulk_update(model, updated, sorted(field_names))
+        return Response(self.get_serializer(updated, many=True).data)
+
+    def bulk_destroy(self, items):
+        item_errors = {}
+        ids = self._get_items_with_ids(items, item_errors, allow_ids=True)
+        instances = self._get_instances(ids, item_errors)
+        if item_errors:
+            raise BulkValidationError(item_errors, len(items))
+        pks = [instance.pk for instance in instances.values()]
+        queryset = self.get_queryset().model._default_manager.all()
+        for start in range(0, len(pks), self.get_bulk_chunk_size()):
+            self.perform_bulk_destroy(queryset.filter(pk__in=pks[start:start + self.get_bulk_chunk_size()]))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def handle_exception(self, exc):
+        response = super(BulkMixin, self).handle_exception(exc)
+        if isinstance(exc, BulkValidationError):
+            response.data['items'] = exc.items
+        return response
+
+
 class ReadOnlyModelViewSet(FilteredSerializerMixin, viewsets.ReadOnlyModelViewSet):
     pass
 